@@ -0,0 +1,235 @@
+# app/bot/analysis_worker.py
+"""
+Воркеры очереди анализов (app/services/analysis_queue.py).
+
+Каждый воркер — корутина: забрать задачу → скачать фото по file_id →
+GPT → сохранить ответ → отправить в чат. Если то же фото (по перцептивному
+хэшу, app/services/photo_hash.py) уже анализировалось с тем же запросом,
+вместо GPT отдаётся прошлый ответ, а резерв лимита возвращается. Пока GPT отвечает, воркер занят
+одной задачей, поэтому пропускная способность ≈ воркеры / время ответа GPT.
+Воркеры живут в процессе бота (settings.analysis_workers) и/или в отдельных
+процессах (python -m app.cli.analysis_worker) — все они делят одну таблицу.
+
+Ошибки GPT (в том числе пустой ответ) и Bot API → повтор с паузой; заблокированный бот — задача
+закрывается (доставлять некому); после последней попытки пользователь
+получает «не удалось проанализировать». Резерв лимита подтверждается только
+после доставки (в одной транзакции с переводом задачи в done), в остальных
+случаях анализ возвращается пользователю. При остановке процесса воркеры
+дорабатывают начатые задачи (stop(timeout)), остальные возвращаются в очередь.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+from app.bot.keyboards import analysis_menu_kb
+from app.config_limits import ANALYSIS_JOB_POLL_SECONDS
+from app.db.models import AnalysisJob
+from app.locales.ru.texts import RussianTexts as T
+from app.prompts.registry import get_prompt
+from app.services import analysis_queue, photo_hash, stats_service
+from app.services.limit_service import commit_photo_quota, release_photo_quota
+from app.services.gpt_client import analyze_nutrition, analyze_recipe
+
+logger = logging.getLogger(__name__)
+
+
+class EmptyAnswerError(Exception):
+    """GPT вернул пустой ответ — попытка не удалась, лимит не списывается."""
+
+
+def _strip_questions(result: str) -> str:
+    lines = [ln for ln in result.splitlines() if not ln.lstrip().startswith("⁉️")]
+    return "\n".join(lines).strip()
+
+
+async def _download_photo(bot: Bot, file_id: str) -> bytes:
+    file_io = await bot.download(file_id)
+    if hasattr(file_io, "getvalue"):
+        return file_io.getvalue()
+    return file_io.read()
+
+
+async def process_job(bot: Bot, job: AnalysisJob) -> None:
+    """
+    Одна попытка задачи. Исключение — попытка не удалась.
+    """
+    result = job.result
+    if result is None:
+        image_bytes = await _download_photo(bot, job.photo_file_id)
+        image_hash = await photo_hash.compute_hash(image_bytes)
+        duplicate = None
+        if image_hash is not None:
+            duplicate = await photo_hash.find_duplicate(job, image_hash)
+
+        if duplicate is not None:
+            job.duplicate_of, previous = duplicate
+            result = T.get("duplicate_photo_reused") + "\n\n" + previous
+            await analysis_queue.save_result(
+                job.id,
+                result,
+                duplicate_of=job.duplicate_of,
+                prompt_version=get_prompt(job.analysis_type).tag,
+            )
+            stats_service.incr(stats_service.PHOTO_DUPLICATES)
+        else:
+            if job.analysis_type == "nutrition":
+                answer = await analyze_nutrition(image_bytes, job.comment, premium=job.premium)
+            else:
+                answer = await analyze_recipe(image_bytes, job.comment, premium=job.premium)
+
+            if not answer.text:
+                # Как ошибка GPT: повтор, после последней попытки — dead и возврат резерва
+                raise EmptyAnswerError(f"пустой ответ {answer.model}")
+
+            result = answer.text
+            if job.strip_questions:
+                result = _strip_questions(result)
+            await analysis_queue.save_result(
+                job.id, result, model=answer.model, prompt_version=answer.prompt_version
+            )
+            if image_hash is not None:
+                await _record_hash(job, image_hash)
+
+    await bot.send_message(job.chat_id, result, reply_markup=analysis_menu_kb())
+
+
+async def _send_footer(bot: Bot, job: AnalysisJob) -> None:
+    # После завершения задачи и вне повторов: сбой здесь не должен
+    # повторить попытку и прислать ответ второй раз
+    if not job.footer:
+        return
+    try:
+        await bot.send_message(job.chat_id, job.footer, reply_markup=analysis_menu_kb())
+    except Exception as e:
+        logger.warning("Задача анализа %s: footer не отправлен: %s", job.id, e)
+
+
+async def _record_hash(job: AnalysisJob, image_hash: int) -> None:
+    # Хэш нужен только для будущих повторов: ошибка не должна стоить ответа
+    try:
+        await photo_hash.record_hash(job, image_hash)
+    except Exception as e:
+        logger.exception("Задача анализа %s: хэш фото не сохранён: %s", job.id, e)
+
+
+async def _notify_dead(bot: Bot, job: AnalysisJob) -> None:
+    with contextlib.suppress(Exception):
+        await bot.send_message(job.chat_id, T.get("analysis_failed"), reply_markup=analysis_menu_kb())
+
+
+async def _release_quota(job: AnalysisJob) -> None:
+    """
+    Вернуть пользователю резерв лимита за задачу: ответ GPT не доставлен
+    или это повтор фото с прошлым ответом.
+    Ошибка здесь не влияет на задачу: незакрытый резерв снимет фоновая задача.
+    """
+    if job.quota_reservation_id is None:
+        return
+    try:
+        await release_photo_quota(job.quota_reservation_id)
+    except Exception as e:
+        logger.exception("Задача анализа %s: резерв лимита %s не закрыт: %s", job.id, job.quota_reservation_id, e)
+
+
+class AnalysisWorkerPool:
+    def __init__(self, bot: Bot, concurrency: int) -> None:
+        self.bot = bot
+        self.concurrency = concurrency
+        self.processed = 0
+        self.released = 0
+        self._tasks: list[asyncio.Task] = []
+        self._idle: set[asyncio.Task] = set()
+        self._stopping = False
+
+    async def _handle(self, job: AnalysisJob) -> None:
+        try:
+            await process_job(self.bot, job)
+        except asyncio.CancelledError:
+            # Остановка процесса посреди задачи — вернуть её в очередь без траты попытки.
+            # stop() дожидается отменённых воркеров, так что запись успеет до закрытия БД.
+            await analysis_queue.release_job(job.id)
+            self.released += 1
+            raise
+        except TelegramForbiddenError as e:
+            logger.info("Задача анализа %s: чат %s недоступен (%s)", job.id, job.chat_id, e)
+            await analysis_queue.complete_job(job.id)
+            await _release_quota(job)
+        except Exception as e:
+            logger.exception("Задача анализа %s, попытка %s: %s", job.id, job.attempts, e)
+            if await analysis_queue.fail_job(job, e):
+                await _release_quota(job)
+                await _notify_dead(self.bot, job)
+        else:
+            if job.quota_reservation_id is not None and job.duplicate_of is None:
+                # done и подтверждение резерва — одна транзакция
+                await commit_photo_quota(job.quota_reservation_id, job_id=job.id)
+            else:
+                await analysis_queue.complete_job(job.id)
+                await _release_quota(job)
+            await _send_footer(self.bot, job)
+        self.processed += 1
+
+    async def _worker(self) -> None:
+        task = asyncio.current_task()
+        while not self._stopping:
+            # Сбрасываем до захвата: задача, поставленная после, снова взведёт событие
+            analysis_queue.job_available.clear()
+            try:
+                job: Optional[AnalysisJob] = await analysis_queue.claim_job()
+            except Exception as e:
+                logger.exception("Не удалось забрать задачу анализа: %s", e)
+                job = None
+
+            if job is not None:
+                await self._handle(job)
+                continue
+
+            self._idle.add(task)
+            try:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(analysis_queue.job_available.wait(), ANALYSIS_JOB_POLL_SECONDS)
+            finally:
+                self._idle.discard(task)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"analysis-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self, timeout: float = 0.0) -> int:
+        """
+        Остановить воркеры. За timeout секунд начатые задачи дорабатываются
+        (новые не берутся); остальные отменяются и возвращаются в очередь.
+        Возвращает число возвращённых задач.
+        """
+        self._stopping = True
+        for task in self._idle:
+            task.cancel()
+
+        released = self.released
+        busy = [task for task in self._tasks if not task.done() and task not in self._idle]
+        if busy and timeout > 0:
+            logger.info("Остановка: дорабатываем анализы (%s воркеров, до %.0f с)", len(busy), timeout)
+            _, pending = await asyncio.wait(busy, timeout=timeout)
+        else:
+            pending = set(busy)
+        for task in pending:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        released = self.released - released
+        if released:
+            logger.warning("Остановка: %s задач анализа возвращено в очередь", released)
+        return released
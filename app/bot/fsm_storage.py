@@ -0,0 +1,71 @@
+# app/bot/fsm_storage.py
+
+import time
+from copy import copy
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+
+class TrackedMemoryStorage(MemoryStorage):
+    """
+    MemoryStorage, который помнит время последнего обращения к каждой записи.
+
+    Обычный MemoryStorage заводит запись на каждый get_state (defaultdict)
+    и никогда их не удаляет — память растёт с числом пользователей.
+    collect_garbage() вызывается фоновой задачей fsm_gc (app/services/jobs.py).
+    Удалённая запись — то же, что главное меню: хендлеры главного меню
+    принимают и default_state (app/bot/handlers/main_menu.py).
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.last_access: Dict[StorageKey, float] = {}
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self.last_access[key] = time.monotonic()
+        self.storage[key].state = state.state if isinstance(state, State) else state
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        self.last_access[key] = time.monotonic()
+        record = self.storage.get(key)
+        return record.state if record is not None else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        self.last_access[key] = time.monotonic()
+        await super().set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        self.last_access[key] = time.monotonic()
+        record = self.storage.get(key)
+        return record.data.copy() if record is not None else {}
+
+    async def get_value(
+        self, storage_key: StorageKey, dict_key: str, default: Optional[Any] = None
+    ) -> Optional[Any]:
+        self.last_access[storage_key] = time.monotonic()
+        record = self.storage.get(storage_key)
+        if record is None:
+            return default
+        return copy(record.data.get(dict_key, default))
+
+    def collect_garbage(self, max_idle_seconds: float) -> int:
+        """
+        Удалить пустые записи и записи без обращений дольше max_idle_seconds.
+        Возвращает число удалённых.
+        """
+        now = time.monotonic()
+        removed = 0
+        for key in list(self.storage):
+            record = self.storage[key]
+            idle = now - self.last_access.get(key, 0.0)
+            if (record.state is None and not record.data) or idle > max_idle_seconds:
+                del self.storage[key]
+                self.last_access.pop(key, None)
+                removed += 1
+        # обращения к ключам без записи (get_state у нового пользователя)
+        for key in [k for k in self.last_access if k not in self.storage]:
+            del self.last_access[key]
+        return removed
@@ -9,8 +9,8 @@ from . import (
     premium,
     admin,
     payments,
+    reports,
     main_menu,
-    # reports,  # 👈 временно отключили модуль отчётов
 )
 
 router = Router(name="root")
@@ -23,5 +23,5 @@ router.include_router(profile.router)
 router.include_router(premium.router)
 router.include_router(admin.router)
 router.include_router(payments.router)
+router.include_router(reports.router)
 router.include_router(main_menu.router)
-# router.include_router(reports.router)  # 👈 тоже отключили
@@ -2,28 +2,38 @@
 
 from __future__ import annotations
 
+import logging
+from datetime import datetime, timezone
+from decimal import Decimal
 from typing import Optional, Set
 
-from aiogram import Router, F
+from aiogram import Bot, Router, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.types import Message
+from aiogram.types import BufferedInputFile, Message
 from sqlalchemy import delete, select
 
 from app.config import settings
 from app.bot.keyboards import (
+    admin_broadcast_confirm_kb,
     admin_menu_kb,
     admin_limits_menu_kb,
+    admin_stats_menu_kb,
     main_menu_kb,
 )
 from app.locales.ru.texts import RussianTexts as T
 from app.locales.ru.buttons import RussianButtons as B
 from app.db.base import AsyncSessionLocal
-from app.db import models
+from app.db import models, query_stats
 from app.services.promo_service import generate_promo_codes
+from app.config_limits import PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS
+from app.services import broadcast_service, stats_service
+from app.services.profiler import ProfilerBusyError, is_profiling, profile_event_loop
+from app.bot.handlers.reports import send_meals_export
 
 router = Router(name="admin")
+logger = logging.getLogger(__name__)
 
 
 # ===== Разбор ADMIN_USER_IDS из .env =====
@@ -56,6 +66,8 @@ def _is_admin_tg_id(tg_id: Optional[int]) -> bool:
 class AdminStates(StatesGroup):
     waiting_for_telegram_id_for_limit_reset = State()
     waiting_for_promo_count = State()
+    waiting_for_broadcast_text = State()
+    waiting_for_broadcast_confirm = State()
 
 
 # ===== Вход в админку =====
@@ -76,19 +88,99 @@ async def admin_entry(message: Message, state: FSMContext):
     )
 
 
-# ===== Раздел "Статистика" (пока заглушка) =====
+# ===== Раздел "Статистика" =====
+
+_STATS_PERIOD_DAYS = {"week": 7, "month": 30}
+
+
+def _format_stats(period: str, summary: dict[str, Decimal]) -> str:
+    def value(metric: str) -> Decimal:
+        return summary.get(metric, Decimal(0))
+
+    def count(metric: str) -> int:
+        return int(value(metric))
+
+    analyses = count(stats_service.ANALYSES_FREE) + count(stats_service.ANALYSES_PAID)
+    prompt_tokens = count(stats_service.GPT_PROMPT_TOKENS)
+    cached_share = (
+        f"{count(stats_service.GPT_CACHED_TOKENS) / prompt_tokens * 100:.0f}" if prompt_tokens else "0"
+    )
+    days = _STATS_PERIOD_DAYS.get(period)
+
+    if days:
+        avg_dau = f"{value(stats_service.ACTIVE_USERS) / days:.1f}"
+        analyses_per_day = f"{Decimal(analyses) / days:.1f}"
+    else:
+        avg_dau = analyses_per_day = "—"
+
+    return T.get(
+        "admin_stats_report",
+        period=T.get(f"admin_stats_period_{period}"),
+        active_users=count(stats_service.ACTIVE_USERS),
+        avg_dau=avg_dau,
+        new_users=count(stats_service.NEW_USERS),
+        analyses=analyses,
+        analyses_per_day=analyses_per_day,
+        analyses_free=count(stats_service.ANALYSES_FREE),
+        analyses_paid=count(stats_service.ANALYSES_PAID),
+        photo_duplicates=count(stats_service.PHOTO_DUPLICATES),
+        refinements=count(stats_service.REFINEMENTS),
+        gpt_calls_saved=count(stats_service.GPT_CALLS_SAVED),
+        gpt_calls=count(stats_service.GPT_CALLS),
+        gpt_errors=count(stats_service.GPT_ERRORS),
+        gpt_prompt_tokens=prompt_tokens,
+        gpt_cached_share=cached_share,
+        gpt_completion_tokens=count(stats_service.GPT_COMPLETION_TOKENS),
+        gpt_cost_usd=f"{value(stats_service.GPT_COST_USD):.4f}",
+        payments=count(stats_service.PAYMENTS),
+        payments_stars=count(stats_service.PAYMENTS_STARS),
+        promo_activations=count(stats_service.PROMO_ACTIVATIONS),
+    )
+
+
+async def _send_stats(message: Message, period: str) -> None:
+    if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
+        return
+
+    try:
+        summary = await stats_service.get_stats_summary(period)
+    except Exception as e:
+        logger.exception("Не удалось загрузить статистику: %s", e)
+        await message.answer(T.get("admin_stats_error"), reply_markup=admin_stats_menu_kb())
+        return
+
+    await message.answer(
+        _format_stats(period, summary),
+        reply_markup=admin_stats_menu_kb(),
+    )
+
 
 @router.message(F.text == B.get("admin_statistics"))
-async def admin_statistics_placeholder(message: Message):
+async def admin_statistics_open(message: Message):
     if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
         return
 
     await message.answer(
-        T.get("admin_statistics_placeholder"),
-        reply_markup=admin_menu_kb(),
+        T.get("admin_statistics_menu_title"),
+        reply_markup=admin_stats_menu_kb(),
     )
 
 
+@router.message(F.text == B.get("stat_week"))
+async def admin_statistics_week(message: Message):
+    await _send_stats(message, "week")
+
+
+@router.message(F.text == B.get("stat_month"))
+async def admin_statistics_month(message: Message):
+    await _send_stats(message, "month")
+
+
+@router.message(F.text == B.get("stat_all_time"))
+async def admin_statistics_all_time(message: Message):
+    await _send_stats(message, "all")
+
+
 # ===== Раздел "Управление лимитами" =====
 
 @router.message(F.text == B.get("admin_manage_limits"))
@@ -317,6 +409,317 @@ async def admin_promo_generate(message: Message, state: FSMContext):
     )
 
 
+# ===== Экспорт дневника пользователя =====
+
+@router.message(Command("export"))
+async def admin_export_meals(message: Message):
+    """
+    /export <telegram_id> [csv|json] — выгрузка дневника питания пользователя.
+    """
+    if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
+        return
+
+    parts = (message.text or "").split()
+    try:
+        target_telegram_id = int(parts[1])
+    except (IndexError, ValueError):
+        await message.answer(T.get("admin_export_usage"))
+        return
+
+    fmt = parts[2].lower() if len(parts) > 2 else "csv"
+    if fmt == "json":
+        fmt = "ndjson"
+    if fmt not in ("csv", "ndjson"):
+        await message.answer(T.get("admin_export_usage"))
+        return
+
+    async with AsyncSessionLocal() as session:
+        stmt = select(models.User.id).where(
+            models.User.telegram_id == target_telegram_id
+        )
+        res = await session.execute(stmt)
+        user_id = res.scalar_one_or_none()
+
+    if user_id is None:
+        await message.answer(T.get("admin_user_not_found"))
+        return
+
+    await send_meals_export(message, user_id, fmt)
+
+
+# ===== Статистика запросов к БД =====
+
+# Сколько символов отпечатка показываем
+QUERY_FINGERPRINT_PREVIEW_CHARS = 300
+
+# Лимит текста сообщения в Telegram — 4096, оставляем запас
+TELEGRAM_MESSAGE_MAX_CHARS = 4000
+
+
+@router.message(Command("queries"))
+async def admin_top_queries(message: Message):
+    """
+    /queries [N] — топ-N отпечатков SQL по суммарному времени (по умолчанию 10).
+    """
+    if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
+        return
+
+    parts = (message.text or "").split()
+    try:
+        limit = max(1, min(int(parts[1]), 20)) if len(parts) > 1 else 10
+    except ValueError:
+        limit = 10
+
+    top = query_stats.top_fingerprints(limit)
+    if not top:
+        await message.answer(T.get("admin_queries_empty"))
+        return
+
+    lines = [T.get("admin_queries_title", limit=len(top))]
+    for position, (fp, stats) in enumerate(top, start=1):
+        preview = fp
+        if len(preview) > QUERY_FINGERPRINT_PREVIEW_CHARS:
+            preview = preview[:QUERY_FINGERPRINT_PREVIEW_CHARS] + "…"
+        lines.append(
+            T.get(
+                "admin_queries_item",
+                position=position,
+                total_ms=stats.total_seconds * 1000,
+                calls=stats.calls,
+                avg_ms=stats.avg_ms,
+                max_ms=stats.max_seconds * 1000,
+                fingerprint=preview,
+            )
+        )
+
+    # режем на сообщения, чтобы не упереться в лимит Telegram
+    chunk: list[str] = []
+    size = 0
+    for line in lines:
+        if chunk and size + len(line) + 2 > TELEGRAM_MESSAGE_MAX_CHARS:
+            await message.answer("\n\n".join(chunk))
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 2
+    await message.answer("\n\n".join(chunk))
+
+
+# ===== Профайлер =====
+
+async def _run_profile(message: Message, seconds: int) -> None:
+    if is_profiling():
+        await message.answer(T.get("admin_profile_busy"))
+        return
+
+    await message.answer(T.get("admin_profile_started", seconds=seconds))
+    try:
+        result = await profile_event_loop(seconds)
+    except ProfilerBusyError:
+        await message.answer(T.get("admin_profile_busy"))
+        return
+
+    started = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    await message.answer_document(
+        BufferedInputFile(
+            result.collapsed.encode("utf-8"),
+            filename=f"profile-{started}.folded",
+        ),
+        caption=T.get(
+            "admin_profile_caption",
+            seconds=result.duration_seconds,
+            cpu_samples=result.cpu_samples,
+            await_samples=result.await_samples,
+            overhead=result.overhead_percent,
+        ),
+    )
+
+
+@router.message(F.text == B.get("admin_profile"))
+async def admin_profile_button(message: Message):
+    if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
+        return
+
+    await _run_profile(message, PROFILE_DEFAULT_SECONDS)
+
+
+@router.message(Command("profile"))
+async def admin_profile_command(message: Message):
+    """
+    /profile [секунды] — снять профиль event loop'а и прислать collapsed stacks.
+    """
+    if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
+        return
+
+    parts = (message.text or "").split()
+    try:
+        seconds = int(parts[1]) if len(parts) > 1 else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        seconds = 0
+    if not 1 <= seconds <= PROFILE_MAX_SECONDS:
+        await message.answer(
+            T.get("admin_profile_usage", max_seconds=PROFILE_MAX_SECONDS)
+        )
+        return
+
+    await _run_profile(message, seconds)
+
+
+# ===== Рассылки =====
+
+def _format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return T.get("admin_broadcast_eta_unknown")
+    minutes, secs = divmod(int(seconds), 60)
+    return T.get("admin_broadcast_eta", minutes=minutes, seconds=secs)
+
+
+def _format_broadcast_progress(progress: broadcast_service.BroadcastProgress) -> str:
+    return T.get(
+        "admin_broadcast_progress",
+        broadcast_id=progress.broadcast_id,
+        status=T.get(f"admin_broadcast_status_{progress.status}"),
+        processed=progress.processed,
+        total=progress.total,
+        percent=progress.processed * 100 / progress.total if progress.total else 100,
+        sent=progress.sent,
+        blocked=progress.blocked,
+        failed=progress.failed,
+        rate=progress.rate_per_second,
+        eta=_format_eta(progress.eta_seconds),
+    )
+
+
+async def report_broadcast_progress(bot: Bot, progress: broadcast_service.BroadcastProgress) -> None:
+    """
+    Прогресс рассылки — в личку админу, который её запустил.
+    Используется и при продолжении рассылок после перезапуска (main.py).
+    """
+    try:
+        await bot.send_message(progress.created_by, _format_broadcast_progress(progress))
+    except Exception as e:
+        logger.warning("Не удалось отправить прогресс рассылки %s: %s", progress.broadcast_id, e)
+
+
+@router.message(F.text == B.get("admin_broadcast"))
+async def admin_broadcast_start(message: Message, state: FSMContext):
+    if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
+        return
+
+    await state.set_state(AdminStates.waiting_for_broadcast_text)
+    await message.answer(T.get("admin_broadcast_prompt"))
+
+
+@router.message(AdminStates.waiting_for_broadcast_text)
+async def admin_broadcast_preview(message: Message, state: FSMContext):
+    """
+    Принимаем текст, показываем его как увидят пользователи и число получателей.
+    """
+    if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
+        await state.clear()
+        return
+
+    if not message.text:
+        await message.answer(T.get("admin_broadcast_empty"))
+        return
+
+    text = message.html_text
+    await state.update_data(broadcast_text=text)
+    await state.set_state(AdminStates.waiting_for_broadcast_confirm)
+
+    recipients = await broadcast_service.count_recipients()
+    await message.answer(text, parse_mode="HTML")
+    await message.answer(
+        T.get("admin_broadcast_preview", recipients=recipients),
+        reply_markup=admin_broadcast_confirm_kb(),
+    )
+
+
+@router.message(
+    AdminStates.waiting_for_broadcast_confirm,
+    F.text == B.get("admin_broadcast_confirm"),
+)
+async def admin_broadcast_confirm(message: Message, state: FSMContext, bot: Bot):
+    if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
+        await state.clear()
+        return
+
+    data = await state.get_data()
+    await state.clear()
+    text = data.get("broadcast_text")
+    if not text:
+        await message.answer(T.get("admin_menu_welcome"), reply_markup=admin_menu_kb())
+        return
+
+    broadcast = await broadcast_service.create_broadcast(text, created_by=message.from_user.id)
+    broadcast_service.start_broadcast(bot, broadcast.id, report_broadcast_progress)
+
+    await message.answer(
+        T.get("admin_broadcast_started", broadcast_id=broadcast.id, total=broadcast.total),
+        reply_markup=admin_menu_kb(),
+    )
+
+
+async def _broadcast_from_command(message: Message):
+    """
+    Рассылка из аргумента команды (/broadcast_status 12) или последняя.
+    """
+    parts = (message.text or "").split()
+    broadcast_id = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+    broadcast = await broadcast_service.get_broadcast(broadcast_id)
+    if broadcast is None:
+        await message.answer(T.get("admin_broadcast_none"))
+    return broadcast
+
+
+@router.message(Command("broadcast_status"))
+async def admin_broadcast_status(message: Message):
+    """
+    /broadcast_status [id] — прогресс рассылки (по умолчанию последней).
+    """
+    if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
+        return
+
+    broadcast = await _broadcast_from_command(message)
+    if broadcast is None:
+        return
+    await message.answer(_format_broadcast_progress(broadcast_service.progress_of(broadcast)))
+
+
+@router.message(Command("broadcast_cancel"))
+async def admin_broadcast_cancel(message: Message):
+    """
+    /broadcast_cancel [id] — остановить рассылку после текущей страницы.
+    """
+    if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
+        return
+
+    broadcast = await _broadcast_from_command(message)
+    if broadcast is None:
+        return
+    if await broadcast_service.cancel_broadcast(broadcast.id):
+        await message.answer(T.get("admin_broadcast_cancel_done", broadcast_id=broadcast.id))
+    else:
+        await message.answer(T.get("admin_broadcast_not_active", broadcast_id=broadcast.id))
+
+
+@router.message(Command("broadcast_resume"))
+async def admin_broadcast_resume(message: Message, bot: Bot):
+    """
+    /broadcast_resume [id] — продолжить рассылку, прерванную ошибкой.
+    """
+    if not _is_admin_tg_id(message.from_user.id if message.from_user else None):
+        return
+
+    broadcast = await _broadcast_from_command(message)
+    if broadcast is None:
+        return
+    if broadcast.status != broadcast_service.STATUS_RUNNING or broadcast_service.is_running(broadcast.id):
+        await message.answer(T.get("admin_broadcast_not_active", broadcast_id=broadcast.id))
+        return
+    broadcast_service.start_broadcast(bot, broadcast.id, report_broadcast_progress)
+    await message.answer(T.get("admin_broadcast_resumed", broadcast_id=broadcast.id))
+
+
 # ===== Выход из админки =====
 
 @router.message(F.text == B.get("admin_exit"))
@@ -1,7 +1,9 @@
 # app/bot/handlers/analysis.py
 
+import asyncio
 import logging
-from datetime import date, datetime, timedelta, timezone
+from datetime import date, datetime, timedelta
+from typing import Optional
 
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
@@ -11,75 +13,27 @@ from app.bot.keyboards import analysis_menu_kb, main_menu_kb, buy_more_analyses_
 from app.bot.states import UserStates
 from app.locales.ru.texts import RussianTexts as T
 from app.locales.ru.buttons import RussianButtons as B
-from app.services.gpt_client import analyze_nutrition, analyze_recipe
-from app.services.user_service import get_or_create_user
+from app.services.analysis_queue import enqueue_analysis
+from app.services.user_service import get_or_create_user, is_effective_premium
+from app.services import stats_service, tracing
+from app.services.text_filter import COMMENTS_FILTERED, VERDICT_OK, classify_comment
 from app.services.limit_service import (
     get_limits_for_user,
-    consume_photo_quota,
     get_user_today_analyses,
+    release_photo_quota,
+    reserve_photo_quota,
 )
 from app.config_limits import (
     PHOTO_SESSION_MAX_MESSAGES,
     PHOTO_SESSION_TIMEOUT_MINUTES,
     PRICE_PER_ANALYSIS,
 )
-from app.db.base import AsyncSessionLocal
-from app.db import models
+from app.db.models import QuotaReservation
 
 router = Router()
 logger = logging.getLogger(__name__)
 
 
-def _normalize_to_utc(dt: datetime | None) -> datetime | None:
-    """
-    Приводим datetime к UTC-aware.
-    Если None — возвращаем None.
-    """
-    if dt is None:
-        return None
-
-    if dt.tzinfo is None:
-        # считаем, что это уже UTC без таймзоны
-        return dt.replace(tzinfo=timezone.utc)
-
-    return dt.astimezone(timezone.utc)
-
-
-def _is_effective_premium(user) -> bool:
-    """
-    Пользователь считается премиумным, если:
-    - is_premium = True и
-    - premium_until либо не задан (бессрочный премиум), либо в будущем (UTC).
-    """
-    if not getattr(user, "is_premium", False):
-        return False
-
-    premium_until = _normalize_to_utc(getattr(user, "premium_until", None))
-    now = datetime.now(timezone.utc)
-
-    # premium_until=None → бессрочный премиум
-    if premium_until is None:
-        return True
-
-    return premium_until > now
-
-
-async def _download_photo_bytes(message: Message, file_id: str | None) -> bytes | None:
-    if not file_id:
-        await message.answer(T.get("photo_not_found"))
-        return None
-
-    try:
-        file_io = await message.bot.download(file_id)
-        if hasattr(file_io, "getvalue"):
-            return file_io.getvalue()
-        return file_io.read()
-    except Exception as e:
-        logger.exception("Не удалось скачать фото %s: %s", file_id, e)
-        await message.answer(T.get("analysis_failed"))
-        return None
-
-
 async def _ensure_session_active(message: Message, state: FSMContext) -> bool:
     data = await state.get_data()
     started_at_str = data.get("session_started_at")
@@ -111,127 +65,57 @@ async def _get_limits(message: Message) -> tuple[int, int]:
     """
     telegram_id = message.from_user.id
     user = await get_or_create_user(telegram_id)
-    is_premium = _is_effective_premium(user)
+    is_premium = is_effective_premium(user)
     return get_limits_for_user(is_premium)
 
 
-async def _check_and_increment_daily_limit(
+async def _reserve_daily_limit(
     message: Message,
     state: FSMContext,
     increment: bool,
-) -> bool:
+) -> tuple[bool, Optional[QuotaReservation]]:
     """
-    Проверяем дневной лимит анализов (фото) и, при необходимости, увеличиваем счётчик.
+    Резервируем анализ фото из дневного лимита, а если он исчерпан — из
+    купленного баланса (reserve_photo_quota, один запрос).
+    Возвращает (можно ли запускать анализ, резерв или None).
 
-    ВАЖНО:
-    - бесплатные лимиты учитываем через consume_photo_quota (user_limits.photos_used),
-    - платные лимиты списываем из user.paid_photos_balance,
-    - блокируем пользователя только если НЕТ ни бесплатных, ни платных лимитов.
+    Резерв подтверждает воркер после доставки ответа; если анализ не
+    состоялся, анализ возвращается пользователю.
 
     increment = True — только для ПЕРВОГО анализа нового фото.
     Уточнения и повторные прогоны по тому же фото лимит не тратят.
     """
     if not increment:
         # Это не первый запуск анализа для фото — лимит не трогаем.
-        return True
+        return True, None
 
     telegram_id = message.from_user.id
     user = await get_or_create_user(telegram_id)
+    is_premium = is_effective_premium(user)
 
-    is_premium = _is_effective_premium(user)
-    daily_limit, _ = get_limits_for_user(is_premium)
-
-    today = date.today()
-    used_analyses = await get_user_today_analyses(user.id, today)
-    if used_analyses is None:
-        used_analyses = 0
-
-    free_left = max(daily_limit - used_analyses, 0)
-    paid_left = user.paid_photos_balance or 0
-
-    # 1) Если ещё есть бесплатные — списываем их через consume_photo_quota,
-    #    чтобы вся статистика по бесплатным анализам считалась централизованно.
-    if free_left > 0:
-        allowed, used_after, _ = await consume_photo_quota(
-            user_id=user.id,
-            is_premium=is_premium,
-        )
-
-        if not allowed:
-            # Теоретически сюда попасть сложно (мы только что считали free_left),
-            # но на всякий случай показываем пользователю понятное сообщение.
-            await message.answer(
-                T.get("daily_limit_exceeded").format(limit=daily_limit)
-                + "\n"
-                + T.get("buy_additional_analyses").format(
-                    number_of_analyses=PRICE_PER_ANALYSIS["number_of_analyses"],
-                    price=PRICE_PER_ANALYSIS["price"],
-                ),
-                reply_markup=buy_more_analyses_inline_kb(),
-            )
-            await state.set_state(UserStates.STANDARD)
-            return False
-
-        logger.debug(
-            "User %s used %s/%s free daily photo analyses",
-            telegram_id,
-            used_after,
-            daily_limit,
-        )
-        return True
-
-    # 2) Бесплатные закончились, но есть платные — списываем их.
-    if paid_left > 0:
-        async with AsyncSessionLocal() as session:
-            db_user = await session.get(models.User, user.id)
-            if not db_user:
-                logger.error(
-                    "User %s not found when consuming paid photo quota", user.id
-                )
-                await message.answer(
-                    T.get("analysis_failed"),
-                    reply_markup=main_menu_kb(),
-                )
-                await state.set_state(UserStates.STANDARD)
-                return False
-
-            current_balance = db_user.paid_photos_balance or 0
-            if current_balance <= 0:
-                # Гонка состояний / рассинхрон, на всякий случай проверим.
-                await message.answer(
-                    T.get("daily_limit_exceeded").format(limit=daily_limit)
-                    + "\n"
-                    + T.get("buy_additional_analyses").format(
-                        number_of_analyses=PRICE_PER_ANALYSIS["number_of_analyses"],
-                        price=PRICE_PER_ANALYSIS["price"],
-                    ),
-                    reply_markup=buy_more_analyses_inline_kb(),
-                )
-                await state.set_state(UserStates.STANDARD)
-                return False
-
-            db_user.paid_photos_balance = current_balance - 1
-            await session.commit()
-
-        logger.debug(
-            "User %s used 1 paid photo analysis, remaining paid balance: %s",
-            telegram_id,
-            paid_left - 1,
+    reservation = await reserve_photo_quota(user.id, is_premium)
+    if reservation is None:
+        # Нет ни бесплатных, ни платных лимитов — полностью блокируем.
+        daily_limit, _ = get_limits_for_user(is_premium)
+        await message.answer(
+            T.get("daily_limit_exceeded").format(limit=daily_limit)
+            + "\n"
+            + T.get("buy_additional_analyses").format(
+                number_of_analyses=PRICE_PER_ANALYSIS["number_of_analyses"],
+                price=PRICE_PER_ANALYSIS["price"],
+            ),
+            reply_markup=buy_more_analyses_inline_kb(),
         )
-        return True
+        await state.set_state(UserStates.STANDARD)
+        return False, None
 
-    # 3) Нет ни бесплатных, ни платных лимитов — полностью блокируем.
-    await message.answer(
-        T.get("daily_limit_exceeded").format(limit=daily_limit)
-        + "\n"
-        + T.get("buy_additional_analyses").format(
-            number_of_analyses=PRICE_PER_ANALYSIS["number_of_analyses"],
-            price=PRICE_PER_ANALYSIS["price"],
-        ),
-        reply_markup=buy_more_analyses_inline_kb(),
+    logger.debug(
+        "User %s reserved 1 %s photo analysis (reservation %s)",
+        telegram_id,
+        reservation.source,
+        reservation.id,
     )
-    await state.set_state(UserStates.STANDARD)
-    return False
+    return True, reservation
 
 
 async def _check_daily_limit(message: Message, state: FSMContext) -> bool:
@@ -249,7 +133,7 @@ async def _check_daily_limit(message: Message, state: FSMContext) -> bool:
     telegram_id = message.from_user.id
     user = await get_or_create_user(telegram_id)
 
-    is_premium = _is_effective_premium(user)
+    is_premium = is_effective_premium(user)
     daily_limit, _ = get_limits_for_user(is_premium)
 
     today = date.today()
@@ -278,6 +162,19 @@ async def _check_daily_limit(message: Message, state: FSMContext) -> bool:
     return True
 
 
+async def _release_quota(reservation: Optional[QuotaReservation]) -> None:
+    """
+    Анализ не поставлен в очередь — вернуть зарезервированный лимит.
+    """
+    if reservation is None:
+        return
+    try:
+        await release_photo_quota(reservation.id)
+    except Exception as e:
+        # резерв без задачи всё равно снимет фоновая задача
+        logger.exception("Не удалось снять резерв лимита %s: %s", reservation.id, e)
+
+
 async def _run_analysis(
     message: Message,
     state: FSMContext,
@@ -285,50 +182,78 @@ async def _run_analysis(
     comment: str,
     count_for_daily_limit: bool,
     strip_questions: bool = False,
+    footer: str | None = None,
 ) -> None:
+    """
+    Зарезервировать лимит и поставить анализ в очередь (analysis_jobs). GPT вызывает
+    воркер (app/bot/analysis_worker.py) и сам присылает результат и footer.
+    """
     if not await _ensure_session_active(message, state):
         return
 
     data = await state.get_data()
     photo_id = data.get("current_photo_file_id")
+    if not photo_id:
+        await message.answer(T.get("photo_not_found"))
+        return
 
-    can_run = await _check_and_increment_daily_limit(
-        message, state, increment=count_for_daily_limit
-    )
+    with tracing.span("analysis.quota", increment=count_for_daily_limit) as quota_span:
+        can_run, reservation = await _reserve_daily_limit(
+            message, state, increment=count_for_daily_limit
+        )
+        if quota_span is not None:
+            quota_span.set(allowed=can_run)
     if not can_run:
         return
 
-    image_bytes = await _download_photo_bytes(message, photo_id)
-    if image_bytes is None:
-        return
+    handler_span = tracing.current_span()
+    if handler_span is not None:
+        handler_span.set(**{"analysis.type": analysis_type})
 
-    await message.answer(T.get("analyzing_image"))
+    user_id = data.get("user_id")
+    is_premium = data.get("is_premium")
+    if user_id is None or is_premium is None:
+        user = await get_or_create_user(message.from_user.id)
+        user_id, is_premium = user.id, is_effective_premium(user)
 
+    enqueuing = False
     try:
-        if analysis_type == "nutrition":
-            result = await analyze_nutrition(image_bytes, comment or None)
-        else:
-            result = await analyze_recipe(image_bytes, comment or None)
-
-        if not result:
-            result = T.get("analysis_failed")
-
-        if strip_questions:
-            lines = result.splitlines()
-            lines = [ln for ln in lines if not ln.lstrip().startswith("⁉️")]
-            result = "\n".join(lines).strip()
-
-        await message.answer(result, reply_markup=analysis_menu_kb())
-
-        calls = int(data.get("gpt_calls_for_current_photo", 0))
-        await state.update_data(gpt_calls_for_current_photo=calls + 1)
-
+        # «Анализирую» — до постановки, чтобы результат воркера не обогнал подтверждение
+        await message.answer(T.get("analyzing_image"))
+        enqueuing = True
+        # Постановку остановка процесса не прерывает: задача, записанная уже
+        # после отмены хендлера, всё равно будет выполнена и доставлена
+        await asyncio.shield(
+            enqueue_analysis(
+                user_id=user_id,
+                chat_id=message.chat.id,
+                analysis_type=analysis_type,
+                photo_file_id=photo_id,
+                comment=comment,
+                strip_questions=strip_questions,
+                footer=footer,
+                quota_reservation_id=reservation.id if reservation is not None else None,
+                premium=is_premium,
+            )
+        )
+    except asyncio.CancelledError:
+        # Остановка процесса (app/bot/shutdown.py). До постановки — анализа не будет,
+        # резерв снимаем; во время неё — задача допишется сама, а если запись
+        # не удастся, резерв без задачи снимет фоновая задача
+        if not enqueuing:
+            await _release_quota(reservation)
+        raise
     except Exception as e:
-        logger.exception("Ошибка при вызове GPT (%s): %s", analysis_type, e)
+        logger.exception("Не удалось поставить анализ в очередь (%s): %s", analysis_type, e)
+        await _release_quota(reservation)
         await message.answer(
             T.get("analysis_failed"),
             reply_markup=analysis_menu_kb(),
         )
+        return
+
+    calls = int(data.get("gpt_calls_for_current_photo", 0))
+    await state.update_data(gpt_calls_for_current_photo=calls + 1)
 
 
 # 1. Любое фото — старт анализа
@@ -489,7 +414,7 @@ async def on_new_photo(message: Message, state: FSMContext):
     telegram_id = message.from_user.id
     user = await get_or_create_user(telegram_id)
 
-    is_premium = _is_effective_premium(user)
+    is_premium = is_effective_premium(user)
     daily_limit, _ = get_limits_for_user(is_premium)
 
     today = date.today()
@@ -530,6 +455,42 @@ async def on_back_to_main_from_photo(message: Message, state: FSMContext):
     )
 
 
+async def _reject_comment(
+    message: Message,
+    state: FSMContext,
+    data: dict,
+    verdict: str,
+    is_refinement: bool,
+) -> None:
+    """
+    Сообщение отсеяно фильтром. Если анализ уже был, это попытка уточнения:
+    по спецификации она списывается, но GPT не вызывается.
+    """
+    logger.debug("User %s: comment rejected (%s)", message.from_user.id, verdict)
+    if not is_refinement:
+        COMMENTS_FILTERED.inc(verdict, "comment")
+        await message.answer(T.get("off_topic_warning"), reply_markup=analysis_menu_kb())
+        return
+
+    _, refinement_limit = await _get_limits(message)
+    refinements_used = int(data.get("refinements_used", 0))
+    if refinements_used >= refinement_limit:
+        await message.answer(T.get("refinement_limit_reached"), reply_markup=analysis_menu_kb())
+        return
+
+    refinements_used += 1
+    await state.update_data(refinements_used=refinements_used)
+    COMMENTS_FILTERED.inc(verdict, "refinement")
+    stats_service.incr(stats_service.GPT_CALLS_SAVED)
+
+    await message.answer(
+        T.get("off_topic_warning")
+        + "\n"
+        + T.get("off_topic_refinement_charged").format(used=refinements_used, limit=refinement_limit),
+        reply_markup=analysis_menu_kb(),
+    )
+
+
 # 6. Текст в режиме PHOTO_COMMENT — уточнения / комментарии
 # ВАЖНО: НЕ ПЕРЕХВАТЫВАЕМ КОМАНДЫ ("/superadmin" и т.п.)
 @router.message(UserStates.PHOTO_COMMENT, F.text, ~F.text.startswith("/"))
@@ -539,6 +500,8 @@ async def on_comment_text(message: Message, state: FSMContext):
 
     Логика:
       - увеличиваем счётчик сообщений к фото
+      - брань / мусор / off-topic отсекаем локальным фильтром до GPT
+        (после анализа это засчитывается как попытка уточнения)
       - если достигли PHOTO_SESSION_MAX_MESSAGES и анализ ЕЩЁ НЕ запускали
         → автоматически запускаем первый анализ
       - иначе:
@@ -550,17 +513,22 @@ async def on_comment_text(message: Message, state: FSMContext):
         return
 
     data = await state.get_data()
-    prev_comment = data.get("current_comment", "")
-    new_comment = (prev_comment + "\n" + message.text).strip()
-
-    await state.update_data(current_comment=new_comment)
-
     messages_count = int(data.get("messages_count", 0)) + 1
     await state.update_data(messages_count=messages_count)
 
     last_type = data.get("last_analysis_type")
     calls = int(data.get("gpt_calls_for_current_photo", 0))
 
+    # Брань, мусор и off-topic не попадают ни в комментарий, ни в GPT (docs/06, п. 6.4)
+    verdict = classify_comment(message.text)
+    if verdict != VERDICT_OK:
+        await _reject_comment(message, state, data, verdict, is_refinement=bool(calls or last_type))
+        return
+
+    prev_comment = data.get("current_comment", "")
+    new_comment = (prev_comment + "\n" + message.text).strip()
+    await state.update_data(current_comment=new_comment)
+
     if calls == 0 and messages_count >= PHOTO_SESSION_MAX_MESSAGES:
         if not last_type:
             last_type = "nutrition"
@@ -600,8 +568,10 @@ async def on_comment_text(message: Message, state: FSMContext):
 
     refinements_used += 1
     await state.update_data(refinements_used=refinements_used)
+    stats_service.incr(stats_service.REFINEMENTS)
 
     is_last = refinements_used >= refinement_limit
+    counter_key = "refinement_counter_last" if is_last else "refinement_counter"
 
     await _run_analysis(
         message=message,
@@ -610,22 +580,8 @@ async def on_comment_text(message: Message, state: FSMContext):
         comment=new_comment,
         count_for_daily_limit=False,
         strip_questions=is_last,
+        footer=T.get(counter_key).format(
+            used=refinements_used,
+            limit=refinement_limit,
+        ),
     )
-
-    remaining = refinement_limit - refinements_used
-    if remaining > 0:
-        await message.answer(
-            T.get("refinement_counter").format(
-                used=refinements_used,
-                limit=refinement_limit,
-            ),
-            reply_markup=analysis_menu_kb(),
-        )
-    else:
-        await message.answer(
-            T.get("refinement_counter_last").format(
-                used=refinements_used,
-                limit=refinement_limit,
-            ),
-            reply_markup=analysis_menu_kb(),
-        )
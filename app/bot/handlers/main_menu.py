@@ -1,10 +1,12 @@
 # app/bot/handlers/main_menu.py
 
 import logging
-from datetime import date, datetime, timezone
+from datetime import date
 
 from aiogram import Router, F
+from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import default_state
 from aiogram.types import Message
 
 from app.bot.keyboards import (
@@ -16,7 +18,7 @@ from app.bot.keyboards import (
 from app.bot.states import UserStates
 from app.locales.ru.texts import RussianTexts as T
 from app.locales.ru.buttons import RussianButtons as B
-from app.services.user_service import get_or_create_user
+from app.services.user_service import get_or_create_user, is_effective_premium
 from app.config_limits import PRICE_PER_ANALYSIS
 from app.services.limit_service import get_limits_for_user, get_user_today_analyses
 
@@ -24,25 +26,10 @@ from app.services.limit_service import get_limits_for_user, get_user_today_analy
 router = Router()
 logger = logging.getLogger(__name__)
 
-
-def _is_effective_premium(user) -> bool:
-    """
-    Пользователь считается премиумным, если:
-    - is_premium = True
-    - premium_until не истёк (или нет даты → бессрочный премиум)
-    """
-    if not getattr(user, "is_premium", False):
-        return False
-
-    premium_until = getattr(user, "premium_until", None)
-
-    # aware datetime (UTC)
-    now = datetime.now(timezone.utc)
-
-    if premium_until is None:
-        return True  # бессрочный премиум
-
-    return premium_until > now
+# Главное меню: STANDARD или состояния нет вовсе — запись FSM удалена после
+# простоя (fsm_gc, app/bot/fsm_storage.py) или потеряна при рестарте, а
+# клавиатура главного меню у пользователя осталась
+MAIN_MENU = StateFilter(UserStates.STANDARD, default_state)
 
 
 # /start — вход в бота
@@ -70,7 +57,7 @@ async def cmd_start(message: Message, state: FSMContext):
 
 
 # Кнопка "📸 Анализировать еду"
-@router.message(UserStates.STANDARD, F.text == B.get("analyze_food"))
+@router.message(MAIN_MENU, F.text == B.get("analyze_food"))
 async def on_analyze_food(message: Message, state: FSMContext):
     """
     Начинаем процесс анализа еды.
@@ -83,7 +70,7 @@ async def on_analyze_food(message: Message, state: FSMContext):
     telegram_id = message.from_user.id
     user = await get_or_create_user(telegram_id)
 
-    is_premium = _is_effective_premium(user)
+    is_premium = is_effective_premium(user)
     daily_limit, _ = get_limits_for_user(is_premium)
 
     today = date.today()
@@ -116,17 +103,8 @@ async def on_analyze_food(message: Message, state: FSMContext):
     )
 
 
-# Кнопка "Отчеты" (сейчас недостижима, т.к. кнопки нет в главном меню)
-@router.message(UserStates.STANDARD, F.text == B.get("reports"))
-async def on_reports(message: Message, state: FSMContext):
-    await message.answer(
-        T.get("reports_placeholder"),
-        reply_markup=main_menu_kb(),
-    )
-
-
 # Кнопка "Помощь"
-@router.message(UserStates.STANDARD, F.text == B.get("help"))
+@router.message(MAIN_MENU, F.text == B.get("help"))
 async def on_help(message: Message, state: FSMContext):
     """
     Помощь показывает тот же расширенный текст, что и /start.
@@ -140,7 +118,7 @@ async def on_help(message: Message, state: FSMContext):
 
 
 # Кнопка "Профиль"
-@router.message(UserStates.STANDARD, F.text == B.get("profile"))
+@router.message(MAIN_MENU, F.text == B.get("profile"))
 async def on_profile(message: Message, state: FSMContext):
     # Переход в профиль обрабатывается в profile.py, здесь просто заглушка на случай коллизий
     await message.answer(
@@ -150,7 +128,7 @@ async def on_profile(message: Message, state: FSMContext):
 
 
 # Кнопка "Купить премиум"
-@router.message(UserStates.STANDARD, F.text == B.get("buy_premium"))
+@router.message(MAIN_MENU, F.text == B.get("buy_premium"))
 async def on_buy_premium(message: Message, state: FSMContext):
     """
     Открываем экран покупки премиума:
@@ -176,8 +154,8 @@ async def on_back_to_main(message: Message, state: FSMContext):
     )
 
 
-# Fallback: любой текст в STANDARD
-@router.message(UserStates.STANDARD, F.text)
+# Fallback: любой текст в главном меню
+@router.message(MAIN_MENU, F.text)
 async def on_unknown_in_main(message: Message, state: FSMContext):
     await message.answer(
         T.get("help_text"),
@@ -7,6 +7,7 @@ from aiogram.fsm.context import FSMContext
 from app.locales.ru.texts import RussianTexts as T
 from app.locales.ru.buttons import RussianButtons as B
 from app.services.user_service import get_or_create_user
+from app.services import stats_service
 from app.config_limits import STARS_PREMIUM_WEEK, STARS_PREMIUM_MONTH, PRICE_PER_ANALYSIS
 from app.db.base import AsyncSessionLocal
 from app.db import models
@@ -127,4 +128,10 @@ async def on_successful_payment(message: Message):
         await session.merge(user)
         await session.commit()
 
+    stats_service.incr(stats_service.PAYMENTS)
+    stats_service.incr(
+        stats_service.PAYMENTS_STARS,
+        message.successful_payment.total_amount,
+    )
+
     await message.answer(text)
@@ -14,6 +14,7 @@ from app.bot.keyboards import premium_menu_kb, main_menu_kb
 from app.locales.ru.buttons import RussianButtons as B
 from app.locales.ru.texts import RussianTexts as T
 from app.services.user_service import get_or_create_user
+from app.services import promo_guard, stats_service
 from app.db.base import AsyncSessionLocal
 from app.db import models
 
@@ -65,7 +66,11 @@ async def on_enter_promo(message: Message, state: FSMContext) -> None:
 
 
 @router.message(UserStates.PROMO)
-async def on_promo_input(message: Message, state: FSMContext) -> None:
+async def on_promo_input(
+    message: Message,
+    state: FSMContext,
+    db_user: models.User | None = None,
+) -> None:
     """
     Обработка введённого промокода.
     """
@@ -90,10 +95,31 @@ async def on_promo_input(message: Message, state: FSMContext) -> None:
 
     code = raw_code.upper()
 
-    telegram_id = message.from_user.id
-    user = await get_or_create_user(telegram_id)
-
-    success, reply_text = await _apply_promo_code(user_id=user.id, code=code)
+    if db_user is None:
+        db_user = await get_or_create_user(message.from_user.id)
+
+    # 2) Бан — без запросов к БД, заведомо несуществующий код — без полной проверки
+    #    (app/services/promo_guard.py)
+    until = await promo_guard.banned_until(db_user.id)
+    if until is None:
+        if await promo_guard.might_exist(code):
+            success, reply_text = await _apply_promo_code(user_id=db_user.id, code=code)
+            filtered = False
+        else:
+            success, reply_text = False, T.get("premium_promo_invalid")
+            filtered = True
+
+        if success:
+            promo_guard.register_success(db_user.id)
+        else:
+            until = await promo_guard.register_failure(db_user.id, filtered=filtered)
+
+    if until is not None:
+        await message.answer(
+            T.get("premium_promo_banned_until", until=until.strftime("%d.%m.%Y %H:%M")),
+            reply_markup=premium_menu_kb(),
+        )
+        return
 
     if not success:
         # При ошибке остаёмся в состоянии PROMO, чтобы можно было попробовать ещё раз
@@ -134,16 +160,7 @@ async def _apply_promo_code(user_id: int, code: str) -> tuple[bool, str]:
             # Теоретически не должно случаться
             return False, T.get("premium_promo_internal_error") or "Внутренняя ошибка при обработке промокода."
 
-        # 2. Проверяем бан по промокодам
-        ban_stmt = select(models.PromoBan).where(
-            models.PromoBan.user_id == user.id,
-            models.PromoBan.banned_until > now,
-        )
-        ban_res = await session.execute(ban_stmt)
-        ban = ban_res.scalar_one_or_none()
-
-        if ban:
-            return False, T.get("premium_promo_banned") or "Вы временно не можете использовать промокоды."
+        # 2. Бан по промокодам проверен до вызова (promo_guard.banned_until)
 
         # 3. Ищем сам промокод
         promo_stmt = select(models.PromoCode).where(models.PromoCode.code == code)
@@ -209,6 +226,8 @@ async def _apply_promo_code(user_id: int, code: str) -> tuple[bool, str]:
 
         await session.commit()
 
+    stats_service.incr(stats_service.PROMO_ACTIVATIONS)
+
     until_str = new_until.date().isoformat()
     success_msg = T.get(
         "premium_promo_success",
@@ -1,6 +1,6 @@
 # app/bot/handlers/profile.py
 
-from datetime import datetime, date, timezone
+from datetime import date
 
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
@@ -9,35 +9,13 @@ from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
 from app.bot.states import UserStates
 from app.locales.ru.buttons import RussianButtons as B
 from app.locales.ru.texts import RussianTexts as T
-from app.services.user_service import get_or_create_user
+from app.services.user_service import get_or_create_user, is_effective_premium
 from app.services.limit_service import get_limits_for_user, get_user_today_analyses
+from app.services.nutrition_service import set_calorie_target
 
 router = Router(name="profile")
 
 
-def _now_utc() -> datetime:
-    return datetime.now(timezone.utc)
-
-
-def _normalize_to_utc(dt: datetime | None) -> datetime | None:
-    if dt is None:
-        return None
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
-
-
-def _is_effective_premium(user) -> bool:
-    if not getattr(user, "is_premium", False):
-        return False
-
-    premium_until = _normalize_to_utc(getattr(user, "premium_until", None))
-    if premium_until is None:
-        return True
-
-    return premium_until > _now_utc()
-
-
 def build_profile_keyboard(is_premium: bool = False) -> ReplyKeyboardMarkup:
     """
     Клавиатура профиля:
@@ -73,7 +51,7 @@ async def on_profile_open(message: Message, state: FSMContext):
     telegram_id = message.from_user.id
     user = await get_or_create_user(telegram_id)
 
-    is_premium = _is_effective_premium(user)
+    is_premium = is_effective_premium(user)
     daily_limit, _ = get_limits_for_user(is_premium=is_premium)
 
     today = date.today()
@@ -115,7 +93,7 @@ async def on_profile_open(message: Message, state: FSMContext):
     )
 
 
-# --- План калорий, оставляем как есть ---
+# --- План калорий (используется в отчётах) ---
 
 @router.message(F.text == B.get("calorie_plan"))
 async def on_calorie_plan_start(message: Message, state: FSMContext):
@@ -137,6 +115,10 @@ async def on_calorie_plan_input(message: Message, state: FSMContext):
         await message.answer(T.get("calories_plan_invalid"))
         return
 
+    telegram_id = message.from_user.id
+    user = await get_or_create_user(telegram_id)
+    await set_calorie_target(user.id, value)
+
     if value == 0:
         await message.answer(T.get("calories_plan_reset"))
     else:
@@ -144,9 +126,7 @@ async def on_calorie_plan_input(message: Message, state: FSMContext):
 
     await state.set_state(UserStates.STANDARD)
 
-    telegram_id = message.from_user.id
-    user = await get_or_create_user(telegram_id)
-    is_premium = _is_effective_premium(user)
+    is_premium = is_effective_premium(user)
 
     await message.answer(
         T.get("profile_updated"),
@@ -1,17 +1,151 @@
 # app/bot/handlers/reports.py
 
+import logging
+
 from aiogram import Router, F
-from aiogram.types import Message
+from aiogram.fsm.context import FSMContext
+from aiogram.types import BufferedInputFile, Message
 
 from app.bot.keyboards import reports_menu_kb
+from app.bot.states import UserStates
 from app.locales.ru.buttons import RussianButtons as B
 from app.locales.ru.texts import RussianTexts as T
+from app.config_limits import EXPORT_MAX_DOCUMENT_BYTES
+from app.services.chart_service import ChartBusyError, render_report_chart
+from app.services.export_service import as_input_file, export_meals
+from app.services.report_service import Report, get_report
+from app.services.user_service import get_or_create_user
+
+router = Router(name="reports")
+logger = logging.getLogger(__name__)
+
+
+def format_report(report: Report) -> str:
+    """
+    Текст отчёта: заголовок, итоги, отклонение от плана и разбивка.
+    """
+    if report.period == "day":
+        title = T.get("report_title_day", date=report.end.strftime("%d.%m.%Y"))
+    else:
+        title = T.get(
+            f"report_title_{report.period}",
+            start=report.start.strftime("%d.%m"),
+            end=report.end.strftime("%d.%m"),
+        )
+
+    lines = [title, ""]
+
+    if report.meals_count == 0:
+        lines.append(T.get("report_empty"))
+    else:
+        lines.append(
+            T.get(
+                "report_totals",
+                calories=report.calories,
+                proteins=report.proteins,
+                fats=report.fats,
+                carbs=report.carbs,
+                meals=report.meals_count,
+            )
+        )
+
+    if report.deviation is not None:
+        lines.append(
+            T.get(
+                "report_target",
+                target=report.target_total,
+                deviation=report.deviation,
+            )
+        )
+    else:
+        lines.append(T.get("report_no_target"))
+
+    if report.items:
+        lines.append("")
+        for item in report.items:
+            if report.period == "day":
+                lines.append(
+                    T.get("report_item_meal", label=item.label, calories=item.calories)
+                )
+            else:
+                lines.append(
+                    T.get(
+                        "report_item_day",
+                        label=item.label,
+                        calories=item.calories,
+                        meals=item.meals_count,
+                    )
+                )
+
+    return "\n".join(lines)
+
+
+async def _send_report(message: Message, period: str) -> None:
+    user = await get_or_create_user(message.from_user.id)
+
+    try:
+        report = await get_report(user.id, period)
+    except Exception as e:
+        logger.exception("Не удалось построить отчёт %s: %s", period, e)
+        await message.answer(T.get("report_error"), reply_markup=reports_menu_kb())
+        return
+
+    await message.answer(format_report(report), reply_markup=reports_menu_kb())
 
-router = Router()
+    # График — только для недели/месяца и только если есть данные
+    if report.period == "day" or report.meals_count == 0:
+        return
+
+    try:
+        png = await render_report_chart(user.id, report)
+    except ChartBusyError:
+        logger.warning("Chart queue is full, report %s sent without chart", period)
+        return
+    except Exception as e:
+        logger.exception("Не удалось нарисовать график %s: %s", period, e)
+        return
+
+    await message.answer_photo(
+        BufferedInputFile(png, filename=f"report_{period}.png"),
+    )
+
+
+async def send_meals_export(message: Message, user_id: int, fmt: str) -> None:
+    """
+    Выгрузка дневника пользователя user_id документом в текущий чат.
+    Используется и пользователем (свой дневник), и админкой (/export).
+    """
+    await message.answer(T.get("export_preparing"))
+
+    try:
+        export = await export_meals(user_id, fmt)
+    except Exception as e:
+        logger.exception("Не удалось выгрузить meals user_id=%s: %s", user_id, e)
+        await message.answer(T.get("export_error"))
+        return
+
+    try:
+        if export.rows == 0:
+            await message.answer(T.get("export_empty"))
+            return
+
+        if export.size_bytes > EXPORT_MAX_DOCUMENT_BYTES:
+            await message.answer(
+                T.get("export_too_large", size_mb=export.size_bytes // (1024 * 1024))
+            )
+            return
+
+        await message.answer_document(
+            as_input_file(export),
+            caption=T.get("export_caption", rows=export.rows),
+        )
+    finally:
+        export.close()
 
 
 @router.message(F.text == B.get("reports"))
-async def open_reports(message: Message):
+async def open_reports(message: Message, state: FSMContext):
+    await state.set_state(UserStates.STANDARD)
     await message.answer(
         T.get("reports_placeholder"),
         reply_markup=reports_menu_kb(),
@@ -19,15 +153,27 @@ async def open_reports(message: Message):
 
 
 @router.message(F.text == B.get("report_day"))
-async def report_day_stub(message: Message):
-    await message.answer(T.get("report_day_placeholder"))
+async def report_day(message: Message):
+    await _send_report(message, "day")
 
 
 @router.message(F.text == B.get("report_week"))
-async def report_week_stub(message: Message):
-    await message.answer(T.get("report_week_placeholder"))
+async def report_week(message: Message):
+    await _send_report(message, "week")
 
 
 @router.message(F.text == B.get("report_month"))
-async def report_month_stub(message: Message):
-    await message.answer(T.get("report_month_placeholder"))
+async def report_month(message: Message):
+    await _send_report(message, "month")
+
+
+@router.message(F.text == B.get("export_csv"))
+async def export_diary_csv(message: Message):
+    user = await get_or_create_user(message.from_user.id)
+    await send_meals_export(message, user.id, "csv")
+
+
+@router.message(F.text == B.get("export_json"))
+async def export_diary_json(message: Message):
+    user = await get_or_create_user(message.from_user.id)
+    await send_meals_export(message, user.id, "ndjson")
@@ -13,7 +13,7 @@ from app.locales.ru.buttons import RussianButtons as B
 
 def main_menu_kb() -> ReplyKeyboardMarkup:
     """
-    Главное меню: Анализ, Профиль, Премиум, Помощь.
+    Главное меню: Анализ, Профиль, Премиум, Отчёты, Помощь.
     Кнопки сгруппированы так, чтобы не занимать слишком много места по вертикали.
     """
     return ReplyKeyboardMarkup(
@@ -25,8 +25,11 @@ def main_menu_kb() -> ReplyKeyboardMarkup:
                 KeyboardButton(text=B.get("profile")),
                 KeyboardButton(text=B.get("buy_premium")),
             ],
-            # Помощь отдельной строкой внизу
-            [KeyboardButton(text=B.get("help"))],
+            # Отчёты + Помощь внизу
+            [
+                KeyboardButton(text=B.get("reports")),
+                KeyboardButton(text=B.get("help")),
+            ],
         ],
         resize_keyboard=True,
         is_persistent=True,
@@ -84,9 +87,7 @@ def profile_menu_kb() -> ReplyKeyboardMarkup:
 
 def reports_menu_kb() -> ReplyKeyboardMarkup:
     """
-    Меню отчётов.
-    Сейчас недостижимо для пользователя, потому что
-    кнопка 'Отчеты' скрыта из главного меню.
+    Меню отчётов: день / неделя / месяц + выгрузка дневника.
     """
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -95,6 +96,10 @@ def reports_menu_kb() -> ReplyKeyboardMarkup:
                 KeyboardButton(text=B.get("report_week")),
                 KeyboardButton(text=B.get("report_month")),
             ],
+            [
+                KeyboardButton(text=B.get("export_csv")),
+                KeyboardButton(text=B.get("export_json")),
+            ],
             [KeyboardButton(text=B.get("back"))],
         ],
         resize_keyboard=True,
@@ -152,12 +157,44 @@ def admin_menu_kb() -> ReplyKeyboardMarkup:
             [KeyboardButton(text=B.get("admin_statistics"))],
             [KeyboardButton(text=B.get("admin_manage_limits"))],
             [KeyboardButton(text=B.get("admin_promo"))],
+            [KeyboardButton(text=B.get("admin_profile"))],
+            [KeyboardButton(text=B.get("admin_broadcast"))],
             [KeyboardButton(text=B.get("admin_exit"))],
         ],
         resize_keyboard=True,
     )
 
 
+def admin_broadcast_confirm_kb() -> ReplyKeyboardMarkup:
+    """
+    Подтверждение рассылки.
+    """
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text=B.get("admin_broadcast_confirm"))],
+            [KeyboardButton(text=B.get("admin_limits_back"))],
+        ],
+        resize_keyboard=True,
+    )
+
+
+def admin_stats_menu_kb() -> ReplyKeyboardMarkup:
+    """
+    Выбор периода админ-статистики.
+    """
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [
+                KeyboardButton(text=B.get("stat_week")),
+                KeyboardButton(text=B.get("stat_month")),
+                KeyboardButton(text=B.get("stat_all_time")),
+            ],
+            [KeyboardButton(text=B.get("admin_limits_back"))],
+        ],
+        resize_keyboard=True,
+    )
+
+
 def admin_limits_menu_kb() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -0,0 +1,72 @@
+# app/bot/middlewares/flood.py
+
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from app.locales.ru.texts import RussianTexts as T
+from app.services.flood_control import (
+    ALLOW,
+    KIND_CALLBACK,
+    KIND_PHOTO,
+    KIND_TEXT,
+    REJECT_ESCALATE,
+    REJECT_NOTIFY,
+    FloodLimiter,
+    flag_suspicious,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class FloodMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.message и dp.callback_query: корзины токенов
+    на пользователя (app/services/flood_control.py). Отброшенный апдейт
+    не доходит ни до UserMiddleware, ни до хендлеров — без запросов к БД.
+    Оплаты не ограничиваются.
+    """
+
+    def __init__(self, limiter: FloodLimiter) -> None:
+        self.limiter = limiter
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, CallbackQuery):
+            kind = KIND_CALLBACK
+        elif isinstance(event, Message) and event.successful_payment is None:
+            kind = KIND_PHOTO if event.photo else KIND_TEXT
+        else:
+            return await handler(event, data)
+
+        if event.from_user is None:
+            return await handler(event, data)
+
+        decision = self.limiter.hit(event.from_user.id, kind)
+        if decision == ALLOW:
+            return await handler(event, data)
+
+        if decision == REJECT_ESCALATE:
+            # редкий путь: один раз на пользователя за окно
+            try:
+                await flag_suspicious(event.from_user.id)
+            except Exception as e:
+                logger.exception("Антифлуд: не удалось записать is_suspicious (%s): %s", event.from_user.id, e)
+            await self._notify(event, T.get("flood_suspicious"))
+        elif decision == REJECT_NOTIFY:
+            await self._notify(event, T.get("flood_wait"))
+        return None
+
+    @staticmethod
+    async def _notify(event: Message | CallbackQuery, text: str) -> None:
+        # у кнопки — всплывающее уведомление, у сообщения — ответ в чат
+        try:
+            await event.answer(text)
+        except Exception as e:
+            logger.debug("Антифлуд: предупреждение не отправлено: %s", e)
@@ -0,0 +1,86 @@
+# app/bot/middlewares/metrics.py
+
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.services import metrics
+
+UPDATE_LATENCY = metrics.histogram(
+    "dishvision_update_duration_seconds",
+    "Время обработки апдейта от получения до ответа хендлера",
+    ("router", "handler"),
+)
+UPDATE_ERRORS = metrics.counter(
+    "dishvision_update_errors_total",
+    "Необработанные исключения в хендлерах",
+    ("router", "handler", "error"),
+)
+UPDATES_IN_FLIGHT = metrics.gauge(
+    "dishvision_updates_in_flight",
+    "Апдейты, которые обрабатываются прямо сейчас",
+)
+
+# Ключ в data, через который внутренний middleware сообщает внешнему,
+# какой хендлер в итоге сработал
+CTX_KEY = "metrics_ctx"
+
+
+class _UpdateLabels:
+    __slots__ = ("router", "handler")
+
+    def __init__(self) -> None:
+        self.router = "none"
+        self.handler = "unhandled"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: латентность, ошибки и in-flight по каждому апдейту.
+
+    Метки router/handler становятся известны только после фильтров, поэтому
+    их проставляет HandlerLabelMiddleware (inner) в общий объект из data.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        labels = _UpdateLabels()
+        data[CTX_KEY] = labels
+
+        UPDATES_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            UPDATE_ERRORS.inc(labels.router, labels.handler, type(e).__name__)
+            raise
+        finally:
+            UPDATES_IN_FLIGHT.dec()
+            UPDATE_LATENCY.observe(time.perf_counter() - started, labels.router, labels.handler)
+
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """
+    Inner-middleware: запоминает, какой хендлер выбран для события.
+    Роутер определяется по модулю хендлера: app.bot.handlers.analysis → "analysis".
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        labels = data.get(CTX_KEY)
+        handler_object = data.get("handler")
+        if labels is not None and handler_object is not None:
+            callback = handler_object.callback
+            labels.router = callback.__module__.rsplit(".", 1)[-1]
+            labels.handler = callback.__name__
+        return await handler(event, data)
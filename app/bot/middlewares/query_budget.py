@@ -0,0 +1,75 @@
+# app/bot/middlewares/query_budget.py
+
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.bot.middlewares.metrics import CTX_KEY
+from app.config_limits import UPDATE_QUERY_BUDGET
+from app.db import query_stats
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+QUERIES_PER_UPDATE = metrics.histogram(
+    "dishvision_db_queries_per_update",
+    "Сколько SQL-запросов выполнено за один апдейт",
+    buckets=(0, 1, 2, 3, 5, 8, 13, 20, 30, 50, 100),
+)
+BUDGET_EXCEEDED = metrics.counter(
+    "dishvision_update_query_budget_exceeded_total",
+    f"Апдейты, сделавшие больше {UPDATE_QUERY_BUDGET} запросов",
+    ("router", "handler"),
+)
+N_PLUS_ONE = metrics.counter(
+    "dishvision_update_n_plus_one_total",
+    "Апдейты, в которых один и тот же запрос повторялся много раз",
+    ("router", "handler"),
+)
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: считает SQL-запросы апдейта и
+    предупреждает о превышении бюджета и о признаках N+1.
+    Регистрировать после MetricsMiddleware (нужны метки router/handler).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        with query_stats.track_update() as queries:
+            try:
+                return await handler(event, data)
+            finally:
+                self._check(queries, data)
+
+    @staticmethod
+    def _check(queries: query_stats.UpdateQueries, data: Dict[str, Any]) -> None:
+        QUERIES_PER_UPDATE.observe(queries.count)
+
+        labels = data.get(CTX_KEY)
+        router = labels.router if labels is not None else "none"
+        handler = labels.handler if labels is not None else "unhandled"
+
+        if queries.over_budget:
+            BUDGET_EXCEEDED.inc(router, handler)
+            logger.warning(
+                "Апдейт %s.%s: %s запросов к БД (бюджет %s), %.0f мс",
+                router, handler, queries.count, UPDATE_QUERY_BUDGET,
+                queries.total_seconds * 1000,
+            )
+
+        repeated = queries.repeated()
+        if repeated:
+            N_PLUS_ONE.inc(router, handler)
+            for fp, count in repeated:
+                logger.warning(
+                    "Возможный N+1 в %s.%s: %s раз — %s",
+                    router, handler, count, fp[:300],
+                )
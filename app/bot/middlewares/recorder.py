@@ -0,0 +1,28 @@
+# app/bot/middlewares/recorder.py
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.services.update_recorder import UpdateRecorder
+
+
+class RecorderMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: пишет анонимизированный апдейт в момент
+    получения (до обработки), см. app/services/update_recorder.py.
+    """
+
+    def __init__(self, recorder: UpdateRecorder) -> None:
+        self.recorder = recorder
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            self.recorder.record(event)
+        return await handler(event, data)
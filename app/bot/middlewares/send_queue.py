@@ -0,0 +1,43 @@
+# app/bot/middlewares/send_queue.py
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from app.services.send_queue import SendQueue, send_queue
+
+# Методы, которые Telegram считает сообщениями в чат (лимиты 30/с и 1/с на чат)
+_EXTRA_LIMITED_METHODS = frozenset({
+    "copyMessage",
+    "copyMessages",
+    "forwardMessage",
+    "forwardMessages",
+    "editMessageText",
+    "editMessageCaption",
+    "editMessageMedia",
+    "editMessageReplyMarkup",
+})
+
+
+def _is_rate_limited(method) -> bool:
+    if getattr(method, "chat_id", None) is None:
+        return False
+    name = method.__api_method__
+    if name.startswith("send"):
+        return name != "sendChatAction"
+    return name in _EXTRA_LIMITED_METHODS
+
+
+class OutboundRateLimiter(BaseRequestMiddleware):
+    """
+    Пропускает отправку сообщений через очередь app/services/send_queue.py.
+    Остальные вызовы (getUpdates, getFile, answerCallbackQuery, ...) — напрямую.
+    Вешается на bot.session.middleware(...) после трассировки, чтобы
+    ожидание в очереди попадало в span telegram.<method>.
+    """
+
+    def __init__(self, queue: SendQueue = send_queue) -> None:
+        self.queue = queue
+
+    async def __call__(self, make_request, bot, method):
+        if not _is_rate_limited(method):
+            return await make_request(bot, method)
+        return await self.queue.submit(make_request, bot, method)
@@ -0,0 +1,46 @@
+# app/bot/middlewares/tracing.py
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.bot.middlewares.metrics import CTX_KEY
+from app.services import tracing
+
+
+class TracingMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: корневой span апдейта.
+    Регистрировать после MetricsMiddleware — тогда в корень попадёт имя хендлера.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        attributes = {}
+        if isinstance(event, Update):
+            attributes = {"update.id": event.update_id, "update.type": event.event_type}
+
+        with tracing.start_trace("update", **attributes) as root:
+            try:
+                return await handler(event, data)
+            finally:
+                labels = data.get(CTX_KEY)
+                if root is not None and labels is not None:
+                    root.set(router=labels.router, handler=labels.handler)
+
+
+class TelegramRequestTracing(BaseRequestMiddleware):
+    """
+    Span на каждый вызов Bot API (sendMessage, getFile, ...).
+    Вешается на bot.session.middleware(...).
+    """
+
+    async def __call__(self, make_request, bot, method):
+        with tracing.span(f"telegram.{method.__api_method__}"):
+            return await make_request(bot, method)
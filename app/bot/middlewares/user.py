@@ -6,7 +6,9 @@ from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
-from app.services.user_service import get_or_create_user
+from app.services import stats_service, tracing
+from app.services.flood_control import sync_suspicious
+from app.services.user_service import get_or_create_user, is_effective_premium
 
 
 class UserMiddleware(BaseMiddleware):
@@ -14,7 +16,7 @@ class UserMiddleware(BaseMiddleware):
     На каждом апдейте:
     - гарантирует, что пользователь есть в БД;
     - кладёт объект User в data["db_user"];
-    - кладёт user_id в FSM (state.data["user_id"]).
+    - кладёт user_id и тариф в FSM (state.data["user_id"], state.data["is_premium"]).
     """
 
     async def __call__(
@@ -31,13 +33,18 @@ class UserMiddleware(BaseMiddleware):
             tg_user = event.from_user
 
         if tg_user is not None:
-            user = await get_or_create_user(telegram_id=tg_user.id)
+            with tracing.span("user.get_or_create"):
+                user = await get_or_create_user(telegram_id=tg_user.id)
             # кладём и под старым ключом, и под универсальным
             data["db_user"] = user
             data["user"] = user
+            stats_service.mark_active(user.id)
+            # мягкий бан за флуд из БД — в корзины антифлуда
+            sync_suspicious(user)
 
             state: FSMContext | None = data.get("state")
             if state is not None:
-                await state.update_data(user_id=user.id)
+                await state.update_data(user_id=user.id, is_premium=is_effective_premium(user))
 
-        return await handler(event, data)
+        with tracing.span("handler"):
+            return await handler(event, data)
@@ -0,0 +1,130 @@
+# app/bot/shutdown.py
+"""
+Штатная остановка процесса бота (SIGTERM / Ctrl+C), см. bot_services в app/main.py.
+
+1. Приём апдейтов уже остановлен (polling завершился / шард перестал читать stdin).
+2. Ждём начатые апдейты: хендлер мог списать лимит и ещё не поставить анализ
+   в очередь. Не успевшие к сроку отменяются — _run_analysis снимает резерв лимита.
+3. Воркеры анализов перестают брать задачи и дорабатывают текущие в пределах
+   того же срока; не успевшие возвращаются в очередь (release_job) и будут
+   выполнены после перезапуска, резерв лимита за ними сохраняется.
+4. Останавливаются фоновые службы, сбрасываются буферы (статистика, очередь
+   отправки, запись апдейтов).
+5. Закрываются клиенты: OpenAI → сессия Bot API → пул соединений БД.
+
+Общий срок шагов 2–3 — SHUTDOWN_DRAIN_TIMEOUT_SECONDS.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import TelegramObject
+
+from app.config_limits import SHUTDOWN_DRAIN_TIMEOUT_SECONDS
+from app.db.base import engine
+from app.services.gpt_client import close_client
+
+logger = logging.getLogger(__name__)
+
+
+class ShutdownCoordinator:
+    """
+    Учёт апдейтов, которые обрабатываются прямо сейчас, и срок на их доработку.
+    """
+
+    def __init__(self, drain_timeout: float = SHUTDOWN_DRAIN_TIMEOUT_SECONDS) -> None:
+        self.drain_timeout = drain_timeout
+        self.stopping = False
+        self._deadline = 0.0
+        self._updates: set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._updates)
+
+    def begin(self) -> None:
+        """
+        Начать остановку: с этого момента идёт общий срок на доработку.
+        """
+        if not self.stopping:
+            self.stopping = True
+            self._deadline = time.monotonic() + self.drain_timeout
+
+    def remaining(self) -> float:
+        """
+        Сколько секунд осталось от срока (0, если остановка не начата или срок вышел).
+        """
+        if not self.stopping:
+            return 0.0
+        return max(self._deadline - time.monotonic(), 0.0)
+
+    async def drain_updates(self) -> int:
+        """
+        Дождаться начатых апдейтов; не успевшие — отменить и дождаться отмены
+        (хендлеры успевают вернуть лимит). Возвращает число отменённых.
+        """
+        self.begin()
+        if not self._updates:
+            return 0
+
+        logger.info("Остановка: ждём %s апдейтов (до %.0f с)", len(self._updates), self.remaining())
+        _, pending = await asyncio.wait(set(self._updates), timeout=self.remaining())
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning("Остановка: отменено %s незавершённых апдейтов", len(pending))
+        return len(pending)
+
+    def track(self, task: asyncio.Task) -> None:
+        self._updates.add(task)
+
+    def untrack(self, task: asyncio.Task) -> None:
+        self._updates.discard(task)
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: регистрирует апдейт в ShutdownCoordinator
+    на время обработки.
+    """
+
+    def __init__(self, coordinator: ShutdownCoordinator) -> None:
+        self.coordinator = coordinator
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        task = asyncio.current_task()
+        self.coordinator.track(task)
+        try:
+            return await handler(event, data)
+        finally:
+            self.coordinator.untrack(task)
+
+
+async def close_clients(bot: Bot) -> None:
+    """
+    Последний шаг остановки: клиент OpenAI, сессия Bot API, пул соединений БД.
+    """
+    for name, close in (
+        ("OpenAI", close_client),
+        ("Bot API", bot.session.close),
+        ("БД", engine.dispose),
+    ):
+        try:
+            await close()
+        except Exception as e:
+            logger.exception("Остановка: не удалось закрыть %s: %s", name, e)
+
+
+# Один на процесс: middleware регистрирует апдейты, bot_services дожидается их
+shutdown_coordinator = ShutdownCoordinator()
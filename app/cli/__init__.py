@@ -0,0 +1,2 @@
+# app/cli/__init__.py
+# Служебные команды: запускаются как `python -m app.cli.<команда>`.
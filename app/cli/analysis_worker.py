@@ -0,0 +1,73 @@
+# app/cli/analysis_worker.py
+"""
+Отдельный процесс воркеров очереди анализов (analysis_jobs).
+
+    python -m app.cli.analysis_worker                  # settings.analysis_workers корутин
+    python -m app.cli.analysis_worker --concurrency 16
+
+Масштабируется независимо от процессов бота: сколько угодно таких процессов
+забирают задачи из одной таблицы (FOR UPDATE SKIP LOCKED). Очередь отправки
+у каждого процесса своя: чтобы все вместе не превысили общий лимит Bot API,
+укажите в SEND_PROCESSES число всех отправляющих процессов (шарды бота +
+воркеры анализов). Лимит на чат между процессами не делится.
+
+SIGTERM/Ctrl+C: начатые задачи дорабатываются (SHUTDOWN_DRAIN_TIMEOUT_SECONDS),
+остальные возвращаются в очередь; статистика расхода GPT сбрасывается в БД.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from app.bot.analysis_worker import AnalysisWorkerPool
+from app.bot.shutdown import close_clients
+from app.config import settings
+from app.config_limits import SHUTDOWN_DRAIN_TIMEOUT_SECONDS
+from app.db.base import init_db
+from app.main import create_bot, instrument_db
+from app.services.send_queue import send_queue
+from app.services.stats_service import flush_stats, stats_flush_loop
+
+logger = logging.getLogger(__name__)
+
+
+async def main(concurrency: int) -> None:
+    await init_db()
+    instrument_db()
+
+    bot = create_bot()
+    send_queue.set_processes(settings.send_processes or 1)
+    pool = AnalysisWorkerPool(bot, concurrency)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    stats_task = asyncio.create_task(stats_flush_loop())
+    pool.start()
+    logger.info("Analysis workers started: %s", concurrency)
+    try:
+        await stop.wait()
+    finally:
+        await pool.stop(SHUTDOWN_DRAIN_TIMEOUT_SECONDS)
+        stats_task.cancel()
+        await send_queue.close()
+        await flush_stats()
+        await close_clients(bot)
+        logger.info("Analysis workers stopped, processed %s jobs", pool.processed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run analysis queue workers")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=max(settings.analysis_workers, 1),
+        help="сколько задач обрабатывать одновременно",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.log_level)
+    asyncio.run(main(args.concurrency))
@@ -0,0 +1,33 @@
+# app/cli/rebuild_daily_nutrition.py
+"""
+Пересборка агрегата daily_nutrition из таблицы meals.
+
+    python -m app.cli.rebuild_daily_nutrition              # все пользователи
+    python -m app.cli.rebuild_daily_nutrition --user-id 42 # один пользователь (users.id)
+"""
+
+import argparse
+import asyncio
+import logging
+
+from app.config import settings
+from app.db.base import engine, init_db
+from app.services.nutrition_service import rebuild_daily_nutrition
+
+logger = logging.getLogger(__name__)
+
+
+async def main(user_id: int | None) -> None:
+    await init_db()
+    rows = await rebuild_daily_nutrition(user_id=user_id)
+    logger.info("daily_nutrition rebuilt: %s rows (user_id=%s)", rows, user_id)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild daily_nutrition from meals")
+    parser.add_argument("--user-id", type=int, default=None, help="users.id (по умолчанию — все)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.log_level)
+    asyncio.run(main(args.user_id))
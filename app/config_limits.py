@@ -51,8 +51,7 @@ PHOTO_SESSION_MAX_MESSAGES: int = 5
 PHOTO_SESSION_TIMEOUT_MINUTES: int = 60
 
 
-# ---- Антифлуд по промокодам ----
-# (будем использовать на Этапе 2, но фиксируем сразу по ТЗ)
+# ---- Антифлуд по промокодам (app/services/promo_guard.py) ----
 
 # Сколько подряд неверных попыток ввода промокода до бана
 PROMO_MAX_ATTEMPTS_BEFORE_BAN: int = 10
@@ -62,7 +61,311 @@ PROMO_BAN_MINUTES_FIRST: int = 30      # первая серия: 30 минут
 PROMO_BAN_MINUTES_SECOND: int = 24 * 60  # вторая серия: 24 часа
 PROMO_BAN_MINUTES_THIRD: int = 7 * 24 * 60  # третья серия: неделя
 
+# Неверные попытки старше этого (мин) не считаются в серию
+PROMO_ATTEMPTS_WINDOW_MINUTES: int = 60
 
+# Сколько пользователей со счётчиками попыток держим в памяти (дольше всех молчавшие вытесняются)
+PROMO_ATTEMPTS_MAX_USERS: int = 50_000
 
+# Фильтр Блума по действующим промокодам: доля ложных «может быть», из-за
+# которых неверный код всё же проверяется в БД
+PROMO_BLOOM_FALSE_POSITIVE_RATE: float = 0.01
 
+# Как часто каждый процесс пересобирает фильтр (новые коды из других процессов
+# видны с этой задержкой; в своём процессе — сразу после генерации)
+JOB_REFRESH_PROMO_FILTER_CRON: str = "* * * * *"
 
+
+# ---- Отчёты ----
+
+# Сколько готовых отчётов (пользователь × период) держим в памяти процесса
+REPORT_CACHE_MAX_ENTRIES: int = 10_000
+
+# Графики отчётов: максимум задач в очереди пула рендеринга
+# (сверх этого отчёт отправляется без картинки)
+CHART_MAX_PENDING: int = 16
+
+# Тайм-аут рендеринга одного графика (в секундах)
+CHART_RENDER_TIMEOUT_SECONDS: int = 15
+
+# Сколько готовых PNG держим в памяти процесса
+CHART_CACHE_MAX_ENTRIES: int = 500
+
+
+# ---- Экспорт дневника ----
+
+# Сколько строк meals читаем из серверного курсора за раз
+EXPORT_BATCH_SIZE: int = 1000
+
+# Сколько байт экспорта держим в памяти, дальше временный файл уходит на диск
+EXPORT_SPOOL_MAX_BYTES: int = 1 * 1024 * 1024
+
+# Лимит Telegram Bot API на отправку документа
+EXPORT_MAX_DOCUMENT_BYTES: int = 50 * 1024 * 1024
+
+
+# ---- Админ-статистика ----
+
+# Как часто (в секундах) счётчики из памяти сбрасываются в stats_hourly
+STATS_FLUSH_SECONDS: int = 60
+
+# Цены OpenAI в USD за 1M токенов: (prompt, completion)
+GPT_PRICES_PER_1M_TOKENS: dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# Цена prompt-токенов из кэша префикса, USD за 1M (нет модели — полная цена prompt)
+GPT_CACHED_PRICES_PER_1M_TOKENS: dict[str, float] = {
+    "gpt-4o-mini": 0.075,
+    "gpt-4o": 1.25,
+}
+
+
+# ---- Маршрутизация моделей GPT (app/services/gpt_client.py) ----
+
+# Модели по (тариф, тип анализа): первая отвечает всегда, следующая —
+# только если предыдущая не уверена в ответе (эскалация)
+GPT_ROUTES: dict[tuple[str, str], tuple[str, ...]] = {
+    ("free", "nutrition"): ("gpt-4o-mini",),
+    ("free", "recipe"): ("gpt-4o-mini",),
+    ("premium", "nutrition"): ("gpt-4o-mini", "gpt-4o"),
+    ("premium", "recipe"): ("gpt-4o-mini", "gpt-4o"),
+}
+
+# Уверенность модели (0–100, служебная строка ответа), ниже которой ответ переспрашивается у следующей модели
+GPT_ESCALATION_MIN_CONFIDENCE: int = 60
+
+
+# ---- Мониторинг запросов к БД ----
+
+# Запросы дольше этого порога пишутся в лог (мс)
+SLOW_QUERY_MS: int = 200
+
+# Бюджет запросов на один апдейт; превышение — предупреждение в лог
+UPDATE_QUERY_BUDGET: int = 20
+
+# Один и тот же запрос столько раз за апдейт — подозрение на N+1
+N_PLUS_ONE_THRESHOLD: int = 5
+
+# Сколько разных отпечатков запросов храним (остальное — в "<other>")
+QUERY_STATS_MAX_FINGERPRINTS: int = 1000
+
+
+# ---- Профайлер (админка) ----
+
+# Период снятия стека потока event loop (сек); 0.01 = 100 Гц
+PROFILE_SAMPLE_INTERVAL: float = 0.01
+
+# Период обхода ожидающих задач asyncio (сек)
+PROFILE_AWAIT_SAMPLE_INTERVAL: float = 0.1
+
+# Максимальная глубина стека в сэмпле
+PROFILE_MAX_DEPTH: int = 64
+
+# Длительность профилирования по умолчанию и максимум (сек)
+PROFILE_DEFAULT_SECONDS: int = 30
+PROFILE_MAX_SECONDS: int = 120
+
+
+# ---- Исходящие сообщения (очередь отправки) ----
+
+# Глобальный лимит Bot API: сообщений в секунду и допустимый всплеск
+SEND_GLOBAL_RATE: float = 30.0
+SEND_GLOBAL_BURST: int = 30
+
+# Рассылки (bulk) — не больше этого, чтобы ответам пользователям оставался запас
+SEND_BULK_RATE: float = 20.0
+
+# Личный чат: ~1 сообщение в секунду, короткий всплеск (ответ из 2–3 сообщений)
+SEND_CHAT_RATE: float = 1.0
+SEND_CHAT_BURST: int = 3
+
+# Группы: 20 сообщений в минуту
+SEND_GROUP_RATE: float = 20 / 60
+SEND_GROUP_BURST: int = 3
+
+# Сколько раз повторяем отправку после 429 (retry_after), потом — ошибка
+SEND_MAX_RETRIES: int = 3
+
+# Склеиваем подряд идущие тексты в один чат, пока не упрёмся в этот размер
+SEND_MERGE_MAX_CHARS: int = 4000
+
+
+# ---- Рассылки (админка) ----
+
+# Пользователей на страницу (keyset по users.id); прогресс сохраняется после каждой страницы
+BROADCAST_PAGE_SIZE: int = 200
+
+# Сколько отправок держим "в полёте" одновременно (скорость режет очередь отправки)
+BROADCAST_WORKERS: int = 25
+
+# Как часто (сек) присылать админу прогресс рассылки
+BROADCAST_PROGRESS_SECONDS: int = 60
+
+# Обрезка текста ошибки в broadcast_failures
+BROADCAST_ERROR_MAX_CHARS: int = 300
+
+
+# ---- Фоновые задачи (планировщик) ----
+
+# Расписания в формате cron (минута час день месяц день_недели), время UTC
+JOB_PREMIUM_EXPIRY_CRON: str = "*/5 * * * *"
+JOB_PRUNE_USER_LIMITS_CRON: str = "30 3 * * *"
+JOB_PRUNE_PROMO_BANS_CRON: str = "40 3 * * *"
+JOB_PRUNE_STATS_ACTIVE_USERS_CRON: str = "45 3 * * *"
+JOB_FSM_GC_CRON: str = "*/10 * * * *"
+
+# Случайная задержка запуска (сек), чтобы процессы не стартовали задачи синхронно
+JOB_JITTER_SECONDS: int = 30
+
+# Строк за один UPDATE/DELETE в пакетных задачах (короткие транзакции)
+JOB_BATCH_SIZE: int = 1000
+
+# Сколько дней храним user_limits (нужны только за сегодня)
+USER_LIMITS_RETENTION_DAYS: int = 7
+
+# Сколько дней храним истёкшие баны промокодов (история для эскалации)
+PROMO_BANS_RETENTION_DAYS: int = 30
+
+# Сколько дней храним отметки DAU (stats_active_users; нужны только за сегодня)
+STATS_ACTIVE_USERS_RETENTION_DAYS: int = 2
+
+# FSM-сессия без обращений дольше этого (часов) удаляется из памяти
+FSM_SESSION_IDLE_HOURS: int = 24
+
+# Ключ advisory lock лидера планировщика (одинаковый у всех процессов бота)
+SCHEDULER_LEADER_LOCK_KEY: int = 7_340_001
+
+# Как часто (сек) лидер проверяет соединение с блокировкой, а остальные — пробуют её взять
+SCHEDULER_LEADER_CHECK_SECONDS: int = 30
+
+
+# ---- Очередь анализов (analysis_jobs) ----
+
+# Попыток на задачу (включая первую); после — статус dead и сообщение об ошибке в чат
+ANALYSIS_JOB_MAX_ATTEMPTS: int = 3
+
+# Пауза перед повтором (сек), удваивается с каждой попыткой
+ANALYSIS_JOB_RETRY_BASE_SECONDS: float = 5.0
+
+# Задача в running дольше этого (сек) считается брошенной (процесс упал) и возвращается в очередь
+ANALYSIS_JOB_LEASE_SECONDS: int = 300
+
+# Как часто (сек) воркер опрашивает таблицу, если его не разбудили из этого же процесса
+ANALYSIS_JOB_POLL_SECONDS: float = 1.0
+
+# Сколько дней храним завершённые задачи (done / dead)
+ANALYSIS_JOBS_RETENTION_DAYS: int = 7
+
+# Расписания обслуживания очереди (cron, UTC)
+JOB_REQUEUE_ANALYSIS_CRON: str = "* * * * *"
+JOB_PRUNE_ANALYSIS_JOBS_CRON: str = "50 3 * * *"
+
+# Обрезка текста ошибки в analysis_jobs.last_error
+ANALYSIS_JOB_ERROR_MAX_CHARS: int = 300
+
+
+# ---- Резервирование лимитов (quota_reservations) ----
+
+# Резерв без живой задачи анализа (queued / running) старше этого (сек) считается
+# брошенным и возвращается фоновой задачей; пока задача жива, резерв держится
+QUOTA_RESERVATION_TTL_SECONDS: int = 600
+
+# Сколько дней храним закрытые резервы (committed / released)
+QUOTA_RESERVATIONS_RETENTION_DAYS: int = 7
+
+# Расписания обслуживания резервов (cron, UTC)
+JOB_REAP_QUOTA_RESERVATIONS_CRON: str = "* * * * *"
+JOB_PRUNE_QUOTA_RESERVATIONS_CRON: str = "55 3 * * *"
+
+
+# ---- Фильтр уточнений до GPT (app/services/text_filter.py) ----
+
+# Проверяем только начало сообщения (ограничивает время проверки)
+TEXT_FILTER_MAX_CHARS: int = 1000
+
+# Доля букв и цифр среди непробельных символов ниже этой — мусор («!!!???», эмодзи)
+TEXT_FILTER_MIN_MEANINGFUL_SHARE: float = 0.5
+
+# Энтропия символов (бит/символ) ниже порога у текста от TEXT_FILTER_MIN_ENTROPY_CHARS
+# символов — повторяющийся паттерн; у обычного русского текста она выше 3
+TEXT_FILTER_MIN_ENTROPY_BITS: float = 2.5
+TEXT_FILTER_MIN_ENTROPY_CHARS: int = 12
+
+# Текст без пищевых слов, поправок и чисел считается off-topic, только если в нём не меньше
+# стольких слов (короче — обычное уточнение, его пропускаем)
+TEXT_FILTER_OFF_TOPIC_MIN_WORDS: int = 12
+
+
+# ---- Штатная остановка процесса (app/bot/shutdown.py) ----
+
+# Сколько (сек) после SIGTERM ждём начатые апдейты и анализы; не успевшие
+# хендлеры отменяются (резерв лимита снимается), анализы — обратно в очередь
+SHUTDOWN_DRAIN_TIMEOUT_SECONDS: float = 20.0
+
+
+# ---- Многопроцессный запуск (app/runner) ----
+
+# Как часто (сек) процесс-шард присылает супервизору отчёт о здоровье
+RUNNER_HEALTH_SECONDS: float = 5.0
+
+# Шард без отчётов дольше этого (сек) считается зависшим и перезапускается
+RUNNER_HEALTH_TIMEOUT_SECONDS: float = 30.0
+
+# Сколько (сек) ждём выхода шарда после SIGTERM, потом — kill. Шард дорабатывает
+# апдейты и затем анализы — каждое до SHUTDOWN_DRAIN_TIMEOUT_SECONDS
+RUNNER_DRAIN_TIMEOUT_SECONDS: float = 60.0
+
+# Пауза перед перезапуском упавшего шарда (сек)
+RUNNER_RESTART_DELAY_SECONDS: float = 1.0
+
+# Long polling getUpdates в супервизоре (сек)
+RUNNER_POLL_TIMEOUT_SECONDS: int = 30
+
+# Максимальная длина строки IPC (один апдейт в JSON)
+RUNNER_IPC_LINE_LIMIT: int = 16 * 1024 * 1024
+
+
+# ---- Повторные фото (app/services/photo_hash.py) ----
+
+# Фото с расстоянием Хэмминга dHash не больше этого (бит из 64) считается тем же снимком
+# (пересжатие, другой размер); при PHOTO_DUPLICATE_MAX_DISTANCE // 4 > 1 поиск заметно дороже
+PHOTO_DUPLICATE_MAX_DISTANCE: int = 6
+
+# За сколько дней ищем повтор; не больше ANALYSIS_JOBS_RETENTION_DAYS — хэши удаляются вместе с задачами
+PHOTO_DUPLICATE_WINDOW_DAYS: int = 7
+
+# Потоков для декодирования фото и подсчёта хэша (Pillow отпускает GIL при декодировании)
+PHOTO_HASH_WORKERS: int = 2
+
+# Фото больше этого (байт) не хэшируем — анализ идёт как обычно
+PHOTO_HASH_MAX_BYTES: int = 20 * 1024 * 1024
+
+
+# ---- Антифлуд (app/services/flood_control.py) ----
+
+# Корзины токенов по видам апдейтов: ёмкость (сколько можно подряд) и пополнение в секунду
+FLOOD_PHOTO_BURST: int = 10
+FLOOD_PHOTO_PER_SECOND: float = 0.2
+FLOOD_TEXT_BURST: int = 10
+FLOOD_TEXT_PER_SECOND: float = 1.0
+FLOOD_CALLBACK_BURST: int = 15
+FLOOD_CALLBACK_PER_SECOND: float = 2.0
+
+# Для пользователей с is_suspicious ёмкость и пополнение умножаются на этот коэффициент
+FLOOD_SUSPICIOUS_FACTOR: float = 0.25
+
+# Столько отказов за FLOOD_STRIKE_WINDOW_SECONDS — пользователь помечается is_suspicious
+FLOOD_STRIKES_TO_SUSPICIOUS: int = 30
+FLOOD_STRIKE_WINDOW_SECONDS: int = 60
+
+# Не чаще раза в столько секунд отвечаем «слишком часто», остальные отказы — молча
+FLOOD_NOTICE_INTERVAL_SECONDS: int = 10
+
+# Как часто (сек) из памяти удаляются простаивающие пользователи (корзины полны)
+FLOOD_EVICT_SECONDS: int = 60
+
+# Через сколько часов фоновая задача снимает is_suspicious
+FLOOD_SUSPICIOUS_HOURS: int = 24
+JOB_CLEAR_SUSPICIOUS_CRON: str = "*/15 * * * *"
@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import declarative_base
 
 from app.config import settings
@@ -34,6 +35,21 @@ async def init_db() -> None:
     """
     # важно: просто импортируем файл с моделями, чтобы они зарегистрировались в Base.metadata
     from app.db import models  # noqa: F401
+    from app.db import rollups  # noqa: F401  (слушатели инкрементальных агрегатов)
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+
+
+def dialect_insert(dialect_name: str):
+    """
+    Возвращает insert() нужного диалекта, чтобы можно было делать
+    INSERT ... ON CONFLICT DO UPDATE (upsert).
+
+    Поддерживается только PostgreSQL: схема (BIGSERIAL-ключи) и часть
+    запросов (timezone(), CTE с изменением данных) на SQLite не работают.
+    Ветка SQLite собирает лишь сам upsert.
+    """
+    if dialect_name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
@@ -13,6 +13,22 @@ from app.db.base import Base
 # 4.1. Таблица users
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Фоновая задача снимает is_premium с истёкших подписок
+        sa.Index(
+            "ix_users_premium_until",
+            "premium_until",
+            postgresql_where=sa.text("is_premium"),
+            sqlite_where=sa.text("is_premium"),
+        ),
+        # Фоновая задача снимает is_suspicious по истечении срока
+        sa.Index(
+            "ix_users_suspicious_since",
+            "suspicious_since",
+            postgresql_where=sa.text("is_suspicious"),
+            sqlite_where=sa.text("is_suspicious"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
     telegram_id: Mapped[int] = mapped_column(sa.BigInteger, unique=True, nullable=False, index=True)
@@ -22,6 +38,11 @@ class User(Base):
     # 🔽 НОВАЯ СТРОКА
     paid_photos_balance: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
 
+    # Мягкий бан за флуд (app/services/flood_control.py): пониженная частота апдейтов,
+    # снимается фоновой задачей через FLOOD_SUSPICIOUS_HOURS после suspicious_since
+    is_suspicious: Mapped[bool] = mapped_column(sa.Boolean, nullable=False, server_default=sa.text("FALSE"))
+    suspicious_since: Mapped[datetime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(
         sa.DateTime(timezone=True),
         nullable=False,
@@ -40,6 +61,8 @@ class UserLimit(Base):
     __tablename__ = "user_limits"
     __table_args__ = (
         UniqueConstraint("user_id", "date", name="user_limits_unique"),
+        # Удаление старых записей фоновой задачей
+        sa.Index("ix_user_limits_date", "date"),
     )
 
     id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
@@ -57,6 +80,10 @@ class UserLimit(Base):
 # 4.3. Таблица meals
 class Meal(Base):
     __tablename__ = "meals"
+    __table_args__ = (
+        # Отчёты выбирают приёмы пищи пользователя за диапазон времени
+        sa.Index("ix_meals_user_id_eaten_at", "user_id", "eaten_at"),
+    )
 
     id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(
@@ -207,3 +234,274 @@ class GPTUsageStat(Base):
         nullable=False,
         server_default=sa.func.now(),
     )
+
+
+# 4.10. Таблица daily_nutrition
+# Инкрементальный агрегат по meals: одна строка на пользователя и локальную дату.
+# Обновляется слушателями из app/db/rollups.py, пересобирается через
+# `python -m app.cli.rebuild_daily_nutrition`.
+class DailyNutrition(Base):
+    __tablename__ = "daily_nutrition"
+    __table_args__ = (
+        UniqueConstraint("user_id", "date", name="daily_nutrition_unique"),
+    )
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(
+        sa.BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    date: Mapped[date] = mapped_column(sa.Date, nullable=False)
+    calories: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    proteins: Mapped[float] = mapped_column(sa.Float, nullable=False, server_default="0")
+    fats: Mapped[float] = mapped_column(sa.Float, nullable=False, server_default="0")
+    carbs: Mapped[float] = mapped_column(sa.Float, nullable=False, server_default="0")
+    meals_count: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(
+        sa.DateTime(timezone=True),
+        nullable=False,
+        server_default=sa.func.now(),
+        onupdate=sa.func.now(),
+    )
+
+
+# 4.11. Таблица stats_hourly
+# Почасовые счётчики для админ-статистики (анализы, оплаты, промокоды, GPT, DAU).
+# Пишутся пачками из буфера app/services/stats_service.py.
+class StatsHourly(Base):
+    __tablename__ = "stats_hourly"
+    __table_args__ = (
+        UniqueConstraint("hour", "metric", name="stats_hourly_unique"),
+    )
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    hour: Mapped[datetime] = mapped_column(sa.DateTime(timezone=True), nullable=False, index=True)
+    metric: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    value: Mapped[float] = mapped_column(sa.Numeric(18, 6), nullable=False, server_default="0")
+
+
+# 4.12. Таблица stats_totals
+# Накопленные значения тех же счётчиков "за всё время" (одна строка на метрику).
+class StatsTotal(Base):
+    __tablename__ = "stats_totals"
+
+    metric: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    value: Mapped[float] = mapped_column(sa.Numeric(18, 6), nullable=False, server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(
+        sa.DateTime(timezone=True),
+        nullable=False,
+        server_default=sa.func.now(),
+        onupdate=sa.func.now(),
+    )
+
+
+# 4.13. Таблица broadcasts
+# Рассылки из админки. cursor_user_id — последний обработанный users.id
+# (keyset-пагинация), по нему рассылка продолжается после перезапуска.
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    text: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    created_by: Mapped[int] = mapped_column(sa.BigInteger, nullable=False)
+    # pending / running / done / cancelled
+    status: Mapped[str] = mapped_column(sa.Text, nullable=False, server_default="pending", index=True)
+    max_user_id: Mapped[int] = mapped_column(sa.BigInteger, nullable=False)
+    cursor_user_id: Mapped[int] = mapped_column(sa.BigInteger, nullable=False, server_default="0")
+    total: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    sent: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    blocked: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    failed: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    created_at: Mapped[datetime] = mapped_column(
+        sa.DateTime(timezone=True),
+        nullable=False,
+        server_default=sa.func.now(),
+    )
+    started_at: Mapped[datetime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+
+
+# 4.14. Таблица broadcast_failures
+# Чаты, которым рассылка не доставлена: blocked — бот заблокирован/аккаунт удалён,
+# failed — прочие ошибки Bot API.
+class BroadcastFailure(Base):
+    __tablename__ = "broadcast_failures"
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    broadcast_id: Mapped[int] = mapped_column(
+        sa.BigInteger,
+        ForeignKey("broadcasts.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    user_id: Mapped[int] = mapped_column(
+        sa.BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    reason: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    error: Mapped[str | None] = mapped_column(sa.Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        sa.DateTime(timezone=True),
+        nullable=False,
+        server_default=sa.func.now(),
+    )
+
+
+# 4.15. Таблица analysis_jobs
+# Очередь анализов фото: хендлер ставит задачу, воркеры забирают её
+# через SELECT ... FOR UPDATE SKIP LOCKED, зовут GPT и отправляют ответ в чат.
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (
+        # Выборка воркером: только ожидающие задачи, по порядку постановки
+        sa.Index(
+            "ix_analysis_jobs_queued",
+            "run_after",
+            "id",
+            postgresql_where=sa.text("status = 'queued'"),
+            sqlite_where=sa.text("status = 'queued'"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(
+        sa.BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    chat_id: Mapped[int] = mapped_column(sa.BigInteger, nullable=False)
+    analysis_type: Mapped[str] = mapped_column(sa.Text, nullable=False)  # nutrition / recipe
+    photo_file_id: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    comment: Mapped[str | None] = mapped_column(sa.Text, nullable=True)
+    strip_questions: Mapped[bool] = mapped_column(sa.Boolean, nullable=False, server_default=sa.text("FALSE"))
+    # Тариф на момент постановки: по нему выбирается маршрут моделей GPT
+    premium: Mapped[bool] = mapped_column(sa.Boolean, nullable=False, server_default=sa.text("FALSE"))
+    # Сообщение после результата (счётчик уточнений)
+    footer: Mapped[str | None] = mapped_column(sa.Text, nullable=True)
+    # queued / running / done / dead
+    status: Mapped[str] = mapped_column(sa.Text, nullable=False, server_default="queued", index=True)
+    attempts: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    run_after: Mapped[datetime] = mapped_column(
+        sa.DateTime(timezone=True),
+        nullable=False,
+        server_default=sa.func.now(),
+    )
+    locked_at: Mapped[datetime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+    # Резерв лимита (quota_reservations): подтверждается доставкой, снимается при неудаче
+    quota_reservation_id: Mapped[int | None] = mapped_column(
+        sa.BigInteger,
+        ForeignKey("quota_reservations.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )
+    # Ответ GPT сохраняется до отправки: повтор после сбоя доставки не зовёт GPT снова
+    result: Mapped[str | None] = mapped_column(sa.Text, nullable=True)
+    # Модель, давшая ответ (после эскалации — последняя)
+    model: Mapped[str | None] = mapped_column(sa.Text, nullable=True)
+    # Тег версии промпта, по которому получен ответ (app/prompts/registry.py)
+    prompt_version: Mapped[str | None] = mapped_column(sa.Text, nullable=True)
+    # Фото оказалось повтором (photo_hashes): ответ взят из этой задачи, GPT не вызывался
+    duplicate_of: Mapped[int | None] = mapped_column(
+        sa.BigInteger,
+        ForeignKey("analysis_jobs.id", ondelete="SET NULL"),
+        nullable=True,
+    )
+    last_error: Mapped[str | None] = mapped_column(sa.Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        sa.DateTime(timezone=True),
+        nullable=False,
+        server_default=sa.func.now(),
+    )
+    finished_at: Mapped[datetime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+
+
+# 4.16. Таблица quota_reservations
+# Двухфазное списание анализа фото: резерв (счётчик уже уменьшен) →
+# committed после доставки ответа или released с возвратом в счётчик.
+class QuotaReservation(Base):
+    __tablename__ = "quota_reservations"
+    __table_args__ = (
+        # Поиск брошенных резервов фоновой задачей
+        sa.Index(
+            "ix_quota_reservations_held",
+            "expires_at",
+            postgresql_where=sa.text("status = 'held'"),
+            sqlite_where=sa.text("status = 'held'"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(
+        sa.BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    # free — user_limits.photos_used за day, paid — users.paid_photos_balance
+    source: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    day: Mapped[date | None] = mapped_column(sa.Date, nullable=True)
+    # held / committed / released
+    status: Mapped[str] = mapped_column(sa.Text, nullable=False, server_default="held")
+    expires_at: Mapped[datetime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        sa.DateTime(timezone=True),
+        nullable=False,
+        server_default=sa.func.now(),
+    )
+    finished_at: Mapped[datetime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+
+
+# 4.17. Таблица photo_hashes
+# Перцептивные хэши (dHash, 64 бита) проанализированных фото для поиска
+# повторов по расстоянию Хэмминга. Хэш разбит на 4 полосы по 16 бит
+# (multi-index hashing): у похожих хэшей хотя бы одна полоса почти совпадает,
+# поэтому кандидаты ищутся по индексам полос, а не перебором.
+class PhotoHash(Base):
+    __tablename__ = "photo_hashes"
+    __table_args__ = (
+        sa.Index("ix_photo_hashes_band0", "user_id", "band0"),
+        sa.Index("ix_photo_hashes_band1", "user_id", "band1"),
+        sa.Index("ix_photo_hashes_band2", "user_id", "band2"),
+        sa.Index("ix_photo_hashes_band3", "user_id", "band3"),
+    )
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(
+        sa.BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    # Задача, чей ответ можно отдать повторно; хэш удаляется вместе с ней
+    job_id: Mapped[int] = mapped_column(
+        sa.BigInteger,
+        ForeignKey("analysis_jobs.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    # 64-битный хэш как знаковый BIGINT
+    photo_hash: Mapped[int] = mapped_column(sa.BigInteger, nullable=False)
+    band0: Mapped[int] = mapped_column(sa.Integer, nullable=False)
+    band1: Mapped[int] = mapped_column(sa.Integer, nullable=False)
+    band2: Mapped[int] = mapped_column(sa.Integer, nullable=False)
+    band3: Mapped[int] = mapped_column(sa.Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        sa.DateTime(timezone=True),
+        nullable=False,
+        server_default=sa.func.now(),
+    )
+
+
+# 4.18. Таблица stats_active_users
+# Кто уже учтён в DAU за день (stats_service.flush_stats): строка вставляется
+# с ON CONFLICT DO NOTHING, active_users растёт только на новые строки —
+# перезапуски и несколько процессов не считают пользователя дважды.
+class StatsActiveUser(Base):
+    __tablename__ = "stats_active_users"
+
+    day: Mapped[date] = mapped_column(sa.Date, primary_key=True)
+    user_id: Mapped[int] = mapped_column(
+        sa.BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
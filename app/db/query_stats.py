@@ -0,0 +1,195 @@
+# app/db/query_stats.py
+"""
+Статистика SQL-запросов на событиях движка.
+
+  - по каждому отпечатку запроса (SQL без литералов и параметров):
+    число вызовов, суммарное и максимальное время — для /queries в админке;
+  - запросы дольше SLOW_QUERY_MS пишутся в лог;
+  - внутри `track_update()` считаются запросы текущего апдейта, чтобы
+    найти апдейты сверх UPDATE_QUERY_BUDGET и повторы одного запроса (N+1).
+
+Всё хранится в памяти процесса и сбрасывается при рестарте.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from app.config_limits import (
+    N_PLUS_ONE_THRESHOLD,
+    QUERY_STATS_MAX_FINGERPRINTS,
+    SLOW_QUERY_MS,
+    UPDATE_QUERY_BUDGET,
+)
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+OTHER_FINGERPRINT = "<other>"
+
+SLOW_QUERIES = metrics.counter(
+    "dishvision_db_slow_queries_total",
+    f"Запросы к БД дольше {SLOW_QUERY_MS} мс",
+)
+QUERY_SECONDS = metrics.histogram(
+    "dishvision_db_query_duration_seconds",
+    "Время выполнения SQL-запроса",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_PARAM = re.compile(r"\$\d+|%\(\w+\)s|\?")
+_RE_IN_LIST = re.compile(r"\bIN \((?:\?\s*,\s*)*\?\)", re.IGNORECASE)
+_RE_VALUES = re.compile(r"VALUES \([^()]*\)(?:\s*,\s*\([^()]*\))*", re.IGNORECASE)
+_RE_SPACES = re.compile(r"\s+")
+
+# statement -> отпечаток; скомпилированных текстов немного, кэш почти всегда попадает
+_fingerprint_cache: dict[str, str] = {}
+
+
+@dataclass
+class FingerprintStats:
+    calls: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_seconds * 1000 / self.calls if self.calls else 0.0
+
+
+@dataclass
+class UpdateQueries:
+    """Запросы одного апдейта."""
+    count: int = 0
+    total_seconds: float = 0.0
+    by_fingerprint: Counter = field(default_factory=Counter)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.count > UPDATE_QUERY_BUDGET
+
+    def repeated(self) -> list[tuple[str, int]]:
+        """Отпечатки, повторённые не меньше N_PLUS_ONE_THRESHOLD раз."""
+        return [
+            (fp, n) for fp, n in self.by_fingerprint.most_common()
+            if n >= N_PLUS_ONE_THRESHOLD
+        ]
+
+
+_stats: dict[str, FingerprintStats] = {}
+_current_update: ContextVar[Optional[UpdateQueries]] = ContextVar("update_queries", default=None)
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Нормализованный SQL: литералы и параметры → ?, списки IN/VALUES схлопнуты.
+    """
+    cached = _fingerprint_cache.get(statement)
+    if cached is not None:
+        return cached
+
+    fp = _RE_STRING.sub("?", statement)
+    fp = _RE_PARAM.sub("?", fp)
+    fp = _RE_NUMBER.sub("?", fp)
+    fp = _RE_SPACES.sub(" ", fp).strip()
+    fp = _RE_IN_LIST.sub("IN (...)", fp)
+    fp = _RE_VALUES.sub("VALUES (...)", fp)
+
+    if len(_fingerprint_cache) < QUERY_STATS_MAX_FINGERPRINTS * 4:
+        _fingerprint_cache[statement] = fp
+    return fp
+
+
+def _record(statement: str, seconds: float) -> None:
+    fp = fingerprint(statement)
+
+    stats = _stats.get(fp)
+    if stats is None:
+        if len(_stats) >= QUERY_STATS_MAX_FINGERPRINTS:
+            fp = OTHER_FINGERPRINT
+            stats = _stats.setdefault(fp, FingerprintStats())
+        else:
+            stats = _stats[fp] = FingerprintStats()
+    stats.calls += 1
+    stats.total_seconds += seconds
+    if seconds > stats.max_seconds:
+        stats.max_seconds = seconds
+
+    QUERY_SECONDS.observe(seconds)
+
+    update = _current_update.get()
+    if update is not None:
+        update.count += 1
+        update.total_seconds += seconds
+        update.by_fingerprint[fp] += 1
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc()
+        logger.warning("Медленный запрос %.0f мс: %s", seconds * 1000, fp[:500])
+
+
+# ===== Хуки движка =====
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is not None:
+        _record(statement, time.perf_counter() - started)
+
+
+def instrument_engine(sync_engine) -> None:
+    """
+    Повесить сбор статистики на движок (engine.sync_engine для AsyncEngine).
+    """
+    from sqlalchemy import event
+
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ===== API =====
+
+@contextmanager
+def track_update() -> Iterator[UpdateQueries]:
+    """
+    Считать запросы, выполненные внутри блока (в т.ч. во вложенных корутинах).
+    """
+    queries = UpdateQueries()
+    token = _current_update.set(queries)
+    try:
+        yield queries
+    finally:
+        _current_update.reset(token)
+
+
+def current_update() -> Optional[UpdateQueries]:
+    """Счётчик запросов текущего апдейта (None вне track_update())."""
+    return _current_update.get()
+
+
+def top_fingerprints(limit: int = 10) -> list[tuple[str, FingerprintStats]]:
+    """
+    Топ отпечатков по суммарному времени.
+    """
+    return sorted(
+        _stats.items(), key=lambda item: item[1].total_seconds, reverse=True
+    )[:limit]
+
+
+def reset_query_stats() -> None:
+    _stats.clear()
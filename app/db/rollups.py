@@ -0,0 +1,213 @@
+# app/db/rollups.py
+"""
+Инкрементальное ведение агрегата daily_nutrition по таблице meals.
+
+На каждую вставку / удаление / изменение Meal через ORM в ТОЙ ЖЕ транзакции
+выполняется upsert строки (user_id, date) с дельтой по калориям и БЖУ.
+Поэтому отчётам за неделю/месяц достаточно прочитать до 31 маленькой строки
+вместо сканирования всей истории meals.
+
+После коммита таких изменений увеличивается in-process "версия" meals
+пользователя (`meals_version`) — по ней кэши отчётов и графиков понимают,
+что данные устарели.
+
+ВАЖНО: массовые `delete(Meal)` / `update(Meal)` в обход ORM слушатели не видят —
+после таких операций агрегат нужно пересобрать
+(`python -m app.cli.rebuild_daily_nutrition`).
+"""
+
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+
+import sqlalchemy as sa
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.config import settings
+from app.db.base import dialect_insert
+from app.db.models import DailyNutrition, Meal
+
+REPORT_TZ = ZoneInfo(settings.report_timezone)
+
+# Поля Meal, влияющие на агрегат
+_ROLLUP_FIELDS = ("user_id", "eaten_at", "calories", "proteins", "fats", "carbs")
+
+# Ключ в Session.info со множеством user_id, чьи meals менялись в транзакции
+_CHANGED_KEY = "meals_changed_user_ids"
+
+# user_id -> номер версии данных meals (растёт после каждого коммита с изменениями)
+_meal_versions: dict[int, int] = {}
+
+
+def meals_version(user_id: int) -> int:
+    """
+    Текущая версия данных meals пользователя в этом процессе.
+    """
+    return _meal_versions.get(user_id, 0)
+
+
+def bump_meals_version(user_id: int) -> None:
+    """
+    Принудительно пометить данные пользователя изменёнными
+    (например, после пересборки агрегата).
+    """
+    _meal_versions[user_id] = _meal_versions.get(user_id, 0) + 1
+
+
+def _mark_changed(target: Meal, *user_ids: int) -> None:
+    session = object_session(target)
+    if session is None:
+        return
+    session.info.setdefault(_CHANGED_KEY, set()).update(user_ids)
+
+
+def local_date(dt: datetime) -> date:
+    """
+    Локальная (по settings.report_timezone) дата приёма пищи.
+    Naive datetime считаем UTC — так же, как в хендлерах.
+    """
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(REPORT_TZ).date()
+
+
+def _apply_delta(
+    connection,
+    user_id: int,
+    eaten_at: datetime,
+    calories: int | None,
+    proteins: float | None,
+    fats: float | None,
+    carbs: float | None,
+    sign: int,
+) -> None:
+    """
+    Добавляет (sign=+1) или вычитает (sign=-1) один приём пищи из агрегата.
+    """
+    day = local_date(eaten_at)
+    table = DailyNutrition.__table__
+
+    d_cal = sign * int(calories or 0)
+    d_prot = sign * float(proteins or 0)
+    d_fat = sign * float(fats or 0)
+    d_carb = sign * float(carbs or 0)
+
+    if sign > 0:
+        insert = dialect_insert(connection.dialect.name)
+        stmt = insert(table).values(
+            user_id=user_id,
+            date=day,
+            calories=d_cal,
+            proteins=d_prot,
+            fats=d_fat,
+            carbs=d_carb,
+            meals_count=1,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.date],
+            set_={
+                "calories": table.c.calories + stmt.excluded.calories,
+                "proteins": table.c.proteins + stmt.excluded.proteins,
+                "fats": table.c.fats + stmt.excluded.fats,
+                "carbs": table.c.carbs + stmt.excluded.carbs,
+                "meals_count": table.c.meals_count + 1,
+                "updated_at": sa.func.now(),
+            },
+        )
+        connection.execute(stmt)
+        return
+
+    where = sa.and_(table.c.user_id == user_id, table.c.date == day)
+    connection.execute(
+        sa.update(table)
+        .where(where)
+        .values(
+            calories=table.c.calories + d_cal,
+            proteins=table.c.proteins + d_prot,
+            fats=table.c.fats + d_fat,
+            carbs=table.c.carbs + d_carb,
+            meals_count=table.c.meals_count - 1,
+            updated_at=sa.func.now(),
+        )
+    )
+    # Пустые дни не храним
+    connection.execute(
+        sa.delete(table).where(where, table.c.meals_count <= 0)
+    )
+
+
+def _old_values(target: Meal) -> dict:
+    """
+    Значения полей Meal ДО изменения (для after_update).
+    """
+    state = inspect(target)
+    values = {}
+    for field in _ROLLUP_FIELDS:
+        history = state.attrs[field].history
+        if history.deleted:
+            values[field] = history.deleted[0]
+        else:
+            values[field] = getattr(target, field)
+    return values
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session) -> None:
+    for user_id in session.info.pop(_CHANGED_KEY, ()):
+        bump_meals_version(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
+
+
+@event.listens_for(Meal, "after_insert")
+def _meal_inserted(mapper, connection, target: Meal) -> None:
+    _mark_changed(target, target.user_id)
+    _apply_delta(
+        connection,
+        target.user_id,
+        target.eaten_at,
+        target.calories,
+        target.proteins,
+        target.fats,
+        target.carbs,
+        sign=+1,
+    )
+
+
+@event.listens_for(Meal, "after_delete")
+def _meal_deleted(mapper, connection, target: Meal) -> None:
+    _mark_changed(target, target.user_id)
+    _apply_delta(
+        connection,
+        target.user_id,
+        target.eaten_at,
+        target.calories,
+        target.proteins,
+        target.fats,
+        target.carbs,
+        sign=-1,
+    )
+
+
+@event.listens_for(Meal, "after_update")
+def _meal_updated(mapper, connection, target: Meal) -> None:
+    state = inspect(target)
+    if not any(state.attrs[f].history.has_changes() for f in _ROLLUP_FIELDS):
+        return
+
+    old = _old_values(target)
+    _mark_changed(target, old["user_id"], target.user_id)
+    _apply_delta(connection, sign=-1, **old)
+    _apply_delta(
+        connection,
+        target.user_id,
+        target.eaten_at,
+        target.calories,
+        target.proteins,
+        target.fats,
+        target.carbs,
+        sign=+1,
+    )
@@ -42,6 +42,8 @@ class RussianButtons:
         "report_day": "📅 Отчёт за день",
         "report_week": "🗓 Отчёт за неделю",
         "report_month": "📆 Отчёт за месяц",
+        "export_csv": "📤 Дневник в CSV",
+        "export_json": "📤 Дневник в JSON",
 
         # Админка
         "admin_statistics": "📊 Статистика",
@@ -59,6 +61,9 @@ class RussianButtons:
         "admin_reset_own_limits": "♻️ Сбросить лимиты себе",
         "admin_reset_limits": "♻️ Сбросить лимиты пользователю",
         "admin_promo": "🎟 Промокод",
+        "admin_profile": "🔥 Профиль (30 с)",
+        "admin_broadcast": "📣 Рассылка",
+        "admin_broadcast_confirm": "✅ Отправить всем",
 
         # Статистика
         "stat_week": "🗓 За неделю",
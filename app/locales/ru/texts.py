@@ -72,6 +72,9 @@ class RussianTexts:
         ),
         "choose_analysis_type": "🎯 Выберите тип анализа:",
         "analyzing_image": "🔍 Анализирую изображение...",
+        "duplicate_photo_reused": (
+            "♻️ Это фото уже анализировалось — повторяю прошлый ответ, лимит не списан."
+        ),
         "messages_left": "💬 Сообщений осталось: {count}",
         "message_limit_reached": (
             "❌ Лимит сообщений исчерпан.\n"
@@ -125,6 +128,20 @@ class RussianTexts:
             "Отправьте новое фото, чтобы начать новый анализ."
         ),
 
+        "flood_wait": "⏳ Слишком много сообщений подряд — подождите немного, лишние я пропускаю.",
+        "flood_suspicious": (
+            "⚠️ Слишком частые запросы. На сутки бот будет отвечать вам реже."
+        ),
+
+        "off_topic_warning": (
+            "🙅 Это сообщение не похоже на уточнение по блюду, я не отправляю его на анализ.\n"
+            "Напишите, что на фото: состав, вес, способ приготовления."
+        ),
+
+        "off_topic_refinement_charged": (
+            "Попытка уточнения засчитана: {used} из {limit}."
+        ),
+
         "refinement_counter": (
             "Уточнение {used} из {limit}. "
             "Можете ещё скорректировать описание, и я пересчитаю ответ."
@@ -198,14 +215,38 @@ class RussianTexts:
             "✅ План по калориям сохранён: {calories} ккал в день."
         ),
 
-        # ===== Отчёты (фича в разработке) =====
+        # ===== Отчёты =====
         "reports_placeholder": (
             "📊 Раздел отчётов.\n"
-            "Позже здесь появятся отчёты за день, неделю и месяц."
-        ),
-        "report_day_placeholder": "🗓 Отчёт за день (функция в разработке).",
-        "report_week_placeholder": "📅 Отчёт за неделю (функция в разработке).",
-        "report_month_placeholder": "📆 Отчёт за месяц (функция в разработке).",
+            "Выберите период: день, неделя или месяц."
+        ),
+        "report_title_day": "📅 Отчёт за {date}",
+        "report_title_week": "🗓 Отчёт за неделю ({start} — {end})",
+        "report_title_month": "📆 Отчёт за 30 дней ({start} — {end})",
+        "report_totals": (
+            "🔥 Итого: {calories} ккал\n"
+            "🥩 Б/Ж/У: {proteins:.0f} / {fats:.0f} / {carbs:.0f} г\n"
+            "🍽 Приёмов пищи: {meals}"
+        ),
+        "report_target": (
+            "🎯 План: {target} ккал, отклонение: {deviation:+d} ккал"
+        ),
+        "report_no_target": (
+            "🎯 План по калориям не задан — его можно указать в профиле."
+        ),
+        "report_item_meal": "• {label} — {calories} ккал",
+        "report_item_day": "• {label}: {calories} ккал (приёмов пищи: {meals})",
+        "report_empty": "Пока нет записей о приёмах пищи за этот период.",
+        "report_error": "⚠️ Не удалось построить отчёт. Попробуйте позже.",
+
+        # ===== Экспорт дневника =====
+        "export_preparing": "⏳ Готовлю выгрузку дневника питания...",
+        "export_caption": "📤 Дневник питания: {rows} записей.",
+        "export_empty": "В дневнике пока нет записей — выгружать нечего.",
+        "export_too_large": (
+            "⚠️ Выгрузка получилась слишком большой для Telegram ({size_mb} МБ)."
+        ),
+        "export_error": "⚠️ Не удалось выгрузить дневник. Попробуйте позже.",
 
         # ===== Админ / доступ =====
         "admin_access_denied": "⛔️ Команда доступна только администраторам.",
@@ -214,7 +255,27 @@ class RussianTexts:
             "🛠 Админ-меню.\n"
             "Здесь будут статистика, управление лимитами и промокодами."
         ),
-        "admin_statistics_placeholder": "📊 Админ-статистика (функция в разработке).",
+        "admin_statistics_menu_title": "📊 Статистика. Выберите период:",
+        "admin_stats_period_week": "за 7 дней",
+        "admin_stats_period_month": "за 30 дней",
+        "admin_stats_period_all": "за всё время",
+        "admin_stats_report": (
+            "📊 Статистика {period}\n\n"
+            "👥 Активные пользователи (сумма DAU): {active_users}\n"
+            "👥 Средний DAU: {avg_dau}\n"
+            "🆕 Новые пользователи: {new_users}\n\n"
+            "📸 Анализы: {analyses} (в среднем {analyses_per_day} в день)\n"
+            "• бесплатные: {analyses_free}\n"
+            "• платные: {analyses_paid}\n"
+            "• повторы фото (ответ без GPT): {photo_duplicates}\n"
+            "💬 Уточнения: {refinements} (отсеяно без GPT: {gpt_calls_saved})\n\n"
+            "🤖 GPT: {gpt_calls} вызовов, ошибок: {gpt_errors}\n"
+            "• токены: {gpt_prompt_tokens} prompt (из кэша {gpt_cached_share}%) / {gpt_completion_tokens} completion\n"
+            "• стоимость: ${gpt_cost_usd}\n\n"
+            "⭐ Оплаты: {payments} (звёзд: {payments_stars})\n"
+            "🎟 Активации промокодов: {promo_activations}"
+        ),
+        "admin_stats_error": "⚠️ Не удалось загрузить статистику.",
         "admin_limits_menu_title": "🔧 Управление лимитами и премиумом.",
 
         # Лимиты
@@ -240,6 +301,62 @@ class RussianTexts:
             "{codes}"
         ),
 
+        # Экспорт (админ)
+        "admin_export_usage": (
+            "Использование: /export <telegram_id> [csv|json]"
+        ),
+        "admin_queries_title": "🐢 Топ-{limit} запросов к БД по суммарному времени:",
+        "admin_queries_item": (
+            "{position}. {total_ms:.0f} мс всего · {calls} выз. · "
+            "ср. {avg_ms:.1f} мс · макс. {max_ms:.0f} мс\n{fingerprint}"
+        ),
+        "admin_queries_empty": "Запросов к БД пока не было.",
+        "admin_profile_started": (
+            "🔥 Профилирую event loop {seconds} с. Файл пришлю по готовности."
+        ),
+        "admin_profile_busy": "⏳ Профайлер уже запущен, дождитесь результата.",
+        "admin_profile_caption": (
+            "🔥 Профиль за {seconds:.0f} с: {cpu_samples} CPU-сэмплов, "
+            "{await_samples} сэмплов ожидания.\n"
+            "Накладные расходы сэмплера: {overhead:.2f}%.\n"
+            "Открыть: speedscope.app или flamegraph.pl."
+        ),
+        "admin_profile_usage": "Использование: /profile [секунды, до {max_seconds}]",
+
+        # Рассылки (админ)
+        "admin_broadcast_prompt": (
+            "📣 Пришлите текст рассылки одним сообщением (форматирование сохранится).\n"
+            "Отмена — «⬅️ Назад»."
+        ),
+        "admin_broadcast_preview": (
+            "Так увидят сообщение пользователи ⬆️\n\n"
+            "Получателей: {recipients}. Отправляем?"
+        ),
+        "admin_broadcast_empty": "❌ Нужен текст сообщения. Пришлите ещё раз.",
+        "admin_broadcast_started": (
+            "🚀 Рассылка #{broadcast_id} запущена: {total} получателей.\n"
+            "Прогресс пришлю по ходу. /broadcast_status — статус, "
+            "/broadcast_cancel — остановить."
+        ),
+        "admin_broadcast_progress": (
+            "📣 Рассылка #{broadcast_id}: {status}\n"
+            "Обработано {processed} из {total} ({percent:.0f}%)\n"
+            "• доставлено: {sent}\n"
+            "• заблокировали бота: {blocked}\n"
+            "• ошибки: {failed}\n"
+            "Скорость: {rate:.1f} сообщ./с · осталось: {eta}"
+        ),
+        "admin_broadcast_status_pending": "ждёт запуска",
+        "admin_broadcast_status_running": "идёт",
+        "admin_broadcast_status_done": "завершена ✅",
+        "admin_broadcast_status_cancelled": "остановлена ⛔",
+        "admin_broadcast_eta_unknown": "—",
+        "admin_broadcast_eta": "~{minutes} мин {seconds} с",
+        "admin_broadcast_none": "Рассылок ещё не было.",
+        "admin_broadcast_cancel_done": "⛔ Рассылка #{broadcast_id} остановлена.",
+        "admin_broadcast_not_active": "Рассылка #{broadcast_id} не выполняется.",
+        "admin_broadcast_resumed": "▶️ Рассылка #{broadcast_id} продолжена.",
+
         "admin_exit_message": "⬅️ Выход из админ-меню. Возврат в главное меню.",
 
         # === Премиум и промокоды (пользователь) ===
@@ -247,6 +364,9 @@ class RussianTexts:
         "premium_promo_invalid": "Промокод недействителен, истёк или исчерпал лимит активаций.",
         "premium_promo_internal_error": "Внутренняя ошибка при обработке промокода. Попробуйте ещё раз позже.",
         "premium_promo_banned": "Вы временно не можете использовать промокоды.",
+        "premium_promo_banned_until": (
+            "🚫 Слишком много неверных промокодов. Ввод промокодов недоступен до {until} (UTC)."
+        ),
         "premium_promo_already_used": "Вы уже активировали этот промокод.",
         "premium_promo_success": "Промокод активирован! Премиум продлён на {days} дн. до {date}.",
 
@@ -1,33 +1,171 @@
 import asyncio
 import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
 from app.config import settings
-from app.db.base import init_db
+from app.db.base import engine, init_db
+from app.db import query_stats
 from app.bot.handlers import router as root_router
+from app.bot.analysis_worker import AnalysisWorkerPool
+from app.bot.fsm_storage import TrackedMemoryStorage
+from app.bot.shutdown import InFlightMiddleware, close_clients, shutdown_coordinator
+from app.bot.handlers.admin import report_broadcast_progress
 
+from app.bot.middlewares.flood import FloodMiddleware
+from app.bot.middlewares.metrics import HandlerLabelMiddleware, MetricsMiddleware
+from app.bot.middlewares.query_budget import QueryBudgetMiddleware
+from app.bot.middlewares.recorder import RecorderMiddleware
+from app.bot.middlewares.send_queue import OutboundRateLimiter
+from app.bot.middlewares.tracing import TelegramRequestTracing, TracingMiddleware
 from app.bot.middlewares.user import UserMiddleware
+from app.services.broadcast_service import resume_broadcasts, stop_broadcasts
+from app.services.chart_service import shutdown_chart_pool
+from app.services.flood_control import flood_limiter
+from app.services.jobs import build_scheduler
+from app.services.metrics import start_metrics_server
+from app.services.send_queue import send_queue
+from app.services.tracing import instrument_engine
+from app.services.update_recorder import UpdateRecorder
+from app.services.stats_service import flush_stats, stats_flush_loop
 
+logger = logging.getLogger(__name__)
 
 
-async def main():
-    logging.basicConfig(level=settings.log_level)
-    await init_db()
+def build_dispatcher() -> Dispatcher:
+    """
+    Dispatcher со всеми middleware и роутерами (используется и нагрузочными тестами).
+    """
+    dp = Dispatcher(storage=TrackedMemoryStorage())
 
-    bot = Bot(token=settings.bot_token)
-    dp = Dispatcher(storage=MemoryStorage())
+    # антифлуд — до фильтров и UserMiddleware: отказ не трогает БД
+    dp.message.outer_middleware(FloodMiddleware(flood_limiter))
+    dp.callback_query.outer_middleware(FloodMiddleware(flood_limiter))
 
     # ✨ вот здесь вешаем middleware
     dp.message.middleware(UserMiddleware())
     dp.callback_query.middleware(UserMiddleware())
 
-    from app.bot.handlers import router as root_router
+    # метрики: время/ошибки/in-flight по апдейтам + метки router/handler
+    dp.update.outer_middleware(MetricsMiddleware())
+    dp.message.middleware(HandlerLabelMiddleware())
+    dp.callback_query.middleware(HandlerLabelMiddleware())
+    dp.pre_checkout_query.middleware(HandlerLabelMiddleware())
+
+    # счётчик SQL-запросов на апдейт (бюджет, N+1)
+    dp.update.outer_middleware(QueryBudgetMiddleware())
+
+    # трассировка (после метрик, чтобы в корневом span было имя хендлера)
+    dp.update.outer_middleware(TracingMiddleware())
+
+    # начатые апдейты — их дожидается штатная остановка (app/bot/shutdown.py)
+    dp.update.outer_middleware(InFlightMiddleware(shutdown_coordinator))
+
     dp.include_router(root_router)
+    return dp
+
+
+def create_bot() -> Bot:
+    """
+    Bot с middleware исходящих запросов; адрес Bot API — settings.telegram_api_url.
+    """
+    session = None
+    if settings.telegram_api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.telegram_api_url))
+    bot = Bot(token=settings.bot_token, session=session)
+    setup_bot_session(bot)
+    return bot
+
+
+def setup_bot_session(bot: Bot) -> None:
+    """
+    Middleware исходящих запросов: трассировка и очередь отправки с лимитами Bot API.
+    """
+    bot.session.middleware(TelegramRequestTracing())
+    bot.session.middleware(OutboundRateLimiter())
+
+
+def instrument_db() -> None:
+    instrument_engine(engine.sync_engine)
+    query_stats.instrument_engine(engine.sync_engine)
+
+
+@asynccontextmanager
+async def bot_services(
+    bot: Bot,
+    dp: Dispatcher,
+    primary: bool = True,
+    metrics_port: int = settings.metrics_port,
+    record_path: str = settings.update_record_path,
+) -> AsyncIterator[None]:
+    """
+    Фоновые службы процесса бота: статистика, планировщик, воркеры анализов,
+    /metrics, запись апдейтов. primary=False — процесс не продолжает
+    прерванные рассылки (при нескольких процессах это делает только один).
+
+    На выходе — штатная остановка (app/bot/shutdown.py): дождаться начатых
+    апдейтов и анализов, сбросить буферы, закрыть OpenAI, Bot API и БД.
+    """
+    recorder = None
+    if record_path:
+        recorder = UpdateRecorder(record_path, settings.update_record_salt)
+        dp.update.outer_middleware(RecorderMiddleware(recorder))
+
+    stats_task = asyncio.create_task(stats_flush_loop())
+    scheduler = build_scheduler(dp.storage)
+    scheduler.start()
+    analysis_workers = AnalysisWorkerPool(bot, settings.analysis_workers)
+    analysis_workers.start()
+
+    metrics_runner = None
+    if metrics_port:
+        metrics_runner = await start_metrics_server(settings.metrics_host, metrics_port)
+
+    if primary:
+        await resume_broadcasts(bot, report_broadcast_progress)
+    try:
+        yield
+    finally:
+        # 1) начатые апдейты и анализы — в пределах общего срока
+        await shutdown_coordinator.drain_updates()
+        await analysis_workers.stop(shutdown_coordinator.remaining())
+
+        # 2) фоновые службы и буферы
+        stats_task.cancel()
+        await scheduler.stop()
+        await stop_broadcasts()
+        await send_queue.close()
+        try:
+            await flush_stats()
+        except Exception as e:
+            logger.exception("Остановка: статистика не записана: %s", e)
+        shutdown_chart_pool()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if recorder is not None:
+            recorder.close()
+
+        # 3) клиенты: OpenAI → Bot API → БД
+        await close_clients(bot)
+
+
+async def main():
+    logging.basicConfig(level=settings.log_level)
+    await init_db()
+    instrument_db()
+
+    bot = create_bot()
+    dp = build_dispatcher()
+    send_queue.set_processes(settings.send_processes or 1)
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    async with bot_services(bot, dp):
+        await bot.delete_webhook(drop_pending_updates=True)
+        # сессию бота закрывает bot_services — после доработки анализов
+        await dp.start_polling(bot, close_bot_session=False)
 
 
 if __name__ == "__main__":
@@ -102,6 +102,11 @@ SYSTEM_PROMPT_NUTRITION = """Ты - профессиональный дието
 
 **ТОЛЬКО ЕСЛИ СОВСЕМ НЕВОЗМОЖНО ОПРЕДЕЛИТЬ:**
 ❌ Не могу определить блюдо. Пожалуйста, опишите, что изображено на фото.
+
+**СЛУЖЕБНАЯ СТРОКА (ОБЯЗАТЕЛЬНО, ПОЛЬЗОВАТЕЛЬ ЕЁ НЕ УВИДИТ):**
+Самой последней строкой ответа, после вопросов, напиши, насколько ты уверен в распознавании блюд и их веса, — число от 0 до 100:
+Уверенность: 85
+Оценивай честно: ставь низкую уверенность, если блюда плохо видно, их много и они перекрывают друг друга или состав приходится угадывать.
 """
 
 
@@ -178,9 +183,30 @@ SYSTEM_PROMPT_RECIPE = """Ты - опытный шеф-повар. Дай под
 
 **ТОЛЬКО ЕСЛИ СОВСЕМ НЕВОЗМОЖНО ОПРЕДЕЛИТЬ:**
 ❌ Не могу определить блюдо. Пожалуйста, опишите, что на фото.
+
+**СЛУЖЕБНАЯ СТРОКА (ОБЯЗАТЕЛЬНО, ПОЛЬЗОВАТЕЛЬ ЕЁ НЕ УВИДИТ):**
+Самой последней строкой ответа, после вопросов, напиши, насколько ты уверен в распознавании блюд и ингредиентов, — число от 0 до 100:
+Уверенность: 85
+Оценивай честно: ставь низкую уверенность, если блюда плохо видно, их много или состав приходится угадывать.
 """
 
 
+# Постоянная часть user-сообщения (перед фото и описанием пользователя)
+INSTRUCTION_NUTRITION = (
+    "Проанализируй ВСЕ блюда и напитки на фото. "
+    "Для КАЖДОЙ позиции оцени калорийность и БЖУ, "
+    "а затем посчитай ИТОГОВУЮ калорийность и БЖУ как сумму всех компонентов.\n\n"
+    "Если в описании ниже я уточняю состав (например, что напиток без сахара, убрал/добавил ингредиенты), "
+    "считай, что это самая актуальная информация и ОБЯЗАТЕЛЬНО пересчитай и значения для каждой позиции, "
+    "и итоговую строку в начале ответа. "
+    "Ответ выведи строго в формате из системного промпта."
+)
+
+INSTRUCTION_RECIPE = (
+    "Составь подробные рецепты для блюд на фото по инструкциям системного промпта."
+)
+
+
 def get_system_prompt(user_description: str = None, analysis_type: str = "nutrition") -> str:
     if analysis_type == "recipe":
         return SYSTEM_PROMPT_RECIPE
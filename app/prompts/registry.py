@@ -0,0 +1,74 @@
+# app/prompts/registry.py
+"""
+Реестр промптов анализа: версия, текст и заранее собранные части запроса.
+
+Запрос идёт от постоянного к переменному, чтобы у OpenAI срабатывал кэш
+префикса (от 1024 одинаковых первых токенов: кэшированные токены дешевле
+и быстрее):
+
+    system: системный промпт        — один на тип анализа
+    user:   инструкция              — одна на тип анализа
+            фото                    — одно на всю серию уточнений
+            описание пользователя   — меняется от запроса к запросу
+
+Поэтому уточнение по тому же фото попадает в кэш вместе с картинкой.
+Постоянные части собираются один раз при импорте, на запрос добавляются
+только фото и описание.
+
+Любая правка текста — новая версия (version + 1). Тег версии
+(«nutrition/v1-1a2b3c4d», в конце — хэш текста, он меняется и при
+забытом version) пишется в analysis_jobs.prompt_version и в счётчики
+токенов; повтор фото (app/services/photo_hash.py) берёт только ответы
+текущей версии.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+
+from app.prompts.food_analysis import (
+    INSTRUCTION_NUTRITION,
+    INSTRUCTION_RECIPE,
+    SYSTEM_PROMPT_NUTRITION,
+    SYSTEM_PROMPT_RECIPE,
+)
+
+
+@dataclass(frozen=True)
+class Prompt:
+    analysis_type: str
+    version: int
+    system: str
+    instruction: str
+    tag: str = field(init=False)
+    # Готовые части запроса: только для чтения, общие для всех вызовов
+    system_message: dict = field(init=False, repr=False)
+    instruction_part: dict = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        digest = hashlib.sha256(f"{self.system}\0{self.instruction}".encode()).hexdigest()[:8]
+        object.__setattr__(self, "tag", f"{self.analysis_type}/v{self.version}-{digest}")
+        object.__setattr__(self, "system_message", {"role": "system", "content": self.system})
+        object.__setattr__(self, "instruction_part", {"type": "text", "text": self.instruction})
+
+
+_PROMPTS: dict[str, Prompt] = {}
+
+
+def register(prompt: Prompt) -> Prompt:
+    if prompt.analysis_type in _PROMPTS:
+        raise ValueError(f"Промпт для {prompt.analysis_type!r} уже зарегистрирован")
+    _PROMPTS[prompt.analysis_type] = prompt
+    return prompt
+
+
+def get_prompt(analysis_type: str) -> Prompt:
+    """
+    Текущая версия промпта для типа анализа (nutrition / recipe).
+    """
+    return _PROMPTS[analysis_type]
+
+
+NUTRITION = register(Prompt("nutrition", 1, SYSTEM_PROMPT_NUTRITION, INSTRUCTION_NUTRITION))
+RECIPE = register(Prompt("recipe", 1, SYSTEM_PROMPT_RECIPE, INSTRUCTION_RECIPE))
@@ -0,0 +1,2 @@
+# app/runner/__init__.py
+# Многопроцессный запуск бота: `python -m app.runner.supervisor --workers N`.
@@ -0,0 +1,44 @@
+# app/runner/protocol.py
+"""
+IPC между супервизором и шардами: одна строка JSON на сообщение.
+
+    супервизор → шард (stdin):  {"update": {...}}
+    шард → супервизор (stdout): {"health": {...}}, в конце {"drained": {...}}
+
+Шард выбирается по from_user.id (если его нет — по chat.id), поэтому все
+апдейты пользователя попадают в один процесс: сохраняется порядок, FSM
+в памяти и дедупликация DAU в stats_service.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+
+def shard_key(update: dict[str, Any]) -> int:
+    """
+    Ключ шардирования сырого апдейта: id пользователя, иначе id чата, иначе update_id.
+    """
+    for name, event in update.items():
+        if name == "update_id" or not isinstance(event, dict):
+            continue
+        user = event.get("from") or event.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return int(user["id"])
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return int(chat["id"])
+    return int(update.get("update_id", 0))
+
+
+def shard_for(update: dict[str, Any], shards: int) -> int:
+    return shard_key(update) % shards
+
+
+def encode(message: dict[str, Any]) -> bytes:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def decode(line: bytes) -> dict[str, Any]:
+    return json.loads(line)
@@ -0,0 +1,347 @@
+# app/runner/supervisor.py
+"""
+Многопроцессный запуск бота:
+
+    python -m app.runner.supervisor --workers 4
+
+Супервизор — единственная точка приёма апдейтов (long polling getUpdates
+или вебхук, если задан settings.webhook_url). Апдейты он не разбирает
+в объекты aiogram: json → shard_for(from_user.id) → строка в stdin нужного
+шарда (app/runner/worker.py). Всё тяжёлое — хендлеры, base64 фото, промпты,
+графики — выполняется в N процессах-шардах, каждый со своим event loop'ом.
+
+Здоровье шардов: каждый присылает отчёт раз в RUNNER_HEALTH_SECONDS
+(апдейты в работе, обработано, ошибки, задержка loop'а, RSS); они пишутся
+в метрики супервизора (/metrics на settings.metrics_port, у шардов —
+metrics_port + 1 + index). Упавший шард перезапускается; шард без отчётов
+дольше RUNNER_HEALTH_TIMEOUT_SECONDS убивается и перезапускается. Апдейты,
+пришедшие, пока шард перезапускается, ждут в его очереди.
+
+Отправка в Bot API идёт из шардов, у каждого своя очередь
+(app/services/send_queue.py): общий лимит и лимит рассылок делятся на
+--total шардов, а если рядом работают app.cli.analysis_worker — на
+settings.send_processes (шарды + воркеры). Лимиты на чат считаются
+в каждом процессе отдельно: результат анализа из воркера и ответ шарда
+в тот же чат могут вместе превысить ~1 сообщение/с, тогда выручает
+пауза по 429 (retry_after).
+
+SIGTERM / SIGINT: приём апдейтов прекращается, шардам закрывается stdin,
+они дорабатывают начатое (RUNNER_DRAIN_TIMEOUT_SECONDS) и выходят.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Any, Optional
+
+import aiohttp
+from aiohttp import web
+
+from app.config import settings
+from app.config_limits import (
+    RUNNER_DRAIN_TIMEOUT_SECONDS,
+    RUNNER_HEALTH_SECONDS,
+    RUNNER_HEALTH_TIMEOUT_SECONDS,
+    RUNNER_IPC_LINE_LIMIT,
+    RUNNER_POLL_TIMEOUT_SECONDS,
+    RUNNER_RESTART_DELAY_SECONDS,
+)
+from app.runner import protocol
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+SHARD_UP = metrics.gauge("dishvision_runner_shard_up", "1 — шард жив и присылает отчёты", ("shard",))
+SHARD_IN_FLIGHT = metrics.gauge("dishvision_runner_shard_in_flight", "Апдейты в работе у шарда", ("shard",))
+SHARD_PROCESSED = metrics.gauge("dishvision_runner_shard_processed", "Апдейтов обработано шардом с запуска", ("shard",))
+SHARD_ERRORS = metrics.gauge("dishvision_runner_shard_errors", "Ошибок обработки у шарда с запуска", ("shard",))
+SHARD_LOOP_LAG = metrics.gauge("dishvision_runner_shard_loop_lag_ms", "Задержка event loop'а шарда", ("shard",))
+SHARD_RSS = metrics.gauge("dishvision_runner_shard_max_rss_mb", "Пиковая память шарда, МБ", ("shard",))
+SHARD_BACKLOG = metrics.gauge("dishvision_runner_shard_backlog", "Апдейты, ожидающие отправки в шард", ("shard",))
+SHARD_RESTARTS = metrics.counter("dishvision_runner_shard_restarts_total", "Перезапуски шардов", ("shard",))
+INGRESS_UPDATES = metrics.counter("dishvision_runner_updates_total", "Апдейты, принятые супервизором", ("shard",))
+
+
+class Shard:
+    """
+    Процесс-шард и очередь апдейтов для него.
+    """
+
+    def __init__(self, index: int, total: int) -> None:
+        self.index = index
+        self.total = total
+        self.label = str(index)
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.health: dict[str, Any] = {}
+        self.last_report = 0.0
+        self.restarts = 0
+        self.stopping = False
+        self._backlog: asyncio.Queue[bytes] = asyncio.Queue()
+        self._unsent: Optional[bytes] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    async def start(self) -> None:
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "app.runner.worker",
+            "--index", str(self.index), "--total", str(self.total),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=RUNNER_IPC_LINE_LIMIT,
+        )
+        self.last_report = time.monotonic()
+        self._writer = asyncio.create_task(self._write_loop(self.proc))
+        self._reader = asyncio.create_task(self._read_loop(self.proc))
+        logger.info("Шард %s запущен, pid %s", self.index, self.proc.pid)
+
+    def send(self, update: dict[str, Any]) -> None:
+        self._backlog.put_nowait(protocol.encode({"update": update}))
+        SHARD_BACKLOG.set(self._backlog.qsize(), self.label)
+
+    async def _write_loop(self, proc: asyncio.subprocess.Process) -> None:
+        while True:
+            # Строка, которую не удалось записать в упавший процесс, уходит следующему
+            line = self._unsent or await self._backlog.get()
+            self._unsent = line
+            try:
+                proc.stdin.write(line)
+                await proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            self._unsent = None
+            SHARD_BACKLOG.set(self._backlog.qsize(), self.label)
+
+    async def _read_loop(self, proc: asyncio.subprocess.Process) -> None:
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                return
+            try:
+                message = protocol.decode(line)
+            except ValueError:
+                logger.warning("Шард %s: некорректная строка IPC: %r", self.index, line[:200])
+                continue
+            report = message.get("health") or message.get("drained")
+            if report:
+                self.health = report
+                self.last_report = time.monotonic()
+                SHARD_UP.set(1, self.label)
+                SHARD_IN_FLIGHT.set(report["in_flight"], self.label)
+                SHARD_PROCESSED.set(report["processed"], self.label)
+                SHARD_ERRORS.set(report["errors"], self.label)
+                SHARD_LOOP_LAG.set(report["loop_lag_ms"], self.label)
+                SHARD_RSS.set(report["max_rss_mb"], self.label)
+            if "drained" in message:
+                logger.info("Шард %s остановлен: %s", self.index, message["drained"])
+
+    async def _cleanup(self) -> None:
+        tasks = [t for t in (self._writer, self._reader) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._writer = self._reader = None
+        SHARD_UP.set(0, self.label)
+
+    async def check(self) -> None:
+        """
+        Перезапустить упавший или зависший шард.
+        """
+        if self.stopping or self.proc is None:
+            return
+        if self.alive and time.monotonic() - self.last_report > RUNNER_HEALTH_TIMEOUT_SECONDS:
+            logger.error("Шард %s не отвечает %.0f с — перезапуск", self.index, time.monotonic() - self.last_report)
+            self.proc.kill()
+        if self.alive:
+            return
+
+        await self.proc.wait()
+        logger.error("Шард %s завершился с кодом %s — перезапуск", self.index, self.proc.returncode)
+        await self._cleanup()
+        self.restarts += 1
+        SHARD_RESTARTS.inc(self.label)
+        await asyncio.sleep(RUNNER_RESTART_DELAY_SECONDS)
+        await self.start()
+
+    async def stop(self, timeout: float) -> None:
+        """
+        Дождаться отправки очереди, закрыть stdin (шард дорабатывает и выходит),
+        по таймауту — kill.
+        """
+        self.stopping = True
+        if self.proc is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self.alive and (self._unsent or not self._backlog.empty()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.alive:
+            self.proc.stdin.close()
+        try:
+            await asyncio.wait_for(self.proc.wait(), max(deadline - time.monotonic(), 0) + RUNNER_DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.error("Шард %s не остановился — kill", self.index)
+            self.proc.kill()
+            await self.proc.wait()
+        # дочитать финальный отчёт
+        if self._reader is not None:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(asyncio.shield(self._reader), 1)
+        await self._cleanup()
+
+
+class Supervisor:
+    def __init__(self, workers: int) -> None:
+        self.shards = [Shard(i, workers) for i in range(workers)]
+        self.stop_event = asyncio.Event()
+
+    def dispatch(self, update: dict[str, Any]) -> None:
+        shard = self.shards[protocol.shard_for(update, len(self.shards))]
+        INGRESS_UPDATES.inc(shard.label)
+        shard.send(update)
+
+    def health(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                **shard.health,
+                "index": shard.index,
+                "alive": shard.alive,
+                "restarts": shard.restarts,
+                "last_report_s": round(now - shard.last_report, 1),
+            }
+            for shard in self.shards
+        ]
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(RUNNER_HEALTH_SECONDS)
+            for shard in self.shards:
+                try:
+                    await shard.check()
+                except Exception as e:
+                    logger.exception("Не удалось перезапустить шард %s: %s", shard.index, e)
+            logger.debug("Шарды: %s", self.health())
+
+    # --- приём апдейтов ---
+
+    async def _poll(self, api_url: str, allowed_updates: list[str]) -> None:
+        offset = 0
+        backoff = 1.0
+        timeout = aiohttp.ClientTimeout(total=RUNNER_POLL_TIMEOUT_SECONDS + 10)
+        async with aiohttp.ClientSession(timeout=timeout) as http:
+            while True:
+                payload = {
+                    "offset": offset,
+                    "timeout": RUNNER_POLL_TIMEOUT_SECONDS,
+                    "allowed_updates": allowed_updates,
+                }
+                try:
+                    async with http.post(api_url, json=payload) as response:
+                        data = await response.json(loads=json.loads, content_type=None)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    logger.warning("getUpdates: %s, повтор через %.0f с", e, backoff)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+
+                if not data.get("ok"):
+                    retry_after = (data.get("parameters") or {}).get("retry_after")
+                    logger.warning("getUpdates: %s", data.get("description"))
+                    await asyncio.sleep(retry_after or backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+
+                backoff = 1.0
+                for update in data["result"]:
+                    self.dispatch(update)
+                    offset = update["update_id"] + 1
+
+    async def _start_webhook(self, bot, allowed_updates: list[str]) -> web.AppRunner:
+        async def handle(request: web.Request) -> web.Response:
+            if settings.webhook_secret and (
+                request.headers.get("X-Telegram-Bot-Api-Secret-Token") != settings.webhook_secret
+            ):
+                return web.Response(status=401)
+            self.dispatch(await request.json(loads=json.loads))
+            return web.Response()
+
+        app = web.Application(client_max_size=RUNNER_IPC_LINE_LIMIT)
+        app.router.add_post(settings.webhook_path, handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host=settings.webhook_host, port=settings.webhook_port).start()
+
+        await bot.set_webhook(
+            settings.webhook_url,
+            secret_token=settings.webhook_secret or None,
+            allowed_updates=allowed_updates,
+        )
+        logger.info("Вебхук: %s → %s:%s%s", settings.webhook_url, settings.webhook_host, settings.webhook_port, settings.webhook_path)
+        return runner
+
+    async def run(self) -> None:
+        from app.main import build_dispatcher, create_bot
+
+        # Типы апдейтов, на которые подписаны роутеры (как start_polling)
+        allowed_updates = build_dispatcher().resolve_used_update_types()
+        bot = create_bot()
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop_event.set)
+
+        metrics_runner = None
+        if settings.metrics_port:
+            metrics_runner = await metrics.start_metrics_server(settings.metrics_host, settings.metrics_port)
+
+        for shard in self.shards:
+            await shard.start()
+        monitor = asyncio.create_task(self._monitor())
+
+        ingress: Optional[asyncio.Task] = None
+        webhook_runner: Optional[web.AppRunner] = None
+        try:
+            if settings.webhook_url:
+                webhook_runner = await self._start_webhook(bot, allowed_updates)
+            else:
+                await bot.delete_webhook(drop_pending_updates=True)
+                api_url = bot.session.api.api_url(token=bot.token, method="getUpdates")
+                ingress = asyncio.create_task(self._poll(api_url, allowed_updates))
+            logger.info("Супервизор: %s шардов, приём через %s", len(self.shards), "вебхук" if webhook_runner else "polling")
+            await self.stop_event.wait()
+        finally:
+            logger.info("Остановка: приём апдейтов прекращён, шарды дорабатывают")
+            if ingress is not None:
+                ingress.cancel()
+                await asyncio.gather(ingress, return_exceptions=True)
+            if webhook_runner is not None:
+                await webhook_runner.cleanup()
+            monitor.cancel()
+            await asyncio.gather(
+                *(shard.stop(RUNNER_DRAIN_TIMEOUT_SECONDS) for shard in self.shards),
+                return_exceptions=True,
+            )
+            await bot.session.close()
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            logger.info("Супервизор остановлен: %s", self.health())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the bot as N shard processes behind one ingress")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="число процессов-шардов")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.log_level, format="[supervisor] %(levelname)s:%(name)s:%(message)s")
+    asyncio.run(Supervisor(max(args.workers, 1)).run())
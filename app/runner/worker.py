@@ -0,0 +1,204 @@
+# app/runner/worker.py
+"""
+Процесс-шард: читает апдейты из stdin (app/runner/protocol.py) и
+обрабатывает их обычным Dispatcher'ом; запускается супервизором:
+
+    python -m app.runner.worker --index 0 --total 4
+
+Апдейты одного пользователя обрабатываются строго по очереди (цепочка задач
+по shard_key), разных — параллельно, как при polling'е. EOF на stdin или
+SIGTERM — штатная остановка (app/bot/shutdown.py): новые апдейты не
+принимаются, начатые и анализы дорабатываются в пределах общего срока
+SHUTDOWN_DRAIN_TIMEOUT_SECONDS, затем останавливаются фоновые службы.
+
+Канал к супервизору — исходный stdout процесса; print() и логи уходят в stderr.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import signal
+import sys
+import time
+from typing import Any, BinaryIO, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from app.config import settings
+from app.config_limits import RUNNER_HEALTH_SECONDS, RUNNER_IPC_LINE_LIMIT
+from app.runner import protocol
+
+logger = logging.getLogger(__name__)
+
+
+class ShardWorker:
+    def __init__(self, index: int, bot: Bot, dp: Dispatcher, out: BinaryIO) -> None:
+        self.index = index
+        self.bot = bot
+        self.dp = dp
+        self.out = out
+        self.received = 0
+        self.processed = 0
+        self.errors = 0
+        self.loop_lag_ms = 0.0
+        self._tails: dict[int, asyncio.Task] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    # --- обработка ---
+
+    def feed(self, raw: dict[str, Any]) -> None:
+        key = protocol.shard_key(raw)
+        task = asyncio.create_task(self._process(raw, self._tails.get(key)))
+        self._tails[key] = task
+        self._tasks.add(task)
+        self.received += 1
+
+        def done(t: asyncio.Task) -> None:
+            self._tasks.discard(t)
+            if self._tails.get(key) is t:
+                del self._tails[key]
+
+        task.add_done_callback(done)
+
+    async def _process(self, raw: dict[str, Any], previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            update = Update.model_validate(raw, context={"bot": self.bot})
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.errors += 1
+            logger.exception("Шард %s: ошибка обработки апдейта %s: %s", self.index, raw.get("update_id"), e)
+        finally:
+            self.processed += 1
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Дождаться начатых апдейтов. Возвращает число брошенных по таймауту.
+        """
+        if not self._tasks:
+            return 0
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        return len(pending)
+
+    # --- отчёты ---
+
+    def health(self) -> dict[str, Any]:
+        return {
+            "index": self.index,
+            "pid": os.getpid(),
+            "received": self.received,
+            "processed": self.processed,
+            "in_flight": len(self._tasks),
+            "errors": self.errors,
+            "loop_lag_ms": round(self.loop_lag_ms, 1),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    def send(self, message: dict[str, Any]) -> None:
+        try:
+            self.out.write(protocol.encode(message))
+            self.out.flush()
+        except (BrokenPipeError, ValueError):
+            pass
+
+    async def report_loop(self) -> None:
+        """
+        Раз в RUNNER_HEALTH_SECONDS — отчёт супервизору; заодно меряем
+        задержку event loop'а (насколько позже проснулись).
+        """
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(RUNNER_HEALTH_SECONDS)
+            lag = time.perf_counter() - started - RUNNER_HEALTH_SECONDS
+            self.loop_lag_ms = max(lag, 0.0) * 1000
+            self.send({"health": self.health()})
+
+
+async def _read_updates(worker: ShardWorker, stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=RUNNER_IPC_LINE_LIMIT)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+
+    while not stop.is_set():
+        line = await reader.readline()
+        if not line:
+            break
+        message = protocol.decode(line)
+        if "update" in message:
+            worker.feed(message["update"])
+
+
+async def main(index: int, total: int) -> None:
+    # stdout — канал к супервизору, всё остальное печатаем в stderr
+    out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    from app.bot.shutdown import shutdown_coordinator
+    from app.db.base import init_db
+    from app.main import bot_services, build_dispatcher, create_bot, instrument_db
+    from app.services.send_queue import send_queue
+
+    await init_db()
+    instrument_db()
+
+    bot = create_bot()
+    dp = build_dispatcher()
+    worker = ShardWorker(index, bot, dp, out)
+    # общий лимит Bot API — на все шарды (и отдельные воркеры анализов)
+    send_queue.set_processes(settings.send_processes or total)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    # Ctrl+C в терминале получают все процессы группы — останавливает супервизор
+    loop.add_signal_handler(signal.SIGINT, lambda: None)
+
+    # /metrics у каждого шарда на своём порту: metrics_port + 1 + index
+    metrics_port = settings.metrics_port + 1 + index if settings.metrics_port else 0
+    record_path = ""
+    if settings.update_record_path:
+        head, sep, tail = os.path.basename(settings.update_record_path).partition(".")
+        record_path = os.path.join(
+            os.path.dirname(settings.update_record_path), f"{head}.shard{index}{sep}{tail}"
+        )
+
+    async with bot_services(bot, dp, primary=index == 0, metrics_port=metrics_port, record_path=record_path):
+        reporter = asyncio.create_task(worker.report_loop())
+        reader = asyncio.create_task(_read_updates(worker, stop))
+        stopper = asyncio.create_task(stop.wait())
+        worker.send({"health": worker.health()})
+        logger.info("Шард %s/%s запущен (pid %s)", index, total, os.getpid())
+
+        await asyncio.wait({reader, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        reader.cancel()
+        stopper.cancel()
+
+        # апдейты, ждущие своей очереди в цепочке пользователя, ещё не дошли
+        # до middleware координатора — дожидаемся их здесь, в том же сроке
+        shutdown_coordinator.begin()
+        abandoned = await worker.drain(shutdown_coordinator.remaining())
+        reporter.cancel()
+        if abandoned:
+            logger.warning("Шард %s: не дождались %s апдейтов", index, abandoned)
+
+    worker.send({"drained": {**worker.health(), "abandoned": abandoned}})
+    out.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bot shard process (started by app.runner.supervisor)")
+    parser.add_argument("--index", type=int, required=True)
+    parser.add_argument("--total", type=int, required=True)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.log_level, format=f"[shard {args.index}] %(levelname)s:%(name)s:%(message)s")
+    asyncio.run(main(args.index, args.total))
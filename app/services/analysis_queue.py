@@ -0,0 +1,252 @@
+# app/services/analysis_queue.py
+"""
+Очередь анализов фото в таблице analysis_jobs.
+
+Хендлер только ставит задачу (enqueue_analysis) и отвечает «анализирую»;
+GPT зовут воркеры (app/bot/analysis_worker.py) — корутины в процессе бота
+и/или отдельные процессы `python -m app.cli.analysis_worker`.
+
+Жизненный цикл: queued → running → done, при ошибке — снова queued с
+экспоненциальной паузой (run_after), после ANALYSIS_JOB_MAX_ATTEMPTS попыток — dead.
+Задачу забирает ровно один воркер: UPDATE ... WHERE id = (SELECT ... FOR UPDATE
+SKIP LOCKED LIMIT 1) — конкурирующие воркеры пропускают захваченные строки,
+не ожидая друг друга, поэтому пропускная способность растёт с числом воркеров.
+Если процесс упал посередине, задача остаётся running; через
+ANALYSIS_JOB_LEASE_SECONDS её возвращает в очередь requeue_stale_jobs.
+
+Лимит за анализ зарезервирован хендлером (quota_reservation_id,
+app/services/limit_service.py): воркер подтверждает резерв после доставки
+и снимает, если доставить не удалось.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import sqlalchemy as sa
+
+from app.config_limits import (
+    ANALYSIS_JOB_ERROR_MAX_CHARS,
+    ANALYSIS_JOB_LEASE_SECONDS,
+    ANALYSIS_JOB_MAX_ATTEMPTS,
+    ANALYSIS_JOB_RETRY_BASE_SECONDS,
+)
+from app.db.base import AsyncSessionLocal
+from app.db.models import AnalysisJob
+from app.services import metrics
+from app.services.user_service import to_utc
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+
+ANALYSIS_JOBS = metrics.counter(
+    "dishvision_analysis_jobs_total",
+    "Попытки обработки задач анализа по результату (done / retry / dead)",
+    ("result",),
+)
+ANALYSIS_QUEUE_WAIT = metrics.histogram(
+    "dishvision_analysis_queue_wait_seconds",
+    "Ожидание задачи анализа в очереди (от постановки/повтора до захвата воркером)",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+# Будит воркеры этого процесса сразу после постановки задачи (без ожидания опроса)
+job_available = asyncio.Event()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def enqueue_analysis(
+    user_id: int,
+    chat_id: int,
+    analysis_type: str,
+    photo_file_id: str,
+    comment: Optional[str],
+    strip_questions: bool = False,
+    footer: Optional[str] = None,
+    quota_reservation_id: Optional[int] = None,
+    premium: bool = False,
+) -> int:
+    async with AsyncSessionLocal() as session:
+        job = AnalysisJob(
+            user_id=user_id,
+            quota_reservation_id=quota_reservation_id,
+            chat_id=chat_id,
+            analysis_type=analysis_type,
+            photo_file_id=photo_file_id,
+            comment=comment or None,
+            strip_questions=strip_questions,
+            premium=premium,
+            footer=footer,
+            run_after=_utcnow(),
+        )
+        session.add(job)
+        await session.commit()
+        job_id = job.id
+
+    job_available.set()
+    return job_id
+
+
+async def claim_job() -> Optional[AnalysisJob]:
+    """
+    Захватить самую старую готовую к запуску задачу (status=running, attempts+1).
+    None — очередь пуста.
+    """
+    now = _utcnow()
+    next_id = (
+        sa.select(AnalysisJob.id)
+        .where(AnalysisJob.status == STATUS_QUEUED, AnalysisJob.run_after <= now)
+        .order_by(AnalysisJob.run_after, AnalysisJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with AsyncSessionLocal() as session:
+        job = await session.scalar(
+            sa.update(AnalysisJob)
+            .where(AnalysisJob.id == next_id, AnalysisJob.status == STATUS_QUEUED)
+            .values(status=STATUS_RUNNING, locked_at=now, attempts=AnalysisJob.attempts + 1)
+            .returning(AnalysisJob)
+        )
+        await session.commit()
+
+    if job is not None:
+        ANALYSIS_QUEUE_WAIT.observe(max((now - to_utc(job.run_after)).total_seconds(), 0.0))
+    return job
+
+
+async def save_result(
+    job_id: int,
+    result: str,
+    duplicate_of: Optional[int] = None,
+    model: Optional[str] = None,
+    prompt_version: Optional[str] = None,
+) -> None:
+    """
+    Сохранить ответ до отправки в чат. duplicate_of — ответ взят из другой
+    задачи (повтор фото), GPT не вызывался; model и prompt_version — чей это ответ.
+    """
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            sa.update(AnalysisJob)
+            .where(AnalysisJob.id == job_id)
+            .values(result=result, duplicate_of=duplicate_of, model=model, prompt_version=prompt_version)
+        )
+        await session.commit()
+
+
+def done_update(job_id: int):
+    """
+    UPDATE задачи в done. Отдельно — чтобы commit_photo_quota выполнял его
+    в одной транзакции с подтверждением резерва.
+    """
+    return (
+        sa.update(AnalysisJob)
+        .where(AnalysisJob.id == job_id)
+        .values(status=STATUS_DONE, finished_at=_utcnow(), locked_at=None)
+    )
+
+
+async def complete_job(job_id: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(done_update(job_id))
+        await session.commit()
+    ANALYSIS_JOBS.inc(STATUS_DONE)
+
+
+async def fail_job(job: AnalysisJob, error: BaseException) -> bool:
+    """
+    Попытка не удалась: вернуть задачу в очередь с паузой или, если попытки
+    кончились, перевести в dead. Возвращает True, если задача стала dead.
+    """
+    text = f"{type(error).__name__}: {error}"[:ANALYSIS_JOB_ERROR_MAX_CHARS]
+    dead = job.attempts >= ANALYSIS_JOB_MAX_ATTEMPTS
+    now = _utcnow()
+    if dead:
+        values = dict(status=STATUS_DEAD, finished_at=now)
+    else:
+        delay = ANALYSIS_JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+        values = dict(status=STATUS_QUEUED, run_after=now + timedelta(seconds=delay))
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            sa.update(AnalysisJob)
+            .where(AnalysisJob.id == job.id)
+            .values(locked_at=None, last_error=text, **values)
+        )
+        await session.commit()
+
+    ANALYSIS_JOBS.inc(STATUS_DEAD if dead else "retry")
+    return dead
+
+
+async def release_job(job_id: int) -> None:
+    """
+    Вернуть захваченную задачу в очередь без траты попытки (штатная остановка воркера).
+    """
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            sa.update(AnalysisJob)
+            .where(AnalysisJob.id == job_id, AnalysisJob.status == STATUS_RUNNING)
+            .values(
+                status=STATUS_QUEUED,
+                locked_at=None,
+                run_after=_utcnow(),
+                attempts=AnalysisJob.attempts - 1,
+            )
+        )
+        await session.commit()
+
+
+async def requeue_stale_jobs() -> int:
+    """
+    Вернуть в очередь задачи, зависшие в running дольше ANALYSIS_JOB_LEASE_SECONDS
+    (процесс воркера упал). Попытка засчитывается при захвате, поэтому задача,
+    на которой воркер падает каждый раз, после ANALYSIS_JOB_MAX_ATTEMPTS уходит в dead.
+    """
+    now = _utcnow()
+    stale = (
+        AnalysisJob.status == STATUS_RUNNING,
+        AnalysisJob.locked_at < now - timedelta(seconds=ANALYSIS_JOB_LEASE_SECONDS),
+    )
+    async with AsyncSessionLocal() as session:
+        dead = await session.execute(
+            sa.update(AnalysisJob)
+            .where(*stale, AnalysisJob.attempts >= ANALYSIS_JOB_MAX_ATTEMPTS)
+            .values(status=STATUS_DEAD, locked_at=None, finished_at=now, last_error="lease expired")
+            .execution_options(synchronize_session=False)
+        )
+        requeued = await session.execute(
+            sa.update(AnalysisJob)
+            .where(*stale)
+            .values(status=STATUS_QUEUED, locked_at=None, run_after=now)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+    if dead.rowcount or requeued.rowcount:
+        logger.warning(
+            "Зависшие задачи анализа: %s возвращено в очередь, %s в dead",
+            requeued.rowcount,
+            dead.rowcount,
+        )
+        ANALYSIS_JOBS.inc(STATUS_DEAD, value=dead.rowcount)
+        job_available.set()
+    return dead.rowcount + requeued.rowcount
+
+
+async def queue_depth() -> int:
+    async with AsyncSessionLocal() as session:
+        return await session.scalar(
+            sa.select(sa.func.count()).where(AnalysisJob.status == STATUS_QUEUED)
+        )
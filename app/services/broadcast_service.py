@@ -0,0 +1,409 @@
+# app/services/broadcast_service.py
+"""
+Рассылки из админки по всей базе пользователей.
+
+Получатели — users с id <= max_user_id на момент создания рассылки
+(новые пользователи в неё не попадают). Выборка идёт keyset-пагинацией
+по первичному ключу (id > cursor ORDER BY id LIMIT n) — без OFFSET, каждая
+страница стоит одинаково на любой глубине.
+
+Сообщения уходят через очередь отправки с приоритетом рассылки
+(send_queue.bulk_sends()): скорость ограничена SEND_BULK_RATE, ответы
+пользователям идут вне очереди. BROADCAST_WORKERS отправок держится
+"в полёте", чтобы очередь всегда была загружена.
+
+После каждой страницы в одной транзакции сохраняются курсор, счётчики
+и недоставленные чаты (broadcast_failures), поэтому после перезапуска
+рассылка продолжается со следующей страницы (resume_broadcasts). Страница,
+прерванная посередине, при штатной остановке сохраняется до первого
+недоставленного сообщения; после падения процесса она будет отправлена
+заново — дубль получат не больше BROADCAST_PAGE_SIZE человек.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+import sqlalchemy as sa
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import func, select
+
+from app.config_limits import (
+    BROADCAST_ERROR_MAX_CHARS,
+    BROADCAST_PAGE_SIZE,
+    BROADCAST_PROGRESS_SECONDS,
+    BROADCAST_WORKERS,
+)
+from app.db.base import AsyncSessionLocal
+from app.db.models import Broadcast, BroadcastFailure, User
+from app.services import metrics
+from app.services.send_queue import bulk_sends
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_CANCELLED = "cancelled"
+
+REASON_BLOCKED = "blocked"
+REASON_FAILED = "failed"
+
+BROADCAST_SENT = metrics.counter(
+    "dishvision_broadcast_messages_total",
+    "Сообщения рассылок по результату",
+    ("result",),
+)
+
+
+@dataclass
+class BroadcastProgress:
+    broadcast_id: int
+    created_by: int
+    status: str
+    total: int
+    sent: int
+    blocked: int
+    failed: int
+    rate_per_second: float        # за текущий запуск
+    eta_seconds: Optional[float]  # None — пока нечего оценивать
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.blocked + self.failed
+
+
+ProgressCallback = Callable[[Bot, BroadcastProgress], Awaitable[None]]
+
+# Запущенные рассылки этого процесса: broadcast_id -> задача
+_tasks: dict[int, asyncio.Task] = {}
+
+
+def _now_utc() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ===== Создание и управление =====
+
+async def count_recipients() -> int:
+    async with AsyncSessionLocal() as session:
+        return await session.scalar(select(func.count(User.id))) or 0
+
+
+async def create_broadcast(text: str, created_by: int) -> Broadcast:
+    """
+    Создать рассылку по всем текущим пользователям (ещё не запущена).
+    """
+    async with AsyncSessionLocal() as session:
+        max_user_id, total = (
+            await session.execute(select(func.max(User.id), func.count(User.id)))
+        ).one()
+
+        broadcast = Broadcast(
+            text=text,
+            created_by=created_by,
+            status=STATUS_PENDING,
+            max_user_id=max_user_id or 0,
+            cursor_user_id=0,
+            total=total,
+        )
+        session.add(broadcast)
+        await session.commit()
+        await session.refresh(broadcast)
+        return broadcast
+
+
+async def get_broadcast(broadcast_id: Optional[int] = None) -> Optional[Broadcast]:
+    """
+    Рассылка по id или последняя созданная.
+    """
+    async with AsyncSessionLocal() as session:
+        stmt = select(Broadcast)
+        if broadcast_id is not None:
+            stmt = stmt.where(Broadcast.id == broadcast_id)
+        else:
+            stmt = stmt.order_by(Broadcast.id.desc()).limit(1)
+        return (await session.execute(stmt)).scalar_one_or_none()
+
+
+async def cancel_broadcast(broadcast_id: int) -> bool:
+    """
+    Остановить рассылку: текущая страница досылается, дальше — стоп.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            sa.update(Broadcast)
+            .where(
+                Broadcast.id == broadcast_id,
+                Broadcast.status.in_((STATUS_PENDING, STATUS_RUNNING)),
+            )
+            .values(status=STATUS_CANCELLED, finished_at=_now_utc())
+        )
+        await session.commit()
+        return result.rowcount > 0
+
+
+def is_running(broadcast_id: int) -> bool:
+    task = _tasks.get(broadcast_id)
+    return task is not None and not task.done()
+
+
+def start_broadcast(bot: Bot, broadcast_id: int, on_progress: ProgressCallback) -> None:
+    """
+    Запустить (или продолжить) рассылку фоновой задачей.
+    """
+    if is_running(broadcast_id):
+        return
+    task = asyncio.create_task(
+        _run_safely(bot, broadcast_id, on_progress),
+        name=f"broadcast-{broadcast_id}",
+    )
+    _tasks[broadcast_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(broadcast_id, None))
+
+
+async def resume_broadcasts(bot: Bot, on_progress: ProgressCallback) -> int:
+    """
+    Продолжить рассылки, прерванные перезапуском. Вызывается из main.py.
+    """
+    async with AsyncSessionLocal() as session:
+        ids = list(
+            await session.scalars(
+                select(Broadcast.id).where(Broadcast.status == STATUS_RUNNING)
+            )
+        )
+    for broadcast_id in ids:
+        logger.info("Продолжаем рассылку %s после перезапуска", broadcast_id)
+        start_broadcast(bot, broadcast_id, on_progress)
+    return len(ids)
+
+
+async def stop_broadcasts() -> None:
+    """
+    Остановить задачи при завершении процесса (статус остаётся running —
+    при следующем старте рассылка продолжится).
+    """
+    for task in list(_tasks.values()):
+        task.cancel()
+    await asyncio.gather(*_tasks.values(), return_exceptions=True)
+
+
+# ===== Отправка =====
+
+async def _send_one(bot: Bot, telegram_id: int, text: str) -> tuple[Optional[str], Optional[str]]:
+    """
+    Отправить одно сообщение. (None, None) — доставлено, иначе (reason, error).
+    """
+    try:
+        with bulk_sends():
+            await bot.send_message(chat_id=telegram_id, text=text, parse_mode="HTML")
+    except TelegramForbiddenError as e:
+        # бот заблокирован или аккаунт удалён
+        return REASON_BLOCKED, str(e)[:BROADCAST_ERROR_MAX_CHARS]
+    except TelegramBadRequest as e:
+        # "chat not found" и т.п.
+        return REASON_FAILED, str(e)[:BROADCAST_ERROR_MAX_CHARS]
+    except Exception as e:
+        logger.warning("Рассылка: ошибка отправки в %s: %s", telegram_id, e)
+        return REASON_FAILED, f"{type(e).__name__}: {e}"[:BROADCAST_ERROR_MAX_CHARS]
+    return None, None
+
+
+PageResult = tuple[int, Optional[str], Optional[str]]  # (user_id, reason, error)
+
+
+async def _send_page(
+    bot: Bot,
+    text: str,
+    page: list[tuple[int, int]],
+    results: list[Optional[PageResult]],
+) -> None:
+    """
+    Отправить страницу; results[i] заполняется по мере доставки page[i].
+    """
+    semaphore = asyncio.Semaphore(BROADCAST_WORKERS)
+
+    async def worker(index: int, user_id: int, telegram_id: int) -> None:
+        async with semaphore:
+            reason, error = await _send_one(bot, telegram_id, text)
+        BROADCAST_SENT.inc(reason or "sent")
+        results[index] = (user_id, reason, error)
+
+    await asyncio.gather(
+        *(worker(i, user_id, tg_id) for i, (user_id, tg_id) in enumerate(page))
+    )
+
+
+async def _save_page(broadcast_id: int, cursor: int, results: list[PageResult]) -> str:
+    """
+    Сохранить итоги страницы; возвращает актуальный статус рассылки.
+    """
+    sent = sum(1 for _, reason, _ in results if reason is None)
+    blocked = sum(1 for _, reason, _ in results if reason == REASON_BLOCKED)
+    failed = len(results) - sent - blocked
+
+    async with AsyncSessionLocal() as session:
+        failures = [
+            {"broadcast_id": broadcast_id, "user_id": user_id, "reason": reason, "error": error}
+            for user_id, reason, error in results
+            if reason is not None
+        ]
+        if failures:
+            await session.execute(sa.insert(BroadcastFailure), failures)
+
+        status = await session.scalar(
+            sa.update(Broadcast)
+            .where(Broadcast.id == broadcast_id)
+            .values(
+                cursor_user_id=cursor,
+                sent=Broadcast.sent + sent,
+                blocked=Broadcast.blocked + blocked,
+                failed=Broadcast.failed + failed,
+            )
+            .returning(Broadcast.status)
+        )
+        await session.commit()
+    return status
+
+
+def _progress(broadcast: Broadcast, status: str, sent: int, blocked: int, failed: int,
+              done_this_run: int, started: float) -> BroadcastProgress:
+    elapsed = time.monotonic() - started
+    rate = done_this_run / elapsed if elapsed > 0 else 0.0
+    remaining = max(broadcast.total - sent - blocked - failed, 0)
+    return BroadcastProgress(
+        broadcast_id=broadcast.id,
+        created_by=broadcast.created_by,
+        status=status,
+        total=broadcast.total,
+        sent=sent,
+        blocked=blocked,
+        failed=failed,
+        rate_per_second=rate,
+        eta_seconds=remaining / rate if rate > 0 and status == STATUS_RUNNING else None,
+    )
+
+
+async def _run(bot: Bot, broadcast_id: int, on_progress: ProgressCallback) -> None:
+    async with AsyncSessionLocal() as session:
+        broadcast = await session.get(Broadcast, broadcast_id)
+        if broadcast is None or broadcast.status not in (STATUS_PENDING, STATUS_RUNNING):
+            return
+        broadcast.status = STATUS_RUNNING
+        broadcast.started_at = broadcast.started_at or _now_utc()
+        await session.commit()
+        await session.refresh(broadcast)
+
+    cursor = broadcast.cursor_user_id
+    sent, blocked, failed = broadcast.sent, broadcast.blocked, broadcast.failed
+    started = time.monotonic()
+    last_report = started
+    done_this_run = 0
+    status = STATUS_RUNNING
+
+    while True:
+        async with AsyncSessionLocal() as session:
+            page = (
+                await session.execute(
+                    select(User.id, User.telegram_id)
+                    .where(User.id > cursor, User.id <= broadcast.max_user_id)
+                    .order_by(User.id)
+                    .limit(BROADCAST_PAGE_SIZE)
+                )
+            ).all()
+
+        if not page:
+            status = STATUS_DONE
+            break
+
+        page_results: list[Optional[PageResult]] = [None] * len(page)
+        try:
+            await _send_page(bot, broadcast.text, page, page_results)
+        except asyncio.CancelledError:
+            # остановка процесса: сохраняем непрерывный обработанный префикс,
+            # чтобы при продолжении не слать его повторно
+            done = list(itertools.takewhile(lambda r: r is not None, page_results))
+            if done:
+                await _save_page(broadcast_id, done[-1][0], done)
+            raise
+
+        results: list[PageResult] = page_results  # type: ignore[assignment]
+        cursor = page[-1][0]
+        status = await _save_page(broadcast_id, cursor, results)
+
+        done_this_run += len(results)
+        for _, reason, _ in results:
+            if reason is None:
+                sent += 1
+            elif reason == REASON_BLOCKED:
+                blocked += 1
+            else:
+                failed += 1
+
+        if status != STATUS_RUNNING:
+            # отменена из админки
+            break
+
+        now = time.monotonic()
+        if now - last_report >= BROADCAST_PROGRESS_SECONDS:
+            last_report = now
+            await on_progress(
+                bot, _progress(broadcast, status, sent, blocked, failed, done_this_run, started)
+            )
+
+    if status == STATUS_DONE:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                sa.update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.status == STATUS_RUNNING)
+                .values(status=STATUS_DONE, finished_at=_now_utc())
+            )
+            await session.commit()
+
+    await on_progress(bot, _progress(broadcast, status, sent, blocked, failed, done_this_run, started))
+
+
+async def _run_safely(bot: Bot, broadcast_id: int, on_progress: ProgressCallback) -> None:
+    try:
+        await _run(bot, broadcast_id, on_progress)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # статус остаётся running — продолжится по /broadcast_resume или при перезапуске
+        logger.exception("Рассылка %s прервана ошибкой: %s", broadcast_id, e)
+
+
+def progress_of(broadcast: Broadcast) -> BroadcastProgress:
+    """
+    Прогресс по данным из БД (для /broadcast_status); скорость — средняя с начала.
+    """
+    rate = 0.0
+    if broadcast.started_at is not None:
+        started_at = broadcast.started_at
+        if started_at.tzinfo is None:
+            started_at = started_at.replace(tzinfo=timezone.utc)
+        end = broadcast.finished_at or _now_utc()
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        elapsed = (end - started_at).total_seconds()
+        processed = broadcast.sent + broadcast.blocked + broadcast.failed
+        rate = processed / elapsed if elapsed > 0 else 0.0
+    remaining = max(broadcast.total - broadcast.sent - broadcast.blocked - broadcast.failed, 0)
+    return BroadcastProgress(
+        broadcast_id=broadcast.id,
+        created_by=broadcast.created_by,
+        status=broadcast.status,
+        total=broadcast.total,
+        sent=broadcast.sent,
+        blocked=broadcast.blocked,
+        failed=broadcast.failed,
+        rate_per_second=rate,
+        eta_seconds=remaining / rate if rate > 0 and broadcast.status == STATUS_RUNNING else None,
+    )
@@ -0,0 +1,67 @@
+# app/services/chart_render.py
+"""
+Отрисовка графика отчёта в PNG.
+
+Модуль выполняется в ДОЧЕРНИХ процессах пула (см. chart_service), поэтому
+намеренно не импортирует ничего из app.*: на вход — простые данные, на выход — bytes.
+"""
+
+from __future__ import annotations
+
+import io
+from typing import Optional, Sequence
+
+
+def render_report_png(
+    title: str,
+    labels: Sequence[str],
+    calories: Sequence[int],
+    proteins: Sequence[float],
+    fats: Sequence[float],
+    carbs: Sequence[float],
+    daily_target: Optional[int] = None,
+) -> bytes:
+    """
+    Два графика: калории по дням (+ линия плана) и БЖУ по дням (stacked bars).
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+
+    x = list(range(len(labels)))
+    fig, (ax_cal, ax_macro) = plt.subplots(
+        2, 1, figsize=(8, 6), dpi=100, sharex=True,
+        gridspec_kw={"height_ratios": [3, 2]},
+    )
+
+    try:
+        ax_cal.bar(x, calories, color="#f28e2b", label="ккал")
+        if daily_target:
+            ax_cal.axhline(daily_target, color="#e15759", linestyle="--", label="план")
+        ax_cal.set_title(title)
+        ax_cal.set_ylabel("ккал")
+        ax_cal.legend(loc="upper left")
+        ax_cal.grid(axis="y", alpha=0.3)
+
+        bottom_fats = list(proteins)
+        bottom_carbs = [p + f for p, f in zip(proteins, fats)]
+        ax_macro.bar(x, proteins, color="#4e79a7", label="Б")
+        ax_macro.bar(x, fats, bottom=bottom_fats, color="#edc948", label="Ж")
+        ax_macro.bar(x, carbs, bottom=bottom_carbs, color="#59a14f", label="У")
+        ax_macro.set_ylabel("г")
+        ax_macro.legend(loc="upper left", ncol=3)
+        ax_macro.grid(axis="y", alpha=0.3)
+
+        # Для месяца подписываем не каждый день
+        step = max(len(labels) // 10, 1)
+        ax_macro.set_xticks(x[::step])
+        ax_macro.set_xticklabels(list(labels)[::step], rotation=45)
+
+        fig.tight_layout()
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
@@ -0,0 +1,196 @@
+# app/services/chart_service.py
+"""
+Графики для отчётов за неделю / месяц.
+
+matplotlib — это CPU и GIL, поэтому рисуем НЕ в event loop бота, а в
+ограниченном пуле процессов:
+  - не больше settings.chart_workers процессов;
+  - не больше CHART_MAX_PENDING задач в очереди, остальным сразу отказываем
+    (ChartBusyError) — отчёт уйдёт текстом без картинки.
+
+Готовые PNG кэшируются по (user_id, period, версия данных, дата).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from app.config import settings
+from app.config_limits import (
+    CHART_CACHE_MAX_ENTRIES,
+    CHART_MAX_PENDING,
+    CHART_RENDER_TIMEOUT_SECONDS,
+)
+from app.db import rollups
+from app.services import metrics
+from app.services.chart_render import render_report_png
+from app.services.report_service import Report
+
+logger = logging.getLogger(__name__)
+
+
+class ChartBusyError(Exception):
+    """Очередь рендеринга переполнена — график сейчас не рисуем."""
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# Сколько задач отправлено в пул и ещё не завершено (очередь + в работе)
+_pending: int = 0
+
+# Простая статистика рендеринга (для логов / админки / метрик)
+_stats = {
+    "renders": 0,
+    "render_seconds_total": 0.0,
+    "render_seconds_max": 0.0,
+    "cache_hits": 0,
+    "rejected": 0,
+    "errors": 0,
+}
+
+# (user_id, period, meals_version, end_date) -> PNG
+_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: не форкаем процесс с запущенным event loop и открытыми сокетами
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.chart_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def chart_queue_depth() -> int:
+    return _pending
+
+
+def chart_stats() -> dict:
+    return {**_stats, "queue_depth": _pending, "cache_size": len(_cache)}
+
+
+metrics.gauge(
+    "dishvision_chart_queue_depth",
+    "Графики в очереди процесс-пула и в работе",
+    function=chart_queue_depth,
+)
+
+
+def _chart_payload(report: Report) -> dict:
+    """
+    Данные для графика: все дни периода подряд, пустые дни — нулями.
+    """
+    by_day = {item.day: item for item in report.items if item.day is not None}
+
+    labels, calories, proteins, fats, carbs = [], [], [], [], []
+    for offset in range(report.days):
+        day = report.start + timedelta(days=offset)
+        item = by_day.get(day)
+        labels.append(day.strftime("%d.%m"))
+        calories.append(item.calories if item else 0)
+        proteins.append(item.proteins if item else 0.0)
+        fats.append(item.fats if item else 0.0)
+        carbs.append(item.carbs if item else 0.0)
+
+    return {
+        "title": f"{report.start.strftime('%d.%m')} — {report.end.strftime('%d.%m')}",
+        "labels": labels,
+        "calories": calories,
+        "proteins": proteins,
+        "fats": fats,
+        "carbs": carbs,
+        "daily_target": report.daily_target,
+    }
+
+
+def _render_finished(future: asyncio.Future) -> None:
+    global _pending
+    _pending -= 1
+    # после таймаута результат никто не ждёт — забираем ошибку, чтобы не было
+    # «Future exception was never retrieved»
+    if not future.cancelled():
+        future.exception()
+
+
+async def render_report_chart(user_id: int, report: Report) -> bytes:
+    """
+    PNG-график отчёта (неделя/месяц). Бросает ChartBusyError при
+    переполненной очереди и asyncio.TimeoutError при слишком долгом рендере.
+    """
+    global _pending
+
+    key = (user_id, report.period, rollups.meals_version(user_id), report.end)
+    cached = _cache.get(key)
+    if cached is not None:
+        _cache.move_to_end(key)
+        _stats["cache_hits"] += 1
+        return cached
+
+    if _pending >= CHART_MAX_PENDING:
+        _stats["rejected"] += 1
+        raise ChartBusyError(f"chart queue is full ({_pending})")
+
+    loop = asyncio.get_running_loop()
+    payload = _chart_payload(report)
+
+    _pending += 1
+    started = time.perf_counter()
+    try:
+        # Задача — partial от функции из лёгкого модуля chart_render. Сам процесс
+        # пула (spawn) при старте всё равно заново импортирует __main__ (app.main),
+        # а с ним app.config: ему нужно то же окружение, что и боту.
+        future = loop.run_in_executor(
+            _get_executor(),
+            functools.partial(render_report_png, **payload),
+        )
+    except Exception:
+        _pending -= 1
+        _stats["errors"] += 1
+        raise
+    # Рендер в процессе пула не прервать: по таймауту или отмене хендлера он
+    # продолжает занимать пул, поэтому _pending уменьшается только по его окончании
+    future.add_done_callback(_render_finished)
+
+    try:
+        png = await asyncio.wait_for(asyncio.shield(future), timeout=CHART_RENDER_TIMEOUT_SECONDS)
+    except Exception:
+        _stats["errors"] += 1
+        raise
+
+    elapsed = time.perf_counter() - started
+    _stats["renders"] += 1
+    _stats["render_seconds_total"] += elapsed
+    _stats["render_seconds_max"] = max(_stats["render_seconds_max"], elapsed)
+    logger.debug(
+        "Chart rendered user_id=%s period=%s in %.3fs (queue_depth=%s)",
+        user_id,
+        report.period,
+        elapsed,
+        _pending,
+    )
+
+    _cache[key] = png
+    while len(_cache) > CHART_CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+
+    return png
+
+
+def shutdown_chart_pool() -> None:
+    """
+    Остановить пул процессов (при завершении бота).
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
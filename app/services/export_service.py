@@ -0,0 +1,139 @@
+# app/services/export_service.py
+"""
+Экспорт дневника питания (meals) пользователя в CSV или NDJSON.
+
+Память не зависит от размера истории:
+  - строки читаются серверным курсором (`session.stream(...)` + yield_per)
+    пачками по EXPORT_BATCH_SIZE;
+  - каждая строка сразу пишется в SpooledTemporaryFile, который держит
+    в памяти не больше EXPORT_SPOOL_MAX_BYTES и дальше уходит на диск;
+  - в Telegram файл отдаётся кусками (SpooledInputFile), без чтения целиком.
+"""
+
+from __future__ import annotations
+
+import codecs
+import csv
+import json
+import tempfile
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncGenerator, Literal
+
+from aiogram.types import InputFile
+from sqlalchemy import select
+
+from app.config_limits import EXPORT_BATCH_SIZE, EXPORT_SPOOL_MAX_BYTES
+from app.db.base import AsyncSessionLocal
+from app.db.models import Meal
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+ExportFormat = Literal["csv", "ndjson"]
+
+EXPORT_COLUMNS = (
+    "id",
+    "eaten_at",
+    "title",
+    "weight_grams",
+    "calories",
+    "proteins",
+    "fats",
+    "carbs",
+)
+
+
+@dataclass
+class MealExport:
+    """
+    Результат экспорта: временный файл (позиция — в начале), число строк и размер.
+    Файл нужно закрыть после отправки (close()).
+    """
+    file: tempfile.SpooledTemporaryFile
+    fmt: str
+    rows: int
+    size_bytes: int
+
+    @property
+    def filename(self) -> str:
+        return f"meals.{self.fmt}"
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class SpooledInputFile(InputFile):
+    """
+    InputFile для aiogram, читающий уже открытый файл кусками.
+    """
+
+    def __init__(self, file, filename: str) -> None:
+        super().__init__(filename=filename)
+        self.file = file
+
+    async def read(self, bot: "Bot") -> AsyncGenerator[bytes, None]:
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+
+def _row_to_dict(row) -> dict:
+    return {
+        "id": row.id,
+        "eaten_at": row.eaten_at.isoformat() if row.eaten_at else None,
+        "title": row.title,
+        "weight_grams": row.weight_grams,
+        "calories": row.calories,
+        "proteins": row.proteins,
+        "fats": row.fats,
+        "carbs": row.carbs,
+    }
+
+
+async def export_meals(user_id: int, fmt: ExportFormat = "csv") -> MealExport:
+    """
+    Выгрузить все приёмы пищи пользователя в порядке eaten_at.
+    """
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES, mode="w+b")
+    # Текстовый writer поверх бинарного файла; BOM — чтобы Excel понял UTF-8
+    text = codecs.getwriter("utf-8")(spool)
+
+    if fmt == "csv":
+        spool.write(codecs.BOM_UTF8)
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_COLUMNS)
+
+    stmt = (
+        select(*(getattr(Meal, column) for column in EXPORT_COLUMNS))
+        .where(Meal.user_id == user_id)
+        .order_by(Meal.eaten_at, Meal.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    rows = 0
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(stmt)
+            async for partition in result.partitions():
+                for row in partition:
+                    item = _row_to_dict(row)
+                    if fmt == "csv":
+                        writer.writerow(item[column] for column in EXPORT_COLUMNS)
+                    else:
+                        text.write(json.dumps(item, ensure_ascii=False))
+                        text.write("\n")
+                    rows += 1
+    except Exception:
+        spool.close()
+        raise
+
+    size = spool.tell()
+    spool.seek(0)
+    return MealExport(file=spool, fmt=fmt, rows=rows, size_bytes=size)
+
+
+def as_input_file(export: MealExport) -> SpooledInputFile:
+    return SpooledInputFile(export.file, filename=export.filename)
@@ -0,0 +1,220 @@
+# app/services/flood_control.py
+"""
+Антифлуд (docs/06_abuse_protection.md, п. 6.6): корзины токенов на
+пользователя по видам апдейтов — фото, текст, кнопки.
+
+Каждый апдейт забирает токен из своей корзины; корзина пополняется с
+постоянной скоростью до ёмкости (FLOOD_*_BURST / FLOOD_*_PER_SECOND).
+Пустая корзина — апдейт отбрасывается до хендлеров (FloodMiddleware):
+без запросов к БД и вызовов GPT. Серия отказов (FLOOD_STRIKES_TO_SUSPICIOUS
+за FLOOD_STRIKE_WINDOW_SECONDS) — мягкий бан: users.is_suspicious, корзины
+пользователя уменьшаются в FLOOD_SUSPICIOUS_FACTOR раз, флаг снимает
+фоновая задача через FLOOD_SUSPICIOUS_HOURS.
+
+Состояние — в памяти процесса: объект со __slots__ на активного
+пользователя; простаивающие (все корзины снова полны) раз в
+FLOOD_EVICT_SECONDS удаляются. В режиме нескольких процессов
+(app/runner) апдейты одного пользователя всегда идут в один шард, поэтому
+его корзины живут ровно в одном процессе и общее хранилище не нужно;
+общим остаётся только флаг is_suspicious в БД — UserMiddleware
+подтягивает его в память при первом апдейте пользователя.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import sqlalchemy as sa
+
+from app.config_limits import (
+    FLOOD_CALLBACK_BURST,
+    FLOOD_CALLBACK_PER_SECOND,
+    FLOOD_EVICT_SECONDS,
+    FLOOD_NOTICE_INTERVAL_SECONDS,
+    FLOOD_PHOTO_BURST,
+    FLOOD_PHOTO_PER_SECOND,
+    FLOOD_STRIKE_WINDOW_SECONDS,
+    FLOOD_STRIKES_TO_SUSPICIOUS,
+    FLOOD_SUSPICIOUS_FACTOR,
+    FLOOD_SUSPICIOUS_HOURS,
+    FLOOD_TEXT_BURST,
+    FLOOD_TEXT_PER_SECOND,
+)
+from app.db.base import AsyncSessionLocal
+from app.db.models import User
+from app.services import metrics
+from app.services.user_service import to_utc
+
+logger = logging.getLogger(__name__)
+
+# Виды апдейтов (индексы корзин)
+KIND_PHOTO = 0
+KIND_TEXT = 1
+KIND_CALLBACK = 2
+KIND_NAMES = ("photo", "text", "callback")
+
+# Решение по апдейту
+ALLOW = "allow"
+REJECT = "reject"            # отбросить молча
+REJECT_NOTIFY = "notify"     # отбросить и ответить «слишком часто»
+REJECT_ESCALATE = "escalate"  # отбросить, пользователь только что получил мягкий бан
+
+DEFAULT_BUCKETS: tuple[tuple[float, float], ...] = (
+    (FLOOD_PHOTO_BURST, FLOOD_PHOTO_PER_SECOND),
+    (FLOOD_TEXT_BURST, FLOOD_TEXT_PER_SECOND),
+    (FLOOD_CALLBACK_BURST, FLOOD_CALLBACK_PER_SECOND),
+)
+
+FLOOD_REJECTED = metrics.counter(
+    "dishvision_flood_rejected_total",
+    "Апдейты, отброшенные антифлудом, по виду",
+    ("kind",),
+)
+FLOOD_ESCALATIONS = metrics.counter(
+    "dishvision_flood_escalations_total",
+    "Пользователи, помеченные is_suspicious за флуд",
+)
+
+
+class _UserBuckets:
+    __slots__ = ("tokens", "updated", "strikes", "strikes_since", "noticed_at", "suspicious_until")
+
+    def __init__(self, buckets: tuple[tuple[float, float], ...], now: float) -> None:
+        self.tokens = [float(capacity) for capacity, _ in buckets]
+        self.updated = now
+        self.strikes = 0
+        self.strikes_since = now
+        self.noticed_at = float("-inf")
+        # Мягкий бан действует до этого момента (по часам лимитера); 0 — бана нет
+        self.suspicious_until = 0.0
+
+
+class FloodLimiter:
+    def __init__(
+        self,
+        buckets: tuple[tuple[float, float], ...] = DEFAULT_BUCKETS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.buckets = buckets
+        self.clock = clock
+        self._users: dict[int, _UserBuckets] = {}
+        self._swept_at = clock()
+        # За сколько секунд пустые корзины заполняются полностью (для вытеснения)
+        self._idle_seconds = max(capacity / rate for capacity, rate in buckets)
+
+    @property
+    def tracked_users(self) -> int:
+        return len(self._users)
+
+    def _refill(self, state: _UserBuckets, now: float) -> None:
+        elapsed = now - state.updated
+        if elapsed <= 0:
+            return
+        factor = FLOOD_SUSPICIOUS_FACTOR if state.suspicious_until > now else 1.0
+        tokens = state.tokens
+        for i, (capacity, rate) in enumerate(self.buckets):
+            tokens[i] = min(capacity * factor, tokens[i] + elapsed * rate * factor)
+        state.updated = now
+
+    def hit(self, user_id: int, kind: int) -> str:
+        """
+        Апдейт вида kind от пользователя: ALLOW или одно из REJECT_*.
+        """
+        now = self.clock()
+        if now - self._swept_at >= FLOOD_EVICT_SECONDS:
+            self.sweep(now)
+
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserBuckets(self.buckets, now)
+        else:
+            self._refill(state, now)
+
+        if state.tokens[kind] >= 1.0:
+            state.tokens[kind] -= 1.0
+            return ALLOW
+
+        FLOOD_REJECTED.inc(KIND_NAMES[kind])
+        if now - state.strikes_since > FLOOD_STRIKE_WINDOW_SECONDS:
+            state.strikes = 0
+            state.strikes_since = now
+        state.strikes += 1
+
+        if state.suspicious_until <= now and state.strikes >= FLOOD_STRIKES_TO_SUSPICIOUS:
+            self.mark_suspicious(user_id)
+            FLOOD_ESCALATIONS.inc()
+            state.noticed_at = now
+            return REJECT_ESCALATE
+        if now - state.noticed_at >= FLOOD_NOTICE_INTERVAL_SECONDS:
+            state.noticed_at = now
+            return REJECT_NOTIFY
+        return REJECT
+
+    def mark_suspicious(self, user_id: int, seconds: float = FLOOD_SUSPICIOUS_HOURS * 3600) -> None:
+        """
+        Мягкий бан в памяти на seconds: корзины сразу урезаются до новой
+        ёмкости. Снимается только по истечении срока — флаг из БД может лишь
+        поставить бан (пользователь, прочитанный до эскалации, не должен его сбросить).
+        """
+        state = self._users.get(user_id)
+        now = self.clock()
+        if state is None or state.suspicious_until > now or seconds <= 0:
+            return
+        self._refill(state, now)
+        state.suspicious_until = now + seconds
+        state.tokens = [
+            min(tokens, capacity * FLOOD_SUSPICIOUS_FACTOR)
+            for tokens, (capacity, _) in zip(state.tokens, self.buckets)
+        ]
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Удалить пользователей, простаивающих дольше времени полного пополнения
+        корзин (их состояние совпадает с новым). Возвращает число удалённых.
+        """
+        now = self.clock() if now is None else now
+        self._swept_at = now
+        horizon = max(self._idle_seconds, FLOOD_STRIKE_WINDOW_SECONDS)
+        idle = [user_id for user_id, state in self._users.items() if now - state.updated >= horizon]
+        for user_id in idle:
+            del self._users[user_id]
+        return len(idle)
+
+
+def sync_suspicious(user: User, limiter: Optional[FloodLimiter] = None) -> None:
+    """
+    Перенести в память мягкий бан из БД (поставлен до рестарта или до
+    вытеснения пользователя из памяти) на оставшийся срок.
+    """
+    if not user.is_suspicious or user.suspicious_since is None:
+        return
+    since = to_utc(user.suspicious_since)
+    left = (since - datetime.now(timezone.utc)).total_seconds() + FLOOD_SUSPICIOUS_HOURS * 3600
+    (limiter or flood_limiter).mark_suspicious(user.telegram_id, left)
+
+
+async def flag_suspicious(telegram_id: int) -> None:
+    """
+    Записать мягкий бан в users (его видят все процессы и он переживает рестарт).
+    """
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            sa.update(User)
+            .where(User.telegram_id == telegram_id, User.is_suspicious.is_(False))
+            .values(is_suspicious=True, suspicious_since=datetime.now(timezone.utc))
+        )
+        await session.commit()
+    logger.warning("Антифлуд: пользователь %s помечен is_suspicious", telegram_id)
+
+
+# Один на процесс: FloodMiddleware считает апдейты, UserMiddleware подтягивает флаг из БД
+flood_limiter = FloodLimiter()
+
+metrics.gauge(
+    "dishvision_flood_tracked_users",
+    "Пользователи с корзинами антифлуда в памяти процесса",
+    function=lambda: flood_limiter.tracked_users,
+)
@@ -1,16 +1,34 @@
 # app/services/gpt_client.py
+"""
+Вызовы OpenAI для анализа фото.
+
+Модель выбирается маршрутом (тариф, тип анализа) из GPT_ROUTES: сначала
+дешёвая, и только если она не уверена в ответе — следующая, более сильная.
+Уверенность модель пишет служебной последней строкой («Уверенность: 85»,
+см. app/prompts/food_analysis.py); строка вырезается из ответа. Ниже
+GPT_ESCALATION_MIN_CONFIDENCE — эскалация; нет строки — ответ принимается
+как есть. Время ответа и стоимость пишутся в метрики по маршруту и модели.
+
+Тексты промптов и порядок частей запроса — app/prompts/registry.py;
+доля prompt-токенов из кэша OpenAI (usage.prompt_tokens_details) считается
+по версии промпта.
+
+settings.openai_model (если задан) заменяет маршрутизацию одной моделью.
+"""
 
 import base64
 import logging
+import re
+import time
+from dataclasses import dataclass
 from typing import Literal, Optional
 
 from openai import AsyncOpenAI
 
 from app.config import settings
-from app.prompts.food_analysis import (
-    SYSTEM_PROMPT_NUTRITION,
-    SYSTEM_PROMPT_RECIPE,
-)
+from app.config_limits import GPT_ESCALATION_MIN_CONFIDENCE, GPT_ROUTES
+from app.services import metrics, stats_service, tracing
+from app.prompts.registry import Prompt, get_prompt
 
 logger = logging.getLogger(__name__)
 
@@ -19,50 +37,88 @@ client = AsyncOpenAI(api_key=settings.openai_api_key)
 DEFAULT_MODEL = "gpt-4o-mini"
 AnalysisType = Literal["nutrition", "recipe"]
 
+# Служебная строка ответа с уверенностью модели (0–100)
+_CONFIDENCE_RE = re.compile(r"^[\s*_]*Уверенность[\s*_]*:[\s*_]*(\d{1,3})\s*%?[\s*_]*$", re.IGNORECASE)
+
+GPT_ROUTE_LATENCY = metrics.histogram(
+    "dishvision_gpt_route_latency_seconds",
+    "Время ответа OpenAI по маршруту (тариф:тип анализа) и модели",
+    ("route", "model"),
+    buckets=(0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60),
+)
+GPT_ROUTE_COST = metrics.counter(
+    "dishvision_gpt_route_cost_usd_total",
+    "Стоимость вызовов OpenAI по маршруту и модели, USD",
+    ("route", "model"),
+)
+GPT_PROMPT_TOKENS = metrics.counter(
+    "dishvision_gpt_prompt_tokens_total",
+    "Prompt-токены по версии промпта; cached=yes — из кэша префикса OpenAI",
+    ("prompt", "cached"),
+)
+GPT_ROUTE_RESULTS = metrics.counter(
+    "dishvision_gpt_route_results_total",
+    "Ответы по маршруту (accepted / escalated / no_confidence / escalation_failed)",
+    ("route", "result"),
+)
+
+
+@dataclass(frozen=True)
+class GptAnswer:
+    text: str
+    model: str
+    # Тег версии промпта (app/prompts/registry.py)
+    prompt_version: str
+    confidence: Optional[int] = None
+
+
+async def close_client() -> None:
+    """
+    Закрыть HTTP-пул клиента OpenAI (при остановке процесса).
+    """
+    await client.close()
+
 
-def _get_model_name() -> str:
-    return getattr(settings, "openai_model", DEFAULT_MODEL)
+def _route_models(premium: bool, analysis_type: AnalysisType) -> tuple[str, ...]:
+    override = getattr(settings, "openai_model", None)
+    if override:
+        return (override,)
+    tier = "premium" if premium else "free"
+    return GPT_ROUTES.get((tier, analysis_type), (DEFAULT_MODEL,))
+
+
+def split_confidence(text: str) -> tuple[str, Optional[int]]:
+    """
+    Вырезать служебные строки «Уверенность: N». Возвращает (ответ, последняя N или None).
+    """
+    confidence: Optional[int] = None
+    kept: list[str] = []
+    for line in text.splitlines():
+        match = _CONFIDENCE_RE.match(line)
+        if match is None:
+            kept.append(line)
+        else:
+            confidence = min(int(match.group(1)), 100)
+    if confidence is None:
+        return text, None
+    return "\n".join(kept).strip(), confidence
 
 
 def _build_message_content(
-    analysis_type: AnalysisType,
+    prompt: Prompt,
     image_bytes: Optional[bytes],
     comment: Optional[str],
 ) -> list[dict]:
     """
-    Контент для user-сообщения в chat.completions:
+    Контент для user-сообщения в chat.completions, от постоянного к переменному
+    (кэш префикса, см. app/prompts/registry.py):
     content = [
-      {"type": "text", "text": "..."},
-      {"type": "image_url", "image_url": {"url": "..."}}
+      {"type": "text", "text": "<инструкция>"},
+      {"type": "image_url", "image_url": {"url": "..."}},
+      {"type": "text", "text": "Описание от пользователя: ..."}
     ]
     """
-    if analysis_type == "nutrition":
-        base_text = (
-            "Проанализируй ВСЕ блюда и напитки на фото. "
-            "Для КАЖДОЙ позиции оцени калорийность и БЖУ, "
-            "а затем посчитай ИТОГОВУЮ калорийность и БЖУ как сумму всех компонентов.\n\n"
-            "Если в описании ниже я уточняю состав (например, что напиток без сахара, убрал/добавил ингредиенты), "
-            "считай, что это самая актуальная информация и ОБЯЗАТЕЛЬНО пересчитай и значения для каждой позиции, "
-            "и итоговую строку в начале ответа. "
-            "Ответ выведи строго в формате из системного промпта."
-        )
-    else:
-        base_text = (
-            "Составь подробные рецепты для блюд на фото по инструкциям системного промпта."
-        )
-
-    comment = (comment or "").strip()
-    if comment:
-        text = f"{base_text}\n\nОписание от пользователя:\n{comment}"
-    else:
-        text = base_text
-
-    parts: list[dict] = [
-        {
-            "type": "text",
-            "text": text,
-        }
-    ]
+    parts: list[dict] = [prompt.instruction_part]
 
     if image_bytes:
         b64 = base64.b64encode(image_bytes).decode("utf-8")
@@ -75,45 +131,76 @@ def _build_message_content(
             }
         )
 
-    return parts
+    comment = (comment or "").strip()
+    if comment:
+        parts.append(
+            {
+                "type": "text",
+                "text": f"Описание от пользователя:\n{comment}",
+            }
+        )
 
+    return parts
 
 
 async def _call_gpt_with_vision(
-    analysis_type: AnalysisType,
+    model: str,
+    route: str,
+    prompt: Prompt,
     image_bytes: Optional[bytes],
     comment: Optional[str],
 ) -> str:
     """
     Вызов chat.completions с картинкой + текстом.
     """
-    model = _get_model_name()
-    system_prompt = (
-        SYSTEM_PROMPT_NUTRITION
-        if analysis_type == "nutrition"
-        else SYSTEM_PROMPT_RECIPE
-    )
-
-    logger.debug("Calling OpenAI Chat model=%s for %s", model, analysis_type)
-
-    response = await client.chat.completions.create(
-        model=model,
-        temperature=0.3,
-        messages=[
-            {
-                "role": "system",
-                "content": system_prompt,
-            },
-            {
-                "role": "user",
-                "content": _build_message_content(
-                    analysis_type=analysis_type,
-                    image_bytes=image_bytes,
-                    comment=comment,
-                ),
-            },
-        ],
-    )
+    logger.debug("Calling OpenAI Chat model=%s for %s", model, prompt.tag)
+
+    started = time.perf_counter()
+    with tracing.span("openai.chat", model=model, route=route, prompt_version=prompt.tag) as span:
+        try:
+            response = await client.chat.completions.create(
+                model=model,
+                temperature=0.3,
+                messages=[
+                    prompt.system_message,
+                    {
+                        "role": "user",
+                        "content": _build_message_content(prompt, image_bytes, comment),
+                    },
+                ],
+            )
+        except Exception:
+            stats_service.incr(stats_service.GPT_ERRORS)
+            raise
+    GPT_ROUTE_LATENCY.observe(time.perf_counter() - started, route, model)
+
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        prompt_tokens = usage.prompt_tokens or 0
+        completion_tokens = usage.completion_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = min(getattr(details, "cached_tokens", None) or 0, prompt_tokens)
+
+        stats_service.record_gpt_usage(
+            model,
+            prompt_tokens,
+            completion_tokens,
+            cached_tokens=cached_tokens,
+            prompt_version=prompt.tag,
+        )
+        GPT_ROUTE_COST.inc(
+            route,
+            model,
+            value=stats_service.gpt_cost_usd(model, prompt_tokens, completion_tokens, cached_tokens),
+        )
+        GPT_PROMPT_TOKENS.inc(prompt.tag, "yes", value=cached_tokens)
+        GPT_PROMPT_TOKENS.inc(prompt.tag, "no", value=prompt_tokens - cached_tokens)
+        if span is not None:
+            span.set(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                cached_tokens=cached_tokens,
+            )
 
     content = response.choices[0].message.content
 
@@ -130,15 +217,59 @@ async def _call_gpt_with_vision(
     return content or ""
 
 
+async def _call_routed(
+    analysis_type: AnalysisType,
+    image_bytes: Optional[bytes],
+    comment: Optional[str],
+    premium: bool,
+) -> GptAnswer:
+    """
+    Модели маршрута по очереди, пока очередная не ответит уверенно.
+    Ошибка эскалации — остаётся ответ предыдущей модели.
+    """
+    route = f"{'premium' if premium else 'free'}:{analysis_type}"
+    models = _route_models(premium, analysis_type)
+    prompt = get_prompt(analysis_type)
+    answer: Optional[GptAnswer] = None
+
+    for model in models:
+        try:
+            raw = await _call_gpt_with_vision(model, route, prompt, image_bytes, comment)
+        except Exception as e:
+            if answer is None:
+                raise
+            logger.warning("Эскалация %s → %s не удалась, остаётся ответ %s: %s", route, model, answer.model, e)
+            GPT_ROUTE_RESULTS.inc(route, "escalation_failed")
+            return answer
+
+        escalated = answer is not None
+        text, confidence = split_confidence(raw)
+        answer = GptAnswer(text=text, model=model, prompt_version=prompt.tag, confidence=confidence)
+        if escalated:
+            GPT_ROUTE_RESULTS.inc(route, "escalated")
+            return answer
+        if confidence is None:
+            GPT_ROUTE_RESULTS.inc(route, "no_confidence")
+            return answer
+        if confidence >= GPT_ESCALATION_MIN_CONFIDENCE or model == models[-1]:
+            GPT_ROUTE_RESULTS.inc(route, "accepted")
+            return answer
+        logger.info("Маршрут %s: %s не уверена (%s), эскалация", route, model, confidence)
+
+    return answer
+
+
 async def analyze_nutrition(
     image_bytes: Optional[bytes],
     comment: Optional[str],
-) -> str:
-    return await _call_gpt_with_vision("nutrition", image_bytes, comment)
+    premium: bool = False,
+) -> GptAnswer:
+    return await _call_routed("nutrition", image_bytes, comment, premium)
 
 
 async def analyze_recipe(
     image_bytes: Optional[bytes],
     comment: Optional[str],
-) -> str:
-    return await _call_gpt_with_vision("recipe", image_bytes, comment)
+    premium: bool = False,
+) -> GptAnswer:
+    return await _call_routed("recipe", image_bytes, comment, premium)
@@ -0,0 +1,212 @@
+# app/services/jobs.py
+"""
+Фоновые задачи обслуживания и их расписание (см. app/services/scheduler.py).
+
+Удаления и обновления идут пачками по JOB_BATCH_SIZE строк
+(`id IN (SELECT id ... LIMIT n)`), каждая пачка — своя короткая транзакция:
+не держим длинных блокировок и не раздуваем WAL одной большой транзакцией.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+
+import sqlalchemy as sa
+
+from app.bot.fsm_storage import TrackedMemoryStorage
+from app.config_limits import (
+    ANALYSIS_JOBS_RETENTION_DAYS,
+    FLOOD_SUSPICIOUS_HOURS,
+    FSM_SESSION_IDLE_HOURS,
+    JOB_BATCH_SIZE,
+    JOB_CLEAR_SUSPICIOUS_CRON,
+    JOB_FSM_GC_CRON,
+    JOB_PREMIUM_EXPIRY_CRON,
+    JOB_PRUNE_ANALYSIS_JOBS_CRON,
+    JOB_PRUNE_PROMO_BANS_CRON,
+    JOB_PRUNE_QUOTA_RESERVATIONS_CRON,
+    JOB_PRUNE_STATS_ACTIVE_USERS_CRON,
+    JOB_PRUNE_USER_LIMITS_CRON,
+    JOB_REFRESH_PROMO_FILTER_CRON,
+    JOB_REAP_QUOTA_RESERVATIONS_CRON,
+    JOB_REQUEUE_ANALYSIS_CRON,
+    PROMO_BANS_RETENTION_DAYS,
+    QUOTA_RESERVATIONS_RETENTION_DAYS,
+    STATS_ACTIVE_USERS_RETENTION_DAYS,
+    USER_LIMITS_RETENTION_DAYS,
+)
+from app.db.base import AsyncSessionLocal, engine
+from app.db.models import AnalysisJob, PromoBan, QuotaReservation, StatsActiveUser, User, UserLimit
+from app.services import analysis_queue, limit_service, promo_guard
+from app.services.scheduler import LeaderLock, Scheduler
+
+
+async def _run_batched(statement) -> int:
+    """
+    Повторять statement (UPDATE/DELETE ... WHERE id IN (SELECT ... LIMIT n)),
+    пока очередная пачка заполнена целиком.
+    """
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(statement)
+            await session.commit()
+        total += result.rowcount
+        if result.rowcount < JOB_BATCH_SIZE:
+            return total
+
+
+async def expire_premium() -> int:
+    """
+    Снять is_premium с подписок, у которых premium_until в прошлом.
+    Хендлеры и так проверяют срок (is_effective_premium), задача приводит
+    флаг в БД в соответствие — для статистики и рассылок.
+    """
+    now = datetime.now(timezone.utc)
+    expired_ids = (
+        sa.select(User.id)
+        .where(User.is_premium.is_(True), User.premium_until < now)
+        .limit(JOB_BATCH_SIZE)
+    )
+    return await _run_batched(
+        sa.update(User)
+        .where(User.id.in_(expired_ids.scalar_subquery()))
+        .values(is_premium=False)
+        .execution_options(synchronize_session=False),
+    )
+
+
+async def clear_suspicious() -> int:
+    """
+    Снять мягкий бан за флуд (is_suspicious) старше FLOOD_SUSPICIOUS_HOURS.
+    Процессы бота подхватят это при следующем апдейте пользователя (UserMiddleware).
+    """
+    border = datetime.now(timezone.utc) - timedelta(hours=FLOOD_SUSPICIOUS_HOURS)
+    expired_ids = (
+        sa.select(User.id)
+        .where(User.is_suspicious.is_(True), User.suspicious_since < border)
+        .limit(JOB_BATCH_SIZE)
+    )
+    return await _run_batched(
+        sa.update(User)
+        .where(User.id.in_(expired_ids.scalar_subquery()))
+        .values(is_suspicious=False, suspicious_since=None)
+        .execution_options(synchronize_session=False),
+    )
+
+
+async def prune_user_limits() -> int:
+    """
+    Удалить дневные счётчики старше USER_LIMITS_RETENTION_DAYS.
+    """
+    border = date.today() - timedelta(days=USER_LIMITS_RETENTION_DAYS)
+    old_ids = sa.select(UserLimit.id).where(UserLimit.date < border).limit(JOB_BATCH_SIZE)
+    return await _run_batched(
+        sa.delete(UserLimit)
+        .where(UserLimit.id.in_(old_ids.scalar_subquery()))
+        .execution_options(synchronize_session=False),
+    )
+
+
+async def prune_promo_bans() -> int:
+    """
+    Удалить баны промокодов, истёкшие более PROMO_BANS_RETENTION_DAYS назад.
+    """
+    border = datetime.now(timezone.utc) - timedelta(days=PROMO_BANS_RETENTION_DAYS)
+    old_ids = sa.select(PromoBan.id).where(PromoBan.banned_until < border).limit(JOB_BATCH_SIZE)
+    return await _run_batched(
+        sa.delete(PromoBan)
+        .where(PromoBan.id.in_(old_ids.scalar_subquery()))
+        .execution_options(synchronize_session=False),
+    )
+
+
+async def prune_stats_active_users() -> int:
+    """
+    Удалить отметки DAU старше STATS_ACTIVE_USERS_RETENTION_DAYS.
+    """
+    border = date.today() - timedelta(days=STATS_ACTIVE_USERS_RETENTION_DAYS)
+    old_keys = (
+        sa.select(StatsActiveUser.day, StatsActiveUser.user_id)
+        .where(StatsActiveUser.day < border)
+        .limit(JOB_BATCH_SIZE)
+    )
+    return await _run_batched(
+        sa.delete(StatsActiveUser)
+        .where(sa.tuple_(StatsActiveUser.day, StatsActiveUser.user_id).in_(old_keys))
+        .execution_options(synchronize_session=False),
+    )
+
+
+async def prune_analysis_jobs() -> int:
+    """
+    Удалить завершённые задачи анализа (done / dead) старше ANALYSIS_JOBS_RETENTION_DAYS.
+    """
+    border = datetime.now(timezone.utc) - timedelta(days=ANALYSIS_JOBS_RETENTION_DAYS)
+    old_ids = (
+        sa.select(AnalysisJob.id)
+        .where(
+            AnalysisJob.status.in_((analysis_queue.STATUS_DONE, analysis_queue.STATUS_DEAD)),
+            AnalysisJob.finished_at < border,
+        )
+        .limit(JOB_BATCH_SIZE)
+    )
+    return await _run_batched(
+        sa.delete(AnalysisJob)
+        .where(AnalysisJob.id.in_(old_ids.scalar_subquery()))
+        .execution_options(synchronize_session=False),
+    )
+
+
+async def prune_quota_reservations() -> int:
+    """
+    Удалить закрытые резервы лимита (committed / released) старше QUOTA_RESERVATIONS_RETENTION_DAYS.
+    """
+    border = datetime.now(timezone.utc) - timedelta(days=QUOTA_RESERVATIONS_RETENTION_DAYS)
+    old_ids = (
+        sa.select(QuotaReservation.id)
+        .where(
+            QuotaReservation.status != limit_service.RESERVATION_HELD,
+            QuotaReservation.finished_at < border,
+        )
+        .limit(JOB_BATCH_SIZE)
+    )
+    return await _run_batched(
+        sa.delete(QuotaReservation)
+        .where(QuotaReservation.id.in_(old_ids.scalar_subquery()))
+        .execution_options(synchronize_session=False),
+    )
+
+
+def build_scheduler(storage: TrackedMemoryStorage) -> Scheduler:
+    """
+    Планировщик со всеми задачами обслуживания. FSM хранится в памяти процесса,
+    поэтому её чистка выполняется в каждом процессе, остальное — только лидером.
+    """
+
+    async def fsm_gc() -> int:
+        return storage.collect_garbage(FSM_SESSION_IDLE_HOURS * 3600)
+
+    scheduler = Scheduler(LeaderLock(engine))
+    scheduler.add("expire_premium", JOB_PREMIUM_EXPIRY_CRON, expire_premium)
+    scheduler.add("clear_suspicious", JOB_CLEAR_SUSPICIOUS_CRON, clear_suspicious)
+    scheduler.add("prune_user_limits", JOB_PRUNE_USER_LIMITS_CRON, prune_user_limits)
+    scheduler.add("prune_promo_bans", JOB_PRUNE_PROMO_BANS_CRON, prune_promo_bans)
+    scheduler.add("prune_stats_active_users", JOB_PRUNE_STATS_ACTIVE_USERS_CRON, prune_stats_active_users)
+    scheduler.add("requeue_analysis_jobs", JOB_REQUEUE_ANALYSIS_CRON, analysis_queue.requeue_stale_jobs)
+    scheduler.add("prune_analysis_jobs", JOB_PRUNE_ANALYSIS_JOBS_CRON, prune_analysis_jobs)
+    scheduler.add(
+        "reap_quota_reservations",
+        JOB_REAP_QUOTA_RESERVATIONS_CRON,
+        limit_service.release_expired_reservations,
+    )
+    scheduler.add("prune_quota_reservations", JOB_PRUNE_QUOTA_RESERVATIONS_CRON, prune_quota_reservations)
+    scheduler.add("fsm_gc", JOB_FSM_GC_CRON, fsm_gc, leader_only=False)
+    # фильтр Блума по промокодам — в памяти каждого процесса
+    scheduler.add(
+        "refresh_promo_filter",
+        JOB_REFRESH_PROMO_FILTER_CRON,
+        promo_guard.refresh_code_filter,
+        leader_only=False,
+    )
+    return scheduler
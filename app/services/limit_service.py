@@ -1,15 +1,35 @@
 # app/services/limit_service.py
 
-from datetime import date
-from sqlalchemy import select
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import BigInteger, Date, DateTime, Text, cast, exists, insert, literal, null, select, union_all, update
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import IntegrityError
 
 from app.db.base import AsyncSessionLocal
-from app.db.models import UserLimit
+from app.db.models import AnalysisJob, QuotaReservation, User, UserLimit
 from app.config_limits import (
     FREE_TARIFF,
+    JOB_BATCH_SIZE,
     PREMIUM_TARIFF,
+    QUOTA_RESERVATION_TTL_SECONDS,
 )
+from app.services import stats_service
+from app.services.analysis_queue import ANALYSIS_JOBS, STATUS_DONE, STATUS_QUEUED, STATUS_RUNNING, done_update
+
+logger = logging.getLogger(__name__)
+
+# Откуда списан анализ фото: бесплатный дневной лимит или купленный баланс
+QUOTA_FREE = "free"
+QUOTA_PAID = "paid"
+
+# Статусы резерва (quota_reservations.status)
+RESERVATION_HELD = "held"
+RESERVATION_COMMITTED = "committed"
+RESERVATION_RELEASED = "released"
 
 
 def get_limits_for_user(is_premium: bool) -> tuple[int, int]:
@@ -101,4 +121,197 @@ async def get_user_today_analyses(user_id: int, today: date) -> int:
         if limits is None:
             return 0  # Если нет записи, возвращаем 0, а не None
 
-        return limits.photos_used
\ No newline at end of file
+        return limits.photos_used
+
+
+# --- Двухфазное списание: резерв → подтверждение / возврат ---
+#
+# Каждая фаза — один запрос: лимит проверяется и уменьшается условным
+# UPDATE / upsert (без SELECT-then-UPDATE), а переходы резерва идут только
+# из held, так что повторный или опоздавший вызов ничего не меняет.
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def reserve_photo_quota(user_id: int, is_premium: bool = False) -> Optional[QuotaReservation]:
+    """
+    Зарезервировать 1 анализ фото: сначала из бесплатного дневного лимита,
+    затем из купленного баланса. None — лимитов нет.
+
+    Один запрос (CTE с изменением данных, только PostgreSQL):
+
+        take_free — INSERT user_limits ... ON CONFLICT DO UPDATE
+                    SET photos_used = photos_used + 1 WHERE photos_used < лимит
+                    (первый анализ за день создаёт строку сразу с занятым анализом);
+        take_paid — UPDATE users SET paid_photos_balance - 1, только если take_free
+                    ничего не вернул;
+        INSERT quota_reservations из той ветки, что вернула строку.
+    """
+    today = date.today()
+    daily_limit, _ = get_limits_for_user(is_premium)
+
+    # Константы — с явным типом: в RETURNING и INSERT ... SELECT PostgreSQL
+    # не выводит тип параметра из контекста
+    taken = []
+    if daily_limit > 0:
+        upsert = postgresql.insert(UserLimit).values(
+            user_id=user_id, date=today, photos_used=1, refinements_used=0
+        )
+        take_free = upsert.on_conflict_do_update(
+            index_elements=[UserLimit.user_id, UserLimit.date],
+            set_={"photos_used": UserLimit.photos_used + 1},
+            where=UserLimit.photos_used < daily_limit,
+        ).returning(
+            cast(literal(QUOTA_FREE), Text).label("source"),
+            UserLimit.date.label("day"),
+        ).cte("take_free")
+        taken.append(select(take_free.c.source, take_free.c.day))
+
+    paid_filter = [User.id == user_id, User.paid_photos_balance > 0]
+    if taken:
+        paid_filter.append(~exists(taken[0]))
+    take_paid = (
+        update(User)
+        .where(*paid_filter)
+        .values(paid_photos_balance=User.paid_photos_balance - 1)
+        .returning(
+            cast(literal(QUOTA_PAID), Text).label("source"),
+            cast(null(), Date).label("day"),
+        )
+        .cte("take_paid")
+    )
+    taken.append(select(take_paid.c.source, take_paid.c.day))
+    source = union_all(*taken).subquery("taken")
+
+    stmt = (
+        insert(QuotaReservation)
+        .from_select(
+            ["user_id", "source", "day", "status", "expires_at"],
+            select(
+                cast(literal(user_id), BigInteger),
+                source.c.source,
+                source.c.day,
+                cast(literal(RESERVATION_HELD), Text),
+                cast(literal(_utcnow() + timedelta(seconds=QUOTA_RESERVATION_TTL_SECONDS)), DateTime(timezone=True)),
+            ),
+        )
+        .returning(QuotaReservation)
+    )
+
+    async with AsyncSessionLocal() as session:
+        reservation = await session.scalar(stmt)
+        await session.commit()
+        return reservation
+
+
+async def commit_photo_quota(reservation_id: int, job_id: Optional[int] = None) -> bool:
+    """
+    Анализ доставлен — резерв становится окончательным списанием.
+    job_id — задача анализа: она переводится в done в той же транзакции,
+    иначе между done и подтверждением резерв успел бы снять
+    release_expired_reservations (для него done-задача уже не живая).
+    False — резерв уже закрыт (например, снят фоновой задачей).
+    """
+    async with AsyncSessionLocal() as session:
+        source = await session.scalar(
+            update(QuotaReservation)
+            .where(QuotaReservation.id == reservation_id, QuotaReservation.status == RESERVATION_HELD)
+            .values(status=RESERVATION_COMMITTED, finished_at=_utcnow())
+            .returning(QuotaReservation.source)
+        )
+        if job_id is not None:
+            await session.execute(done_update(job_id))
+        await session.commit()
+
+    if job_id is not None:
+        ANALYSIS_JOBS.inc(STATUS_DONE)
+
+    if source is None:
+        logger.warning("Резерв лимита %s уже закрыт — подтверждение пропущено", reservation_id)
+        return False
+    stats_service.incr(stats_service.ANALYSES_FREE if source == QUOTA_FREE else stats_service.ANALYSES_PAID)
+    return True
+
+
+def _give_back(source: str, user_id: int, day: Optional[date], count: int = 1):
+    """
+    UPDATE, возвращающий count анализов в счётчик, из которого их зарезервировали.
+    """
+    if source == QUOTA_FREE:
+        return (
+            update(UserLimit)
+            .where(UserLimit.user_id == user_id, UserLimit.date == day, UserLimit.photos_used >= count)
+            .values(photos_used=UserLimit.photos_used - count)
+        )
+    return (
+        update(User)
+        .where(User.id == user_id)
+        .values(paid_photos_balance=User.paid_photos_balance + count)
+    )
+
+
+async def release_photo_quota(reservation_id: int) -> bool:
+    """
+    Анализ не состоялся — снять резерв и вернуть анализ пользователю.
+    False — резерв уже закрыт.
+    """
+    async with AsyncSessionLocal() as session:
+        row = (
+            await session.execute(
+                update(QuotaReservation)
+                .where(QuotaReservation.id == reservation_id, QuotaReservation.status == RESERVATION_HELD)
+                .values(status=RESERVATION_RELEASED, finished_at=_utcnow())
+                .returning(QuotaReservation.user_id, QuotaReservation.source, QuotaReservation.day)
+            )
+        ).first()
+        if row is not None:
+            await session.execute(_give_back(row.source, row.user_id, row.day))
+        await session.commit()
+    return row is not None
+
+
+async def release_expired_reservations() -> int:
+    """
+    Снять брошенные резервы: старше QUOTA_RESERVATION_TTL_SECONDS и без живой
+    задачи анализа (процесс упал до постановки, задача ушла в dead по аренде).
+    Пачками по JOB_BATCH_SIZE, возврат в счётчики — в той же транзакции.
+    """
+    live_job = exists().where(
+        AnalysisJob.quota_reservation_id == QuotaReservation.id,
+        AnalysisJob.status.in_((STATUS_QUEUED, STATUS_RUNNING)),
+    )
+    total = 0
+    while True:
+        stale_ids = (
+            select(QuotaReservation.id)
+            .where(
+                QuotaReservation.status == RESERVATION_HELD,
+                QuotaReservation.expires_at < _utcnow(),
+                ~live_job,
+            )
+            .limit(JOB_BATCH_SIZE)
+            .scalar_subquery()
+        )
+        async with AsyncSessionLocal() as session:
+            rows = (
+                await session.execute(
+                    update(QuotaReservation)
+                    .where(QuotaReservation.id.in_(stale_ids), QuotaReservation.status == RESERVATION_HELD)
+                    .values(status=RESERVATION_RELEASED, finished_at=_utcnow())
+                    .returning(QuotaReservation.user_id, QuotaReservation.source, QuotaReservation.day)
+                    .execution_options(synchronize_session=False)
+                )
+            ).all()
+            for (user_id, source, day), count in Counter(rows).items():
+                await session.execute(_give_back(source, user_id, day, count))
+            await session.commit()
+
+        total += len(rows)
+        if len(rows) < JOB_BATCH_SIZE:
+            break
+
+    if total:
+        logger.warning("Сняты брошенные резервы лимита: %s", total)
+    return total
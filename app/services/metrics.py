@@ -0,0 +1,224 @@
+# app/services/metrics.py
+"""
+Минимальный реестр метрик в формате Prometheus (без внешних зависимостей).
+
+Горячий путь (observe / inc) — это поиск в dict по кортежу меток, bisect по
+границам бакетов и пара сложений: единицы микросекунд. Локов нет — всё
+выполняется в одном event loop.
+
+Отдача метрик: `start_metrics_server()` поднимает aiohttp-сервер
+с эндпоинтом GET /metrics.
+"""
+
+from __future__ import annotations
+
+import logging
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional, Sequence
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы бакетов латентности по умолчанию (секунды)
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def render(self) -> Iterable[str]:  # pragma: no cover - переопределяется
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels: str, value: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> Iterable[str]:
+        yield from self.header()
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels_text(self.labelnames, labels)} {_fmt(value)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, function: Optional[Callable[[], float]] = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+        self._function = function
+
+    def inc(self, *labels: str, value: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def dec(self, *labels: str, value: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - value
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def get(self, *labels: str) -> float:
+        if self._function is not None:
+            return float(self._function())
+        return self._values.get(labels, 0)
+
+    def render(self) -> Iterable[str]:
+        yield from self.header()
+        if self._function is not None:
+            yield f"{self.name} {_fmt(self._function())}"
+            return
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels_text(self.labelnames, labels)} {_fmt(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счётчики по бакетам (не кумулятивные) + overflow, сумма]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> Iterable[str]:
+        yield from self.header()
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_fmt(bound)}"'
+                yield (
+                    f"{self.name}_bucket{_labels_text(self.labelnames, labels, le)} "
+                    f"{cumulative}"
+                )
+            yield f"{self.name}_sum{_labels_text(self.labelnames, labels)} {_fmt(total)}"
+            yield f"{self.name}_count{_labels_text(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # повторный импорт модуля / регистрация той же метрики
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+
+def gauge(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    function: Optional[Callable[[], float]] = None,
+) -> Gauge:
+    return REGISTRY.register(  # type: ignore[return-value]
+        Gauge(name, documentation, labelnames, function=function)
+    )
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(  # type: ignore[return-value]
+        Histogram(name, documentation, labelnames, buckets=buckets)
+    )
+
+
+# ===== HTTP-эндпоинт =====
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        body=REGISTRY.render().encode("utf-8"),
+        headers={"Content-Type": CONTENT_TYPE},
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """
+    Поднять HTTP-сервер с /metrics в текущем event loop.
+    Остановка: `await runner.cleanup()`.
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+
+    logger.info("Metrics endpoint: http://%s:%s/metrics", host, port)
+    return runner
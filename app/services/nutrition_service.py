@@ -0,0 +1,106 @@
+# app/services/nutrition_service.py
+"""
+Дневник питания: дневной агрегат (daily_nutrition) и план по калориям.
+
+Агрегат обновляется автоматически слушателями из app/db/rollups.py при
+любой записи Meal через ORM; здесь — только полная пересборка для
+операций в обход ORM.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy import select
+
+from app.config import settings
+from app.db import rollups  # регистрирует слушатели Meal
+from app.db.base import AsyncSessionLocal
+from app.db.models import CaloriePlan, DailyNutrition, Meal
+
+
+async def rebuild_daily_nutrition(user_id: Optional[int] = None) -> int:
+    """
+    Полная пересборка агрегата из meals (бэкфилл / починка после
+    массовых операций в обход ORM).
+
+    user_id=None — для всех пользователей.
+    Возвращает количество записанных строк daily_nutrition.
+    """
+    table = DailyNutrition.__table__
+    local_day = sa.func.date(sa.func.timezone(settings.report_timezone, Meal.eaten_at))
+
+    source = select(
+        Meal.user_id,
+        local_day.label("date"),
+        sa.func.coalesce(sa.func.sum(Meal.calories), 0),
+        sa.func.coalesce(sa.func.sum(Meal.proteins), 0),
+        sa.func.coalesce(sa.func.sum(Meal.fats), 0),
+        sa.func.coalesce(sa.func.sum(Meal.carbs), 0),
+        sa.func.count(Meal.id),
+    ).group_by(Meal.user_id, local_day)
+
+    wipe = sa.delete(table)
+    if user_id is not None:
+        source = source.where(Meal.user_id == user_id)
+        wipe = wipe.where(table.c.user_id == user_id)
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(wipe)
+        result = await session.execute(
+            sa.insert(table).from_select(
+                ["user_id", "date", "calories", "proteins", "fats", "carbs", "meals_count"],
+                source,
+            )
+        )
+        if user_id is not None:
+            affected = [user_id]
+        else:
+            res = await session.execute(select(table.c.user_id).distinct())
+            affected = list(res.scalars().all())
+
+        await session.commit()
+
+    for uid in affected:
+        rollups.bump_meals_version(uid)
+
+    return result.rowcount or 0
+
+
+# =====================================================
+#                   ПЛАН ПО КАЛОРИЯМ
+# =====================================================
+
+async def get_calorie_target(user_id: int) -> Optional[int]:
+    """
+    Текущий дневной план по калориям или None, если план не задан.
+    """
+    async with AsyncSessionLocal() as session:
+        stmt = select(CaloriePlan.daily_target).where(CaloriePlan.user_id == user_id)
+        res = await session.execute(stmt)
+        return res.scalar_one_or_none()
+
+
+async def set_calorie_target(user_id: int, daily_target: int) -> None:
+    """
+    Сохранить дневной план (одна строка на пользователя).
+    daily_target=0 — сбросить план.
+    """
+    async with AsyncSessionLocal() as session:
+        stmt = select(CaloriePlan).where(CaloriePlan.user_id == user_id)
+        res = await session.execute(stmt)
+        plan = res.scalar_one_or_none()
+
+        if daily_target <= 0:
+            if plan is not None:
+                await session.delete(plan)
+        elif plan is None:
+            session.add(CaloriePlan(user_id=user_id, daily_target=daily_target))
+        else:
+            plan.daily_target = daily_target
+
+        await session.commit()
+
+    # План участвует в отчётах — сбрасываем их кэш
+    rollups.bump_meals_version(user_id)
@@ -0,0 +1,236 @@
+# app/services/photo_hash.py
+"""
+Повторно присланные фото (пересохранённое, пересжатое, другого размера).
+
+У такого фото другой file_unique_id, но почти тот же перцептивный хэш:
+dHash — 64 бита «соседний пиксель ярче/темнее» на уменьшенной до 9×8
+градации серого копии. Воркер анализа (app/bot/analysis_worker.py) считает
+хэш сразу после скачивания фото и, если у пользователя за
+PHOTO_DUPLICATE_WINDOW_DAYS есть ответ на фото с расстоянием Хэмминга
+не больше PHOTO_DUPLICATE_MAX_DISTANCE (тот же тип анализа, тот же
+комментарий, та же версия промпта), отдаёт его вместо вызова GPT — лимит
+за такой ответ не списывается.
+
+Поиск — multi-index hashing: хэш делится на 4 полосы по 16 бит; если хэши
+отличаются не больше чем на d бит, хотя бы одна полоса отличается не больше
+чем на d // 4 бит. Кандидаты — строки, у которых какая-то полоса входит
+в окрестность полосы запроса (индексы (user_id, bandN)); точное расстояние
+считается уже по ним. Скорость на 1M хэшей — benchmarks/bench_photo_hash.py.
+
+Декодирование JPEG — CPU, поэтому хэш считается в пуле потоков:
+Pillow отпускает GIL при декодировании, а draft() декодирует сразу
+в уменьшенном масштабе.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import sqlalchemy as sa
+from PIL import Image
+
+from app.config_limits import (
+    PHOTO_DUPLICATE_MAX_DISTANCE,
+    PHOTO_DUPLICATE_WINDOW_DAYS,
+    PHOTO_HASH_MAX_BYTES,
+    PHOTO_HASH_WORKERS,
+)
+from app.db.base import AsyncSessionLocal
+from app.db.models import AnalysisJob, PhotoHash
+from app.prompts.registry import get_prompt
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+_BAND_MASK = (1 << BAND_BITS) - 1
+
+PHOTO_DUPLICATE_LOOKUPS = metrics.counter(
+    "dishvision_photo_duplicate_lookups_total",
+    "Поиск повтора фото перед GPT по результату (hit / miss / skipped)",
+    ("result",),
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PHOTO_HASH_WORKERS, thread_name_prefix="photo-hash")
+    return _executor
+
+
+def dhash(image_bytes: bytes) -> int:
+    """
+    64-битный dHash изображения. Бросает исключение Pillow, если это не картинка.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        # JPEG декодируется сразу в масштабе 1/2…1/8 — в разы быстрее полного
+        image.draft("L", (64, 64))
+        small = image.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def split_bands(value: int) -> tuple[int, ...]:
+    """
+    Полосы хэша, старшая первой.
+    """
+    return tuple((value >> (BAND_BITS * (BANDS - 1 - i))) & _BAND_MASK for i in range(BANDS))
+
+
+def band_neighbours(band: int, radius: int) -> list[int]:
+    """
+    Все значения полосы на расстоянии Хэмминга не больше radius (включая саму полосу).
+    """
+    result = [band]
+    for r in range(1, radius + 1):
+        for bits in itertools.combinations(range(BAND_BITS), r):
+            flipped = band
+            for bit in bits:
+                flipped ^= 1 << bit
+            result.append(flipped)
+    return result
+
+
+def to_signed(value: int) -> int:
+    """
+    Беззнаковые 64 бита → знаковый BIGINT.
+    """
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value & ((1 << HASH_BITS) - 1)
+
+
+async def compute_hash(image_bytes: bytes) -> Optional[int]:
+    """
+    dHash фото в пуле потоков. None — файл слишком большой или не картинка.
+    """
+    if len(image_bytes) > PHOTO_HASH_MAX_BYTES:
+        PHOTO_DUPLICATE_LOOKUPS.inc("skipped")
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_executor(), dhash, image_bytes)
+    except Exception as e:
+        logger.warning("Не удалось посчитать хэш фото (%s байт): %s", len(image_bytes), e)
+        PHOTO_DUPLICATE_LOOKUPS.inc("skipped")
+        return None
+
+
+def _candidates_query(
+    user_id: int,
+    value: int,
+    max_distance: int,
+    since: Optional[datetime],
+    job_filter: Optional[sa.ColumnElement[bool]],
+) -> sa.CompoundSelect:
+    """
+    По запросу на полосу (UNION ALL): каждый идёт по своему индексу (user_id, bandN),
+    OR по четырём колонкам планировщик мог бы свести к полному просмотру.
+    """
+    radius = max_distance // BANDS
+    columns = (PhotoHash.band0, PhotoHash.band1, PhotoHash.band2, PhotoHash.band3)
+    parts = []
+    for column, band in zip(columns, split_bands(value)):
+        part = sa.select(PhotoHash.job_id, PhotoHash.photo_hash).where(
+            PhotoHash.user_id == user_id,
+            column.in_(band_neighbours(band, radius)),
+        )
+        if since is not None:
+            part = part.where(PhotoHash.created_at >= since)
+        if job_filter is not None:
+            part = part.join(AnalysisJob, AnalysisJob.id == PhotoHash.job_id).where(job_filter)
+        parts.append(part)
+    return sa.union_all(*parts)
+
+
+async def find_nearest(
+    user_id: int,
+    value: int,
+    max_distance: int = PHOTO_DUPLICATE_MAX_DISTANCE,
+    since: Optional[datetime] = None,
+    job_filter: Optional[sa.ColumnElement[bool]] = None,
+) -> Optional[tuple[int, int]]:
+    """
+    Ближайший хэш пользователя: (job_id, расстояние) или None.
+    job_filter — дополнительное условие на AnalysisJob (тип анализа, комментарий).
+    """
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(_candidates_query(user_id, value, max_distance, since, job_filter))).all()
+
+    best: Optional[tuple[int, int]] = None
+    for job_id, stored in rows:
+        distance = hamming(value, to_unsigned(stored))
+        # при равенстве — более свежий ответ
+        if distance <= max_distance and (best is None or (distance, -job_id) < (best[1], -best[0])):
+            best = (job_id, distance)
+    return best
+
+
+async def find_duplicate(job: AnalysisJob, value: int) -> Optional[tuple[int, str]]:
+    """
+    Ответ на то же фото с тем же запросом: (id задачи-источника, её ответ) или None.
+    """
+    job_filter = sa.and_(
+        AnalysisJob.id != job.id,
+        AnalysisJob.analysis_type == job.analysis_type,
+        AnalysisJob.strip_questions == job.strip_questions,
+        sa.func.coalesce(AnalysisJob.comment, "") == (job.comment or ""),
+        # ответы прошлых версий промпта не переиспользуем
+        AnalysisJob.prompt_version == get_prompt(job.analysis_type).tag,
+        AnalysisJob.result.is_not(None),
+    )
+    since = datetime.now(timezone.utc) - timedelta(days=PHOTO_DUPLICATE_WINDOW_DAYS)
+    nearest = await find_nearest(job.user_id, value, since=since, job_filter=job_filter)
+    if nearest is None:
+        PHOTO_DUPLICATE_LOOKUPS.inc("miss")
+        return None
+
+    source_id, distance = nearest
+    async with AsyncSessionLocal() as session:
+        result = await session.scalar(sa.select(AnalysisJob.result).where(AnalysisJob.id == source_id))
+    if result is None:
+        PHOTO_DUPLICATE_LOOKUPS.inc("miss")
+        return None
+
+    PHOTO_DUPLICATE_LOOKUPS.inc("hit")
+    logger.info("Задача анализа %s: повтор фото из задачи %s (расстояние %s)", job.id, source_id, distance)
+    return source_id, result
+
+
+async def record_hash(job: AnalysisJob, value: int) -> None:
+    """
+    Запомнить хэш фото, на которое получен ответ GPT.
+    """
+    async with AsyncSessionLocal() as session:
+        session.add(
+            PhotoHash(
+                user_id=job.user_id,
+                job_id=job.id,
+                photo_hash=to_signed(value),
+                **{f"band{i}": band for i, band in enumerate(split_bands(value))},
+            )
+        )
+        await session.commit()
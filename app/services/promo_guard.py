@@ -0,0 +1,243 @@
+# app/services/promo_guard.py
+"""
+Антифлуд по промокодам (docs/06_abuse_protection.md, п. 6.5).
+
+- Неверные попытки считаются в памяти: на пользователя — очередь моментов
+  последних PROMO_MAX_ATTEMPTS_BEFORE_BAN промахов (скользящее окно
+  PROMO_ATTEMPTS_WINDOW_MINUTES), всего не больше PROMO_ATTEMPTS_MAX_USERS
+  пользователей (LRU). Удачная активация сбрасывает серию.
+- Полная серия — бан в promo_bans: 30 минут, сутки, неделя по числу банов
+  пользователя за PROMO_BANS_RETENTION_DAYS (старые удаляет фоновая задача).
+- Действующие баны держатся в памяти (загружаются одним запросом при первом
+  обращении, новые пишутся сразу и в БД, и в кэш): забаненный пользователь
+  получает отказ без запросов к БД.
+- Фильтр Блума по действующим кодам: «может быть» — обычная проверка
+  в _apply_promo_code, «точно нет» — неверный код засчитывается после одного
+  запроса max(promo_codes.id): если с момента сборки фильтра появились коды
+  (их мог сгенерировать админ в другом шарде), фильтр сначала пересобирается.
+
+Апдейты одного пользователя при нескольких процессах идут в один шард
+(app/runner), поэтому счётчики и баны в памяти шарда согласованы с БД.
+Фильтр пересобирается в каждом процессе раз в минуту
+(JOB_REFRESH_PROMO_FILTER_CRON), при промахе по более новым кодам и сразу
+пополняется кодами, сгенерированными в этом процессе.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+import sqlalchemy as sa
+
+from app.config_limits import (
+    PROMO_ATTEMPTS_MAX_USERS,
+    PROMO_ATTEMPTS_WINDOW_MINUTES,
+    PROMO_BAN_MINUTES_FIRST,
+    PROMO_BAN_MINUTES_SECOND,
+    PROMO_BAN_MINUTES_THIRD,
+    PROMO_BLOOM_FALSE_POSITIVE_RATE,
+    PROMO_MAX_ATTEMPTS_BEFORE_BAN,
+)
+from app.db.base import AsyncSessionLocal
+from app.db.models import PromoBan, PromoCode
+from app.services import metrics
+from app.services.user_service import to_utc
+
+logger = logging.getLogger(__name__)
+
+PROMO_ATTEMPTS = metrics.counter(
+    "dishvision_promo_attempts_total",
+    "Попытки ввода промокода по результату (ok / invalid / filtered / banned)",
+    ("result",),
+)
+
+_BAN_MINUTES = (PROMO_BAN_MINUTES_FIRST, PROMO_BAN_MINUTES_SECOND, PROMO_BAN_MINUTES_THIRD)
+
+
+class BloomFilter:
+    """
+    Битовый массив m бит и k хэш-функций (двойное хэширование по blake2b):
+    ложных «нет» не бывает, ложных «да» — около false_positive_rate.
+    """
+
+    def __init__(self, items: Iterable[str], false_positive_rate: float) -> None:
+        items = list(items)
+        n = max(len(items), 1)
+        self.size = max(int(-n * math.log(false_positive_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / n * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = len(items)
+        for item in items:
+            self.add(item)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+# user_id -> моменты последних промахов (time.monotonic), LRU по последней попытке
+_attempts: "OrderedDict[int, deque[float]]" = OrderedDict()
+
+# user_id -> конец действующего бана; None — баны ещё не загружены
+_bans: Optional[dict[int, datetime]] = None
+
+_codes: Optional[BloomFilter] = None
+# Самый новый promo_codes.id на момент сборки фильтра
+_codes_max_id: int = 0
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ===== Баны =====
+
+async def _load_bans() -> dict[int, datetime]:
+    global _bans
+    if _bans is None:
+        async with AsyncSessionLocal() as session:
+            rows = await session.execute(
+                sa.select(PromoBan.user_id, sa.func.max(PromoBan.banned_until))
+                .where(PromoBan.banned_until > _utcnow())
+                .group_by(PromoBan.user_id)
+            )
+            _bans = {user_id: to_utc(until) for user_id, until in rows}
+    return _bans
+
+
+async def banned_until(user_id: int) -> Optional[datetime]:
+    """
+    Конец действующего бана пользователя или None. После первой загрузки — без запросов к БД.
+    """
+    bans = await _load_bans()
+    until = bans.get(user_id)
+    if until is None:
+        return None
+    if until <= _utcnow():
+        del bans[user_id]
+        return None
+    PROMO_ATTEMPTS.inc("banned")
+    return until
+
+
+async def _ban(user_id: int) -> datetime:
+    """
+    Записать бан следующей ступени (по числу прошлых банов) в БД и в кэш.
+    """
+    async with AsyncSessionLocal() as session:
+        previous = await session.scalar(
+            sa.select(sa.func.count()).select_from(PromoBan).where(PromoBan.user_id == user_id)
+        )
+        minutes = _BAN_MINUTES[min(previous or 0, len(_BAN_MINUTES) - 1)]
+        until = _utcnow() + timedelta(minutes=minutes)
+        session.add(
+            PromoBan(
+                user_id=user_id,
+                banned_until=until,
+                reason=f"{PROMO_MAX_ATTEMPTS_BEFORE_BAN} неверных промокодов подряд",
+            )
+        )
+        await session.commit()
+
+    (await _load_bans())[user_id] = until
+    logger.warning("Промокоды: пользователь %s забанен на %s мин", user_id, minutes)
+    return until
+
+
+# ===== Попытки =====
+
+async def register_failure(user_id: int, filtered: bool = False) -> Optional[datetime]:
+    """
+    Учесть неверную попытку (filtered — отсеяна фильтром Блума, без БД).
+    Если серия набрана — бан; возвращает его конец.
+    """
+    PROMO_ATTEMPTS.inc("filtered" if filtered else "invalid")
+    now = time.monotonic()
+    window = PROMO_ATTEMPTS_WINDOW_MINUTES * 60
+
+    failures = _attempts.pop(user_id, None)
+    if failures is None:
+        failures = deque(maxlen=PROMO_MAX_ATTEMPTS_BEFORE_BAN)
+    while failures and now - failures[0] > window:
+        failures.popleft()
+    failures.append(now)
+
+    if len(failures) >= PROMO_MAX_ATTEMPTS_BEFORE_BAN:
+        return await _ban(user_id)
+
+    _attempts[user_id] = failures
+    if len(_attempts) > PROMO_ATTEMPTS_MAX_USERS:
+        _attempts.popitem(last=False)
+    return None
+
+
+def register_success(user_id: int) -> None:
+    PROMO_ATTEMPTS.inc("ok")
+    _attempts.pop(user_id, None)
+
+
+# ===== Фильтр Блума по кодам =====
+
+async def refresh_code_filter() -> int:
+    """
+    Пересобрать фильтр по кодам, которые ещё можно активировать. Возвращает их число.
+    """
+    global _codes, _codes_max_id
+    now = _utcnow()
+    async with AsyncSessionLocal() as session:
+        # max(id) — до выборки: код, добавленный между запросами, вызовет ещё одну пересборку
+        max_id = await session.scalar(sa.select(sa.func.max(PromoCode.id)))
+        codes = (
+            await session.scalars(
+                sa.select(PromoCode.code).where(
+                    PromoCode.activations < PromoCode.max_activations,
+                    sa.or_(PromoCode.expires_at.is_(None), PromoCode.expires_at > now),
+                )
+            )
+        ).all()
+    _codes = BloomFilter(codes, PROMO_BLOOM_FALSE_POSITIVE_RATE)
+    _codes_max_id = max_id or 0
+    return len(codes)
+
+
+def add_codes(codes: Iterable[str]) -> None:
+    """
+    Новые коды этого процесса — в фильтр сразу, не дожидаясь пересборки.
+    """
+    if _codes is not None:
+        for code in codes:
+            _codes.add(code)
+
+
+async def might_exist(code: str) -> bool:
+    """
+    False — такого действующего кода точно нет. «Может быть» — без запросов
+    к БД; «нет» — после сверки с max(promo_codes.id), чтобы код, только что
+    сгенерированный в другом процессе, не засчитался пользователю как промах.
+    """
+    if _codes is None:
+        await refresh_code_filter()
+    if code in _codes:
+        return True
+
+    async with AsyncSessionLocal() as session:
+        newest = await session.scalar(sa.select(sa.func.max(PromoCode.id)))
+    if (newest or 0) > _codes_max_id:
+        await refresh_code_filter()
+        return code in _codes
+    return False
@@ -9,6 +9,7 @@ from sqlalchemy import select
 
 from app.db.base import AsyncSessionLocal
 from app.db import models
+from app.services import promo_guard, stats_service
 
 
 def _now_utc() -> datetime:
@@ -52,6 +53,7 @@ async def generate_promo_codes(
 
         await session.commit()
 
+    promo_guard.add_codes(codes)
     return codes
 
 
@@ -174,6 +176,7 @@ async def redeem_promo_code(
             promo.activations = current_activations + 1
 
             await session.commit()
+            stats_service.incr(stats_service.PROMO_ACTIVATIONS)
             return True, "ok", promo.days
 
         except Exception:
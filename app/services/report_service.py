@@ -0,0 +1,273 @@
+# app/services/report_service.py
+"""
+Отчёты по питанию за день / неделю / месяц.
+
+Каждый отчёт — ОДИН агрегирующий SQL-запрос:
+  - день: приёмы пищи из meals (индекс (user_id, eaten_at)) + итоги оконными функциями;
+  - неделя/месяц: строки агрегата daily_nutrition (не более 31) + итоги.
+План по калориям подтягивается в тот же запрос через LEFT JOIN, поэтому
+отчёт строится даже при пустом периоде.
+
+Границы суток считаются в settings.report_timezone.
+Готовые отчёты кэшируются в процессе и сбрасываются при изменении meals
+(см. app.db.rollups.meals_version).
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Literal, Optional
+
+import sqlalchemy as sa
+from sqlalchemy import select
+
+from app.config_limits import REPORT_CACHE_MAX_ENTRIES
+from app.db import rollups
+from app.db.base import AsyncSessionLocal
+from app.db.models import CaloriePlan, DailyNutrition, Meal
+
+ReportPeriod = Literal["day", "week", "month"]
+
+# Длина периода в днях (включая сегодняшний)
+PERIOD_DAYS: dict[str, int] = {
+    "day": 1,
+    "week": 7,
+    "month": 30,
+}
+
+
+@dataclass(frozen=True)
+class ReportItem:
+    """
+    Строка разбивки: приём пищи (отчёт за день) или день (неделя/месяц).
+    """
+    label: str
+    calories: int
+    proteins: float
+    fats: float
+    carbs: float
+    meals_count: int = 1
+    day: Optional[date] = None
+
+
+@dataclass(frozen=True)
+class Report:
+    period: str
+    start: date
+    end: date
+    calories: int
+    proteins: float
+    fats: float
+    carbs: float
+    meals_count: int
+    daily_target: Optional[int]
+    items: tuple[ReportItem, ...]
+
+    @property
+    def days(self) -> int:
+        return (self.end - self.start).days + 1
+
+    @property
+    def target_total(self) -> Optional[int]:
+        """
+        План на весь период (daily_target * число дней) или None.
+        """
+        if not self.daily_target:
+            return None
+        return self.daily_target * self.days
+
+    @property
+    def deviation(self) -> Optional[int]:
+        """
+        Отклонение от плана в ккал: >0 — перебор, <0 — недобор.
+        """
+        target_total = self.target_total
+        if target_total is None:
+            return None
+        return self.calories - target_total
+
+
+# (user_id, period) -> (meals_version, today, Report)
+_cache: "OrderedDict[tuple[int, str], tuple[int, date, Report]]" = OrderedDict()
+
+
+def local_today() -> date:
+    return datetime.now(rollups.REPORT_TZ).date()
+
+
+def period_bounds(period: str, today: date) -> tuple[date, date]:
+    """
+    Локальные даты [start, end] периода, заканчивающегося сегодня.
+    """
+    days = PERIOD_DAYS[period]
+    return today - timedelta(days=days - 1), today
+
+
+def _utc_range(start: date, end: date) -> tuple[datetime, datetime]:
+    """
+    Полуинтервал [start 00:00, end+1 00:00) в локальной таймзоне → UTC.
+    """
+    tz = rollups.REPORT_TZ
+    start_dt = datetime.combine(start, time.min, tzinfo=tz)
+    end_dt = datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz)
+    return start_dt.astimezone(timezone.utc), end_dt.astimezone(timezone.utc)
+
+
+def _target_subquery(user_id: int):
+    """
+    Однострочный подзапрос с текущим планом — "якорь" для LEFT JOIN.
+    """
+    target = (
+        select(CaloriePlan.daily_target)
+        .where(CaloriePlan.user_id == user_id)
+        .order_by(CaloriePlan.updated_at.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return select(target.label("daily_target")).subquery("plan")
+
+
+def _day_query(user_id: int, start: date, end: date):
+    start_utc, end_utc = _utc_range(start, end)
+    plan = _target_subquery(user_id)
+
+    return (
+        select(
+            plan.c.daily_target,
+            Meal.title.label("label"),
+            sa.func.coalesce(Meal.calories, 0).label("calories"),
+            sa.func.coalesce(Meal.proteins, 0).label("proteins"),
+            sa.func.coalesce(Meal.fats, 0).label("fats"),
+            sa.func.coalesce(Meal.carbs, 0).label("carbs"),
+            sa.literal(1).label("meals_count"),
+            sa.func.coalesce(sa.func.sum(Meal.calories).over(), 0).label("total_calories"),
+            sa.func.coalesce(sa.func.sum(Meal.proteins).over(), 0).label("total_proteins"),
+            sa.func.coalesce(sa.func.sum(Meal.fats).over(), 0).label("total_fats"),
+            sa.func.coalesce(sa.func.sum(Meal.carbs).over(), 0).label("total_carbs"),
+            sa.func.count(Meal.id).over().label("total_meals"),
+        )
+        .select_from(
+            plan.outerjoin(
+                Meal,
+                sa.and_(
+                    Meal.user_id == user_id,
+                    Meal.eaten_at >= start_utc,
+                    Meal.eaten_at < end_utc,
+                ),
+            )
+        )
+        .order_by(Meal.eaten_at)
+    )
+
+
+def _period_query(user_id: int, start: date, end: date):
+    plan = _target_subquery(user_id)
+    dn = DailyNutrition
+
+    return (
+        select(
+            plan.c.daily_target,
+            dn.date.label("label"),
+            sa.func.coalesce(dn.calories, 0).label("calories"),
+            sa.func.coalesce(dn.proteins, 0).label("proteins"),
+            sa.func.coalesce(dn.fats, 0).label("fats"),
+            sa.func.coalesce(dn.carbs, 0).label("carbs"),
+            sa.func.coalesce(dn.meals_count, 0).label("meals_count"),
+            sa.func.coalesce(sa.func.sum(dn.calories).over(), 0).label("total_calories"),
+            sa.func.coalesce(sa.func.sum(dn.proteins).over(), 0).label("total_proteins"),
+            sa.func.coalesce(sa.func.sum(dn.fats).over(), 0).label("total_fats"),
+            sa.func.coalesce(sa.func.sum(dn.carbs).over(), 0).label("total_carbs"),
+            sa.func.coalesce(sa.func.sum(dn.meals_count).over(), 0).label("total_meals"),
+        )
+        .select_from(
+            plan.outerjoin(
+                dn,
+                sa.and_(
+                    dn.user_id == user_id,
+                    dn.date >= start,
+                    dn.date <= end,
+                ),
+            )
+        )
+        .order_by(dn.date)
+    )
+
+
+def _to_item(row) -> ReportItem:
+    day = row.label if isinstance(row.label, date) else None
+    return ReportItem(
+        label=day.strftime("%d.%m") if day else str(row.label),
+        calories=int(row.calories),
+        proteins=float(row.proteins),
+        fats=float(row.fats),
+        carbs=float(row.carbs),
+        meals_count=int(row.meals_count),
+        day=day,
+    )
+
+
+async def build_report(
+    user_id: int,
+    period: ReportPeriod,
+    today: Optional[date] = None,
+) -> Report:
+    """
+    Построить отчёт без кэша (один запрос к БД).
+    """
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"Unknown report period: {period}")
+
+    today = today or local_today()
+    start, end = period_bounds(period, today)
+
+    if period == "day":
+        stmt = _day_query(user_id, start, end)
+    else:
+        stmt = _period_query(user_id, start, end)
+
+    async with AsyncSessionLocal() as session:
+        res = await session.execute(stmt)
+        rows = res.all()
+
+    # LEFT JOIN гарантирует хотя бы одну строку (с планом)
+    first = rows[0]
+    items = tuple(_to_item(row) for row in rows if row.label is not None)
+
+    return Report(
+        period=period,
+        start=start,
+        end=end,
+        calories=int(first.total_calories),
+        proteins=float(first.total_proteins),
+        fats=float(first.total_fats),
+        carbs=float(first.total_carbs),
+        meals_count=int(first.total_meals),
+        daily_target=first.daily_target,
+        items=items,
+    )
+
+
+async def get_report(user_id: int, period: ReportPeriod) -> Report:
+    """
+    Отчёт с кэшем: пересчитываем только если изменились meals / план
+    пользователя или наступили новые сутки.
+    """
+    key = (user_id, period)
+    version = rollups.meals_version(user_id)
+    today = local_today()
+
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == version and cached[1] == today:
+        _cache.move_to_end(key)
+        return cached[2]
+
+    report = await build_report(user_id, period, today=today)
+
+    _cache[key] = (version, today, report)
+    _cache.move_to_end(key)
+    while len(_cache) > REPORT_CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+
+    return report
@@ -0,0 +1,320 @@
+# app/services/scheduler.py
+"""
+Планировщик фоновых задач внутри процесса бота.
+
+  - расписание в формате cron (CronSchedule, время UTC) + случайный jitter;
+  - задачи с leader_only=True выполняет только один процесс — тот, кто
+    держит advisory lock Postgres (SCHEDULER_LEADER_LOCK_KEY) на отдельном
+    соединении. Если лидер умер, соединение закрывается, блокировка
+    освобождается, и её забирает следующий процесс при очередной проверке;
+  - задачи без leader_only (например, чистка FSM в памяти) выполняются
+    в каждом процессе;
+  - задача — корутина без аргументов, возвращающая число затронутых строк;
+    длительность и строки пишутся в лог, метрики и last_runs.
+
+Задачи выполняются по очереди в одной asyncio-задаче: они пакетные и
+короткие, а последовательный запуск не создаёт лишней конкуренции за БД.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.config_limits import (
+    JOB_JITTER_SECONDS,
+    SCHEDULER_LEADER_CHECK_SECONDS,
+    SCHEDULER_LEADER_LOCK_KEY,
+)
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_DURATION = metrics.histogram(
+    "dishvision_job_duration_seconds",
+    "Длительность фоновой задачи",
+    ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+JOB_ROWS = metrics.counter(
+    "dishvision_job_rows_total",
+    "Строк (записей), затронутых фоновой задачей",
+    ("job",),
+)
+JOB_FAILURES = metrics.counter(
+    "dishvision_job_failures_total",
+    "Фоновые задачи, завершившиеся ошибкой",
+    ("job",),
+)
+SCHEDULER_LEADER = metrics.gauge(
+    "dishvision_scheduler_leader",
+    "1 — этот процесс выполняет задачи leader_only",
+)
+
+
+# ===== Расписание =====
+
+_CRON_RANGES = (
+    (0, 59),  # минута
+    (0, 23),  # час
+    (1, 31),  # день месяца
+    (1, 12),  # месяц
+    (0, 6),   # день недели, 0 — воскресенье (7 тоже воскресенье)
+)
+
+
+def _parse_cron_field(value: str, low: int, high: int) -> frozenset[int]:
+    # для дня недели допускаем 7 (воскресенье) и сворачиваем его в 0
+    is_weekday = (low, high) == (0, 6)
+    upper = 7 if is_weekday else high
+    result: set[int] = set()
+    for part in value.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if step < 1 or not (low <= start <= end <= upper):
+            raise ValueError(f"Некорректное поле cron: {value!r}")
+        result.update(range(start, end + 1, step))
+    if is_weekday:
+        return frozenset(v % 7 for v in result)
+    return frozenset(result)
+
+
+class CronSchedule:
+    """
+    Классический cron из 5 полей: "*/5 * * * *", "30 3 * * *", "0 9 * * 1-5".
+    Поддерживаются *, списки через запятую, диапазоны a-b и шаг /n.
+    Если заданы и день месяца, и день недели — достаточно совпадения любого (как в cron).
+    """
+
+    def __init__(self, expression: str) -> None:
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Ожидается 5 полей cron: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_cron_field(value, low, high)
+            for value, (low, high) in zip(fields, _CRON_RANGES)
+        )
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.isoweekday() % 7) in self.weekdays
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, after: datetime) -> datetime:
+        """
+        Ближайший момент срабатывания строго после `after` (UTC, aware).
+        """
+        dt = after.astimezone(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+                dt = dt.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+        raise ValueError(f"Расписание {self.expression!r} никогда не срабатывает")
+
+
+# ===== Лидер =====
+
+class LeaderLock:
+    """
+    Сессионный advisory lock Postgres на выделенном соединении (AUTOCOMMIT,
+    чтобы не держать открытую транзакцию). Не на Postgres (advisory lock'ов
+    нет) — процесс считается единственным и всегда лидер.
+    """
+
+    def __init__(self, engine: AsyncEngine, key: int = SCHEDULER_LEADER_LOCK_KEY) -> None:
+        self.engine = engine
+        self.key = key
+        self._conn: Optional[AsyncConnection] = None
+
+    @property
+    def supported(self) -> bool:
+        return self.engine.dialect.name == "postgresql"
+
+    async def ensure(self) -> bool:
+        """
+        True, если этот процесс — лидер (проверяет живость соединения
+        или пытается взять блокировку).
+        """
+        if not self.supported:
+            return True
+
+        if self._conn is not None:
+            try:
+                await self._conn.execute(text("SELECT 1"))
+                return True
+            except Exception as e:
+                logger.warning("Соединение лидера планировщика потеряно: %s", e)
+                await self._close()
+
+        conn: Optional[AsyncConnection] = None
+        try:
+            conn = await self.engine.connect()
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = await conn.scalar(select(func.pg_try_advisory_lock(self.key)))
+        except Exception as e:
+            logger.warning("Не удалось проверить блокировку лидера: %s", e)
+            acquired = False
+
+        if acquired:
+            self._conn = conn
+            logger.info("Процесс стал лидером планировщика")
+            return True
+        if conn is not None:
+            with contextlib.suppress(Exception):
+                await conn.close()
+        return False
+
+    async def _close(self) -> None:
+        if self._conn is not None:
+            with contextlib.suppress(Exception):
+                await self._conn.close()
+            self._conn = None
+
+    async def release(self) -> None:
+        if self._conn is not None:
+            with contextlib.suppress(Exception):
+                await self._conn.execute(select(func.pg_advisory_unlock(self.key)))
+            await self._close()
+
+
+# ===== Задачи =====
+
+JobFunc = Callable[[], Awaitable[int]]
+
+
+@dataclass
+class JobRun:
+    started_at: datetime
+    duration_seconds: float
+    rows: int
+    error: Optional[str] = None
+
+
+@dataclass
+class Job:
+    name: str
+    schedule: CronSchedule
+    func: JobFunc
+    leader_only: bool = True
+    jitter_seconds: float = JOB_JITTER_SECONDS
+    next_run: Optional[datetime] = field(default=None, repr=False)
+
+    def plan_next(self, now: datetime) -> None:
+        jitter = timedelta(seconds=random.uniform(0, self.jitter_seconds))
+        self.next_run = self.schedule.next_after(now) + jitter
+
+
+class Scheduler:
+    def __init__(self, leader: LeaderLock) -> None:
+        self.leader = leader
+        self.jobs: list[Job] = []
+        self.last_runs: dict[str, JobRun] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def add(
+        self,
+        name: str,
+        cron: str,
+        func: JobFunc,
+        leader_only: bool = True,
+        jitter_seconds: float = JOB_JITTER_SECONDS,
+    ) -> None:
+        self.jobs.append(
+            Job(name, CronSchedule(cron), func, leader_only=leader_only, jitter_seconds=jitter_seconds)
+        )
+
+    async def run_job(self, job: Job) -> JobRun:
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        rows, error = 0, None
+        try:
+            rows = await job.func()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            JOB_FAILURES.inc(job.name)
+            logger.exception("Фоновая задача %s упала: %s", job.name, e)
+        duration = time.perf_counter() - started
+
+        JOB_DURATION.observe(duration, job.name)
+        JOB_ROWS.inc(job.name, value=rows)
+        if error is None:
+            logger.info("Фоновая задача %s: %s строк за %.2f с", job.name, rows, duration)
+
+        run = JobRun(started_at=started_at, duration_seconds=duration, rows=rows, error=error)
+        self.last_runs[job.name] = run
+        return run
+
+    async def _loop(self) -> None:
+        now = datetime.now(timezone.utc)
+        for job in self.jobs:
+            job.plan_next(now)
+        needs_leader = any(job.leader_only for job in self.jobs)
+
+        while True:
+            is_leader = await self.leader.ensure() if needs_leader else False
+            SCHEDULER_LEADER.set(1 if is_leader else 0)
+
+            now = datetime.now(timezone.utc)
+            for job in sorted(self.jobs, key=lambda j: j.next_run):
+                if job.next_run > now:
+                    continue
+                if not job.leader_only or is_leader:
+                    await self.run_job(job)
+                job.plan_next(datetime.now(timezone.utc))
+
+            next_run = min(job.next_run for job in self.jobs)
+            sleep = (next_run - datetime.now(timezone.utc)).total_seconds()
+            if needs_leader:
+                sleep = min(sleep, SCHEDULER_LEADER_CHECK_SECONDS)
+            await asyncio.sleep(max(sleep, 0.0))
+
+    def start(self) -> None:
+        if self.jobs and self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="scheduler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.leader.release()
+        SCHEDULER_LEADER.set(0)
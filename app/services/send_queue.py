@@ -0,0 +1,380 @@
+# app/services/send_queue.py
+"""
+Очередь исходящих сообщений Bot API с ограничением скорости.
+
+Telegram режет ботов по ~30 сообщениям/с в целом и ~1 сообщению/с в один
+чат (20/мин в группу); при превышении — 429 с retry_after. Хендлеры
+по-прежнему вызывают message.answer(...): запрос перехватывает
+OutboundRateLimiter (app/bot/middlewares/send_queue.py) и ставит сюда.
+
+  - token bucket на весь бот, отдельный — на рассылки, и по одному на чат;
+  - два приоритета: ответы пользователям (INTERACTIVE) всегда раньше
+    рассылок (BULK, см. bulk_sends());
+  - на 429 чат ставится на паузу на retry_after, запрос — обратно в голову
+    очереди чата (не больше SEND_MAX_RETRIES раз);
+  - подряд стоящие в очереди тексты в один чат склеиваются в одно
+    сообщение (клавиатура — только у последнего), если влезают в лимит.
+    Каждый из вызывающих получает итоговое Message.
+
+Ожидание в очереди видно в метриках dishvision_send_queue_*.
+
+Очередь живёт в памяти процесса. Когда в Bot API шлют несколько процессов
+(шарды app.runner, отдельные app.cli.analysis_worker), общий и рассылочный
+лимиты делятся между ними поровну — set_processes(settings.send_processes
+или число шардов). Лимиты на чат так не делятся: ответ из шарда и результат
+анализа из другого процесса в один чат считаются порознь, от превышения
+спасает только пауза по 429 (retry_after).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage, TelegramMethod
+
+from app.config_limits import (
+    SEND_BULK_RATE,
+    SEND_CHAT_BURST,
+    SEND_CHAT_RATE,
+    SEND_GLOBAL_BURST,
+    SEND_GLOBAL_RATE,
+    SEND_GROUP_BURST,
+    SEND_GROUP_RATE,
+    SEND_MAX_RETRIES,
+    SEND_MERGE_MAX_CHARS,
+)
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+_priority: ContextVar[int] = ContextVar("send_priority", default=INTERACTIVE)
+
+# Поля, которые должны совпадать, чтобы тексты можно было склеить
+_MERGE_KEY_FIELDS = (
+    "chat_id",
+    "business_connection_id",
+    "message_thread_id",
+    "parse_mode",
+    "link_preview_options",
+    "disable_notification",
+    "protect_content",
+    "message_effect_id",
+    "disable_web_page_preview",
+)
+
+
+@contextlib.contextmanager
+def bulk_sends() -> Iterator[None]:
+    """
+    Отправки внутри блока (и в порождённых им задачах) идут с приоритетом
+    рассылки: после ответов пользователям и не быстрее SEND_BULK_RATE.
+    """
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+# ===== Token bucket =====
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько ждать до появления токена (0 — можно сейчас)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+# ===== Очередь =====
+
+MakeRequest = Callable[[Any, TelegramMethod], Awaitable[Any]]
+
+
+@dataclass
+class _Send:
+    seq: int
+    priority: int
+    make_request: MakeRequest
+    bot: Any
+    method: TelegramMethod
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+    retries: int = 0
+
+
+SEND_QUEUE_LAG = metrics.histogram(
+    "dishvision_send_queue_lag_seconds",
+    "Ожидание исходящего сообщения в очереди до отправки",
+    ("priority",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+SEND_RETRY_AFTER = metrics.counter(
+    "dishvision_send_retry_after_total",
+    "Ответы 429 (retry_after) от Bot API",
+)
+SEND_MERGED = metrics.counter(
+    "dishvision_send_merged_total",
+    "Сообщения, склеенные с предыдущим в тот же чат",
+)
+
+
+class SendQueue:
+    def __init__(self) -> None:
+        self._chats: dict[int, deque[_Send]] = {}
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._paused_until: dict[int, float] = {}
+        self._global = TokenBucket(SEND_GLOBAL_RATE, SEND_GLOBAL_BURST)
+        self._bulk = TokenBucket(SEND_BULK_RATE, SEND_BULK_RATE)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: set[asyncio.Task] = set()
+
+    # ---- API ----
+
+    def set_processes(self, count: int) -> None:
+        """
+        Сколько процессов шлют в Bot API от имени бота: общий лимит
+        и лимит рассылок делятся на них поровну. Вызывать до первой отправки.
+        """
+        count = max(count, 1)
+        self._global = TokenBucket(SEND_GLOBAL_RATE / count, max(SEND_GLOBAL_BURST / count, 1))
+        self._bulk = TokenBucket(SEND_BULK_RATE / count, max(SEND_BULK_RATE / count, 1))
+        logger.info(
+            "Лимит отправки: %.1f сообщ./с (рассылки %.1f) на процесс из %s",
+            SEND_GLOBAL_RATE / count, SEND_BULK_RATE / count, count,
+        )
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self._chats.values())
+
+    async def submit(self, make_request: MakeRequest, bot: Any, method: TelegramMethod) -> Any:
+        """
+        Поставить запрос в очередь чата и дождаться ответа Bot API.
+        """
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run(), name="send-queue")
+
+        item = _Send(
+            seq=next(self._seq),
+            priority=_priority.get(),
+            make_request=make_request,
+            bot=bot,
+            method=method,
+            future=loop.create_future(),
+        )
+        self._chats.setdefault(method.chat_id, deque()).append(item)
+        self._wakeup.set()
+        return await item.future
+
+    async def close(self) -> None:
+        """
+        Дождаться отправки всего, что уже в очереди, и остановить воркер.
+        """
+        while self.depth() or self._in_flight:
+            self._wakeup.set()
+            await asyncio.sleep(0.05)
+        if self._worker is not None:
+            self._worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+
+    # ---- Воркер ----
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(SEND_GROUP_RATE, SEND_GROUP_BURST)
+            else:
+                bucket = TokenBucket(SEND_CHAT_RATE, SEND_CHAT_BURST)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _pick(self, now: float) -> tuple[Optional[int], float]:
+        """
+        Чат с самым приоритетным (потом — самым старым) готовым запросом,
+        либо (None, сколько ждать до ближайшего готового).
+        """
+        best: Optional[int] = None
+        best_key: tuple[int, int] = (BULK + 1, 0)
+        wait = float("inf")
+
+        for chat_id, queue in self._chats.items():
+            head = queue[0]
+            ready_in = max(
+                self._chat_bucket(chat_id).wait_time(now),
+                self._paused_until.get(chat_id, 0.0) - now,
+            )
+            if head.priority == BULK:
+                ready_in = max(ready_in, self._bulk.wait_time(now))
+            if ready_in > 0:
+                wait = min(wait, ready_in)
+                continue
+            key = (head.priority, head.seq)
+            if key < best_key:
+                best, best_key = chat_id, key
+
+        return best, wait
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            chat_id, wait = self._pick(now)
+            if chat_id is None:
+                self._wakeup.clear()
+                timeout = None if wait == float("inf") else wait
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                continue
+
+            global_wait = self._global.wait_time(now)
+            if global_wait > 0:
+                # за это время мог появиться более приоритетный запрос — выбираем заново
+                await asyncio.sleep(global_wait)
+                continue
+
+            batch = self._take_batch(chat_id)
+            self._global.take(now)
+            self._chat_bucket(chat_id).take(now)
+            if batch[0].priority == BULK:
+                self._bulk.take(now)
+
+            for item in batch:
+                SEND_QUEUE_LAG.observe(now - item.enqueued, PRIORITY_NAMES[item.priority])
+
+            task = asyncio.create_task(self._send(chat_id, batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+            self._prune(now)
+
+    def _take_batch(self, chat_id: int) -> list[_Send]:
+        queue = self._chats[chat_id]
+        batch = [queue.popleft()]
+        while queue and _can_merge(batch, queue[0]):
+            batch.append(queue.popleft())
+        if not queue:
+            del self._chats[chat_id]
+        return batch
+
+    def _prune(self, now: float) -> None:
+        # Полный bucket без очереди ничем не отличается от нового — забываем
+        if len(self._chat_buckets) < 1024:
+            return
+        for chat_id in [
+            c for c, b in self._chat_buckets.items() if c not in self._chats and b.is_full(now)
+        ]:
+            del self._chat_buckets[chat_id]
+            self._paused_until.pop(chat_id, None)
+
+    async def _send(self, chat_id: int, batch: list[_Send]) -> None:
+        head = batch[0]
+        method = head.method if len(batch) == 1 else _merged(batch)
+        if len(batch) > 1:
+            SEND_MERGED.inc(value=len(batch) - 1)
+
+        try:
+            result = await head.make_request(head.bot, method)
+        except TelegramRetryAfter as e:
+            SEND_RETRY_AFTER.inc()
+            if head.retries >= SEND_MAX_RETRIES:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                return
+            logger.warning("Bot API 429 для чата %s: пауза %s с", chat_id, e.retry_after)
+            self._paused_until[chat_id] = time.monotonic() + e.retry_after
+            queue = self._chats.setdefault(chat_id, deque())
+            for item in reversed(batch):
+                item.retries += 1
+                queue.appendleft(item)
+            self._wakeup.set()
+        except BaseException as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_result(result)
+
+
+# ===== Склейка текстов =====
+
+def _merge_key(method: SendMessage) -> tuple:
+    # Default("parse_mode") не сравнивается по значению — сравниваем repr
+    return tuple(repr(getattr(method, name, None)) for name in _MERGE_KEY_FIELDS)
+
+
+def _can_merge(batch: list[_Send], candidate: _Send) -> bool:
+    first, last = batch[0].method, batch[-1].method
+    method = candidate.method
+    if not (isinstance(first, SendMessage) and isinstance(method, SendMessage)):
+        return False
+    if candidate.priority != batch[0].priority:
+        return False
+    # клавиатура может быть только у последнего куска; reply — только у первого
+    if last.reply_markup is not None or method.entities or first.entities:
+        return False
+    if method.reply_parameters is not None or method.reply_to_message_id is not None:
+        return False
+    if _merge_key(first) != _merge_key(method):
+        return False
+    size = sum(len(item.method.text) + 2 for item in batch) + len(method.text)
+    return size <= SEND_MERGE_MAX_CHARS
+
+
+def _merged(batch: list[_Send]) -> SendMessage:
+    first = batch[0].method
+    return first.model_copy(
+        update={
+            "text": "\n\n".join(item.method.text for item in batch),
+            "reply_markup": batch[-1].method.reply_markup,
+        }
+    )
+
+
+send_queue = SendQueue()
+
+metrics.gauge(
+    "dishvision_send_queue_depth",
+    "Исходящие сообщения, ждущие отправки",
+    function=send_queue.depth,
+)
@@ -0,0 +1,257 @@
+# app/services/stats_service.py
+"""
+Счётчики для админ-статистики.
+
+Хендлеры и сервисы вызывают `incr(...)` / `mark_active(...)` — это только
+операции со словарём в памяти, без обращений к БД. Фоновая задача
+`stats_flush_loop` раз в STATS_FLUSH_SECONDS сбрасывает накопленное пачкой
+upsert'ов в stats_hourly (по часу события) и stats_totals (за всё время).
+
+Экран статистики читает только эти агрегаты: за неделю/месяц — не больше
+24 * 31 строк на метрику, за всё время — одну строку на метрику.
+
+DAU: пользователь учитывается в метрике "active_users" один раз в сутки —
+в час своей первой активности, поэтому сумма за день = число активных за день.
+Кто уже учтён, помнит таблица stats_active_users: при сбросе отметки
+вставляются с ON CONFLICT DO NOTHING, и active_users растёт только на
+новые строки — перезапуск или второй процесс не посчитают пользователя снова.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Literal, Optional
+
+import sqlalchemy as sa
+from sqlalchemy import select
+
+from app.config_limits import (
+    GPT_CACHED_PRICES_PER_1M_TOKENS,
+    GPT_PRICES_PER_1M_TOKENS,
+    STATS_FLUSH_SECONDS,
+)
+from app.db.base import AsyncSessionLocal, dialect_insert, engine
+from app.db.models import StatsActiveUser, StatsHourly, StatsTotal
+
+logger = logging.getLogger(__name__)
+
+StatsPeriod = Literal["week", "month", "all"]
+
+# Метрики (имена колонок в stats_hourly.metric)
+ACTIVE_USERS = "active_users"
+NEW_USERS = "new_users"
+ANALYSES_FREE = "analyses_free"
+ANALYSES_PAID = "analyses_paid"
+REFINEMENTS = "refinements"
+# Уточнения, отсеянные локальным фильтром (app/services/text_filter.py) вместо вызова GPT
+GPT_CALLS_SAVED = "gpt_calls_saved"
+# Повторно присланные фото, на которые отдан прошлый ответ (app/services/photo_hash.py)
+PHOTO_DUPLICATES = "photo_duplicates"
+GPT_CALLS = "gpt_calls"
+GPT_ERRORS = "gpt_errors"
+GPT_PROMPT_TOKENS = "gpt_prompt_tokens"
+# Часть prompt-токенов из кэша префикса OpenAI (usage.prompt_tokens_details.cached_tokens)
+GPT_CACHED_TOKENS = "gpt_cached_tokens"
+GPT_COMPLETION_TOKENS = "gpt_completion_tokens"
+GPT_COST_USD = "gpt_cost_usd"
+PAYMENTS = "payments"
+PAYMENTS_STARS = "payments_stars"
+PROMO_ACTIVATIONS = "promo_activations"
+
+# (начало часа UTC, метрика) -> накопленное значение
+_buffer: dict[tuple[datetime, str], float] = defaultdict(float)
+
+# Кого этот процесс уже отметил сегодня (сбрасывается при смене суток) —
+# только чтобы не слать в БД одного пользователя на каждом апдейте
+_active_day: Optional[date] = None
+_active_today: set[int] = set()
+
+# Отметки DAU до сброса: (день UTC, user_id) -> час первой активности
+_active_pending: dict[tuple[date, int], datetime] = {}
+
+
+def _hour_bucket(now: datetime) -> datetime:
+    return now.replace(minute=0, second=0, microsecond=0)
+
+
+def incr(metric: str, value: float = 1) -> None:
+    """
+    Увеличить счётчик текущего часа. Ничего не пишет в БД.
+    """
+    if not value:
+        return
+    now = datetime.now(timezone.utc)
+    _buffer[(_hour_bucket(now), metric)] += value
+
+
+def mark_active(user_id: int) -> None:
+    """
+    Отметить активность пользователя (для DAU). Дёшево: проверка в set.
+    """
+    global _active_day
+
+    today = datetime.now(timezone.utc).date()
+    if _active_day != today:
+        _active_day = today
+        _active_today.clear()
+
+    if user_id in _active_today:
+        return
+
+    _active_today.add(user_id)
+    _active_pending[(today, user_id)] = _hour_bucket(datetime.now(timezone.utc))
+
+
+def gpt_cost_usd(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """
+    Стоимость вызова по прайсу из config_limits (0, если модель неизвестна).
+    cached_tokens — часть prompt_tokens из кэша префикса, по своей цене.
+    """
+    prices = GPT_PRICES_PER_1M_TOKENS.get(model)
+    if prices is None:
+        return 0.0
+    price_in, price_out = prices
+    price_cached = GPT_CACHED_PRICES_PER_1M_TOKENS.get(model, price_in)
+    return (
+        (prompt_tokens - cached_tokens) * price_in
+        + cached_tokens * price_cached
+        + completion_tokens * price_out
+    ) / 1_000_000
+
+
+def record_gpt_usage(
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    cached_tokens: int = 0,
+    prompt_version: Optional[str] = None,
+) -> None:
+    incr(GPT_CALLS)
+    incr(GPT_PROMPT_TOKENS, prompt_tokens)
+    incr(GPT_CACHED_TOKENS, cached_tokens)
+    incr(GPT_COMPLETION_TOKENS, completion_tokens)
+    incr(GPT_COST_USD, gpt_cost_usd(model, prompt_tokens, completion_tokens, cached_tokens))
+    if prompt_version:
+        # те же счётчики по версии промпта: «gpt_calls:nutrition/v1-1a2b3c4d»
+        incr(f"{GPT_CALLS}:{prompt_version}")
+        incr(f"{GPT_PROMPT_TOKENS}:{prompt_version}", prompt_tokens)
+        incr(f"{GPT_CACHED_TOKENS}:{prompt_version}", cached_tokens)
+
+
+async def flush_stats() -> int:
+    """
+    Записать буфер в БД. Возвращает количество записанных счётчиков.
+    При ошибке значения возвращаются в буфер и будут записаны в следующий раз.
+    """
+    if not _buffer and not _active_pending:
+        return 0
+
+    counters = dict(_buffer)
+    _buffer.clear()
+    pending: dict[tuple[datetime, str], float] = defaultdict(float, counters)
+    active = dict(_active_pending)
+    _active_pending.clear()
+
+    try:
+        async with AsyncSessionLocal() as session:
+            insert = dialect_insert(engine.dialect.name)
+
+            if active:
+                # В DAU идут только те, кого за этот день ещё нет в stats_active_users
+                seen = StatsActiveUser.__table__
+                stmt = (
+                    insert(seen)
+                    .values([{"day": day, "user_id": user_id} for day, user_id in active])
+                    .on_conflict_do_nothing()
+                    .returning(seen.c.day, seen.c.user_id)
+                )
+                for day, user_id in (await session.execute(stmt)).all():
+                    pending[(active[(day, user_id)], ACTIVE_USERS)] += 1
+
+            if not pending:
+                await session.commit()
+                return 0
+
+            totals: dict[str, float] = defaultdict(float)
+            for (_, metric), value in pending.items():
+                totals[metric] += value
+
+            hourly = StatsHourly.__table__
+            stmt = insert(hourly).values(
+                [
+                    {"hour": hour, "metric": metric, "value": value}
+                    for (hour, metric), value in pending.items()
+                ]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[hourly.c.hour, hourly.c.metric],
+                set_={"value": hourly.c.value + stmt.excluded.value},
+            )
+            await session.execute(stmt)
+
+            total_table = StatsTotal.__table__
+            stmt = insert(total_table).values(
+                [{"metric": metric, "value": value} for metric, value in totals.items()]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[total_table.c.metric],
+                set_={
+                    "value": total_table.c.value + stmt.excluded.value,
+                    "updated_at": sa.func.now(),
+                },
+            )
+            await session.execute(stmt)
+
+            await session.commit()
+    except Exception:
+        # транзакция откатилась вместе с отметками DAU — возвращаем всё как было
+        for key, value in counters.items():
+            _buffer[key] += value
+        for key, hour in active.items():
+            _active_pending.setdefault(key, hour)
+        raise
+
+    return len(pending)
+
+
+async def stats_flush_loop() -> None:
+    """
+    Фоновая задача: периодический сброс счётчиков. Запускается из main.py.
+    """
+    while True:
+        await asyncio.sleep(STATS_FLUSH_SECONDS)
+        try:
+            await flush_stats()
+        except Exception as e:
+            logger.exception("Не удалось записать статистику: %s", e)
+
+
+async def get_stats_summary(period: StatsPeriod) -> dict[str, Decimal]:
+    """
+    Сумма каждой метрики за период (неделя / месяц — по stats_hourly,
+    всё время — по stats_totals).
+    """
+    async with AsyncSessionLocal() as session:
+        if period == "all":
+            stmt = select(StatsTotal.metric, StatsTotal.value)
+        else:
+            days = 7 if period == "week" else 30
+            since = _hour_bucket(datetime.now(timezone.utc)) - timedelta(days=days)
+            stmt = (
+                select(StatsHourly.metric, sa.func.sum(StatsHourly.value))
+                .where(StatsHourly.hour > since)
+                .group_by(StatsHourly.metric)
+            )
+
+        res = await session.execute(stmt)
+        summary = {metric: Decimal(value or 0) for metric, value in res.all()}
+
+    # Добавляем ещё не сброшенное из буфера, чтобы цифры были "живыми"
+    for (_, metric), value in _buffer.items():
+        summary[metric] = summary.get(metric, Decimal(0)) + Decimal(str(value))
+
+    return summary
@@ -0,0 +1,227 @@
+# app/services/text_filter.py
+"""
+Локальный фильтр уточнений к фото (docs/06_abuse_protection.md, п. 6.4).
+
+Сообщение в сессии анализа отсекается до GPT, если оно:
+  - содержит брань (лексикон корней, с учётом латинских «двойников» букв);
+  - бессмысленно: мало букв/цифр, повторяющийся паттерн («хахахаха»,
+    «ааааа»), низкая энтропия символов, набор по клавиатуре (клавиши подряд,
+    «слова» без гласных);
+  - явно не про еду: просьбы вне темы / попытки сменить инструкции, либо
+    длинный текст (от TEXT_FILTER_OFF_TOPIC_MIN_WORDS слов) без единого слова
+    из словаря еды и поправок («ошибся», «меньше», «проверь») и без чисел.
+
+Все регулярные выражения компилируются один раз при импорте; словарь
+еды — одна альтернация основ (regex-движок строит по ней автомат), поэтому
+проверка занимает микросекунды (benchmarks/bench_text_filter.py).
+Уточнения обычной длины без пищевых слов («поменьше», «на самом деле это
+домашнее») пропускаются: отсекаем только явный мусор — отсеянное уточнение
+списывается, и наказывать за нормальный ответ нельзя.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+
+from app.services import metrics
+from app.config_limits import (
+    TEXT_FILTER_MAX_CHARS,
+    TEXT_FILTER_MIN_ENTROPY_BITS,
+    TEXT_FILTER_MIN_ENTROPY_CHARS,
+    TEXT_FILTER_MIN_MEANINGFUL_SHARE,
+    TEXT_FILTER_OFF_TOPIC_MIN_WORDS,
+)
+
+# Результат классификации
+VERDICT_OK = "ok"
+VERDICT_PROFANITY = "profanity"
+VERDICT_GIBBERISH = "gibberish"
+VERDICT_OFF_TOPIC = "off_topic"
+
+COMMENTS_FILTERED = metrics.counter(
+    "dishvision_comments_filtered_total",
+    "Сообщения в сессии анализа, отсеянные до GPT (refinement — вместо вызова GPT)",
+    ("reason", "stage"),
+)
+
+# Латинские буквы, похожие на кириллические («xyй», «cyka»), — только для поиска брани
+_LOOKALIKES = str.maketrans("aeopcxykmtbh", "аеорсхукмтвн")
+
+# Основы пищевого словаря: продукты, блюда, напитки, количества, способы готовки
+# и слова, которыми уточняют состав. Совпадение — с начала слова; основы,
+# совпадающие с частыми непищевыми словами («курс»), уточнены окончаниями.
+_FOOD_STEMS = (
+    # мясо, рыба, яйца
+    "мяс", "курин", "куриц", r"кур(?:а|ы|у|ой)?\b", "курят", "цыпл", "индей", "утк", "говя", "телят", "свин", "баран",
+    "фарш", "котлет", "колбас", "сосис", "ветчин", "бекон", "стейк", "шашлык", "печен",
+    "рыб", "лосос", "семг", "форел", "тунец", "тунц", "треск", "селед", "кревет", "краб",
+    "кальмар", "мид", "икр", "яйц", "яиц", "яичн", "омлет", "белок", "желт",
+    # молочное
+    "молок", "молоч", "кефир", "йогурт", "творог", "творож", "сметан", "сливк", "сливоч",
+    "сыр", "брынз", "моцарел", "пармез", "ряженк", "масл",
+    # крупы, выпечка
+    "хлеб", "булк", "булоч", "батон", "лаваш", "тост", "багет", "макарон", "спагет", "паст",
+    "лапш", "рис", "греч", "овсян", "гречк", "каш", "перлов", "булгур", "киноа", "кускус",
+    "мук", "тест", "пирог", "пирож", "блин", "оладь", "сырник", "вареник", "пельмен",
+    "пицц", "бургер", "шаурм", "сэндвич", "бутерброд", "ролл", "суши", "торт", "пирожн",
+    "печень", "круассан", "кекс", "маффин", "вафл",
+    # овощи, фрукты, орехи
+    "овощ", "картоф", "картош", "пюре", "фри", "огур", "помид", "томат", "морков", "капуст",
+    "лук", "чеснок", "перец", "перц", "баклаж", "кабач", "тыкв", "свекл", "редис", "зелен",
+    "укроп", "петруш", "базилик", "шпинат", "салат", "авокадо", "гриб", "шампин", "кукуруз",
+    "горош", "фасол", "чечевиц", "нут", "фрукт", "ягод", "яблок", "банан", "апельсин",
+    "мандарин", "лимон", "груш", "персик", "абрикос", "слив", "виноград", "клубник",
+    "малин", "черник", "вишн", "арбуз", "дын", "ананас", "манго", "киви", "изюм", "кураг",
+    "орех", "миндал", "фисташ", "арахис", "семечк", "кунжут",
+    # сладкое, соусы, приправы
+    "сахар", "сахарозам", "подсласт", "мед", "мёд", "варень", "джем", "шоколад", "конфет",
+    "мороженое", "морожен", "десерт", "сироп", "соус", "майонез", "кетчуп", "горчиц",
+    "уксус", "сол", "специ", "припра", "смузи",
+    # напитки
+    "кофе", "капучин", "латте", "эспрессо", "американо", "чай", "сок", "компот", "морс",
+    "вод", "газиров", "лимонад", "кол", "пепси", "спрайт", "энергетик", "пив", "вин",
+    "водк", "коньяк", "виски", "коктейл", "напит", "квас",
+    # блюда и приёмы пищи
+    "суп", "борщ", "щи", "солянк", "окрошк", "бульон", "рагу", "плов", "гарнир", "блюд",
+    "завтрак", "обед", "ужин", "перекус", "порци", "тарелк", "стакан", "чашк", "кружк",
+    "ложк", "кусо", "кусоч", "ломт", "штук", "шт", "половин", "четверт", "грамм", "гр",
+    "кг", "килограм", "мл", "литр", "бутыл", "упаков", "пачк",
+    # готовка и состав
+    "жар", "варен", "вар", "туш", "запеч", "печ", "гриль", "копчен", "сыро", "свеж",
+    "отвар", "обжар", "фритюр", "пар", "без", "добав", "убер", "убра", "вместо", "замен",
+    "состав", "ингредиент", "рецепт", "калор", "ккал", "кал", "белк", "жир", "углевод",
+    "бжу", "клетчат", "вес", "размер", "обезжир", "диет", "веган", "постн", "глютен", "лактоз",
+    "похуд", "посчит", "пересчит", "точн", "съел", "съешь", r"ем\b", r"ел\b",
+    # поправки к ответу: «ты ошибся», «там меньше», «проверь ещё раз»
+    "ошиб", "неправ", "неверн", "верн", "провер", "перепров", "меньш", "поменьш", "больш",
+    "побольш", "много", "мало", "слишком", "лишн", "домашн", "магазин", "ресторан", "друг",
+    "кажет", "похож", "точно", "ещё раз", "еще раз",
+    # то же латиницей (блюда и уточнения на английском)
+    "meat", "chicken", "beef", "pork", "fish", "salmon", "tuna", "shrimp", "prawn", "egg",
+    "bacon", "ham", "sausage", "steak", "milk", "cream", "cheese", "yogurt", "butter", "oil",
+    "bread", "toast", "pasta", "noodle", "rice", "oat", "potato", "fries", "salad", "soup",
+    "sauce", "dressing", "vegetable", "tomato", "onion", "fruit", "apple", "banana", "berr",
+    "nut", "sugar", "honey", "chocolate", "cake", "cookie", "dessert", "pizza", "burger",
+    "sandwich", "sushi", "coffee", "tea", "juice", "water", "beer", "wine", "drink",
+    "fried", "grill", "bake", "boil", "roast", "calor", "kcal", "protein", "fat", "carb",
+    "gram", "portion", "serving", "piece", "slice", "cup", "spoon", "less", "more", "without",
+    "wrong", "recipe",
+)
+_FOOD_RE = re.compile(r"(?<![a-zа-яё])(?:" + "|".join(sorted(set(_FOOD_STEMS), key=len, reverse=True)) + ")")
+
+# Просьбы вне темы и попытки переписать инструкции модели
+_OFF_TOPIC_RE = re.compile(
+    r"игнорир\w* (?:все |предыдущ\w* )*(?:инструкц|указан|правил)"
+    r"|забудь (?:все |про )?(?:инструкц|указан|правил|что)"
+    r"|ignore (?:all |previous |the )*(?:instructions|prompts?)"
+    r"|system prompt|системн\w* промпт"
+    r"|(?:напиши|сочини|придумай) (?:мне )?(?:стих|песн|рассказ|сказк|код|сочинени|эссе|реферат)"
+    r"|расскажи (?:мне )?(?:анекдот|шутк|сказк|о себе)"
+    r"|кто ты\b|ты (?:бот|человек|gpt|chatgpt)\b|какая (?:сегодня )?погода"
+    r"|реши (?:задач|уравнен)|переведи (?:на|с) "
+    r"|курс (?:доллар|евро|валют|рубл|биткоин|акци)"
+    r"|кто (?:победил|выиграл)|футбол|хокке|новост"
+)
+
+# Корни брани: с начала слова (с типичными приставками), чтобы «хлеб» или «небо» не совпали
+_PROFANITY_RE = re.compile(
+    r"(?<![а-я])(?:"
+    r"(?:на|по|от|за|вы|у|о|раз|рас|под|до|при|про|об|съ|въ|недо)?х[уy][йяеёию]"
+    r"|(?:на|по|от|за|вы|с|раз|рас|под|до|при|про|у|пере)?пизд"
+    r"|(?:на|по|от|за|вы|съ|въ|у|раз|рас|под|до|при|про|пере|долбо|уе)?[её]б(?:а|у|и|л|н|ё|ы|ну|ись)"
+    r"|бля|мудак|мудил|муда[кч]|гандон|пидор|пидар|педик|залуп|шлюх|дерьм|говн|жоп|сука\b|суки\b|сучк"
+    r"|fuck|shit|bitch"
+    r")"
+)
+
+# Повтор фрагмента длиной 1–4 символа минимум 4 раза подряд: «хахахаха», «ааааа», «!!!!!»
+# (цифры не считаем: «100000» — нормальное число)
+_REPEAT_RE = re.compile(r"(\D{1,4}?)\1{3,}")
+
+# 5 клавиш подряд по ряду клавиатуры: «фывап», «йцуке», «asdfg»
+_KEYBOARD_ROWS = ("йцукенгшщзхъ", "фывапролджэ", "ячсмитьбю", "qwertyuiop", "asdfghjkl", "zxcvbnm")
+_KEYBOARD_RE = re.compile(
+    "|".join(
+        row[i:i + 5]
+        for row in _KEYBOARD_ROWS + tuple(r[::-1] for r in _KEYBOARD_ROWS)
+        for i in range(len(row) - 4)
+    )
+)
+
+_WORD_RE = re.compile(r"[a-zа-яё]+")
+_VOWELS = frozenset("аеёиоуыэюяaeiouy")
+# «Слово» длиннее этого без единой гласной — набор по клавиатуре
+_NO_VOWEL_WORD_LEN = 5
+
+
+def _normalize(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+def _entropy_bits(text: str) -> float:
+    """
+    Энтропия Шеннона по символам (бит/символ).
+    """
+    counts = Counter(text)
+    total = len(text)
+    return -sum(c / total * math.log2(c / total) for c in counts.values())
+
+
+def is_profane(text: str) -> bool:
+    return _PROFANITY_RE.search(_normalize(text).translate(_LOOKALIKES)) is not None
+
+
+def is_gibberish(text: str) -> bool:
+    compact = "".join(text.split())
+    if not compact:
+        return True
+
+    meaningful = sum(1 for ch in compact if ch.isalnum())
+    if meaningful / len(compact) < TEXT_FILTER_MIN_MEANINGFUL_SHARE:
+        return True
+
+    repeated = sum(len(m.group(0)) for m in _REPEAT_RE.finditer(compact))
+    if repeated * 2 >= len(compact):
+        return True
+
+    if len(compact) >= TEXT_FILTER_MIN_ENTROPY_CHARS and _entropy_bits(compact) < TEXT_FILTER_MIN_ENTROPY_BITS:
+        return True
+
+    if _KEYBOARD_RE.search(compact):
+        return True
+
+    words = _WORD_RE.findall(text)
+    if words:
+        mashed = sum(1 for w in words if len(w) >= _NO_VOWEL_WORD_LEN and not _VOWELS.intersection(w))
+        if mashed * 2 >= len(words):
+            return True
+    return False
+
+
+def mentions_food(text: str) -> bool:
+    return _FOOD_RE.search(text) is not None
+
+
+def is_off_topic(text: str) -> bool:
+    if _OFF_TOPIC_RE.search(text):
+        return True
+    if mentions_food(text) or any(ch.isdigit() for ch in text):
+        return False
+    return len(_WORD_RE.findall(text)) >= TEXT_FILTER_OFF_TOPIC_MIN_WORDS
+
+
+def classify_comment(text: str) -> str:
+    """
+    Вердикт для текста уточнения: VERDICT_OK или причина отказа
+    (VERDICT_PROFANITY / VERDICT_GIBBERISH / VERDICT_OFF_TOPIC).
+    """
+    text = _normalize(text.strip())[:TEXT_FILTER_MAX_CHARS]
+    if is_profane(text):
+        return VERDICT_PROFANITY
+    if is_gibberish(text):
+        return VERDICT_GIBBERISH
+    if is_off_topic(text):
+        return VERDICT_OFF_TOPIC
+    return VERDICT_OK
@@ -0,0 +1,341 @@
+# app/services/tracing.py
+"""
+Лёгкая трассировка: trace на апдейт, вложенные span'ы для Telegram, БД и OpenAI.
+
+Контекст передаётся через contextvars, поэтому прокидывать его руками
+через _run_analysis и сервисы не нужно: достаточно обернуть фазу в
+`with tracing.span("..."):`. Для не попавших в выборку апдейтов текущий
+span = None, и вся трассировка сводится к одному ContextVar.get().
+
+Сэмплирование — settings.trace_sample_rate (0 — выключено, 1 — всё).
+Экспорт — settings.trace_exporter:
+  - "log"  — одна строка в лог на trace (фазы и их длительность);
+  - "json" — NDJSON в settings.trace_file (одна строка на trace);
+  - "otlp" — OTLP/HTTP JSON на settings.trace_otlp_endpoint
+    (Jaeger, Tempo, OpenTelemetry Collector).
+Свой экспортёр: любой объект с методом export(trace), см. set_exporter().
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional, Protocol
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "dishvision-bot"
+
+# Сколько символов SQL сохраняем в атрибуте db.statement
+DB_STATEMENT_MAX_CHARS = 300
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+
+class Span:
+    __slots__ = (
+        "trace", "span_id", "parent_id", "name",
+        "start_ns", "end_ns", "attributes", "error",
+    )
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: dict) -> None:
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        trace.spans.append(self)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1_000_000
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"[:200]
+
+    def finish(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    def to_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self) -> None:
+        self.trace_id = os.urandom(16).hex()
+        self.spans: list[Span] = []
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+
+# ===== API для кода приложения =====
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_span(name: str, **attributes: Any) -> Optional[Span]:
+    """
+    Открыть дочерний span без смены текущего (для хуков вида before/after,
+    где контекстный менеджер неудобен). Закрывать — span.finish().
+    """
+    parent = _current.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Дочерний span текущего trace. Вне trace (или если апдейт не в выборке) — no-op.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.fail(e)
+        raise
+    finally:
+        child.finish()
+        _current.reset(token)
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Корневой span (один на апдейт). Решение о сэмплировании — здесь.
+    По выходу trace отдаётся экспортёру.
+    """
+    rate = settings.trace_sample_rate
+    if rate <= 0 or (rate < 1 and random.random() >= rate) or _current.get() is not None:
+        yield None
+        return
+
+    trace = Trace()
+    root = Span(trace, name, None, attributes)
+    token = _current.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.fail(e)
+        raise
+    finally:
+        root.finish()
+        _current.reset(token)
+        try:
+            get_exporter().export(trace)
+        except Exception as e:
+            logger.warning("Не удалось экспортировать trace %s: %s", trace.trace_id, e)
+
+
+# ===== Экспортёры =====
+
+class Exporter(Protocol):
+    def export(self, trace: Trace) -> None: ...
+
+
+class LogExporter:
+    """
+    Одна строка на trace: корень, общая длительность и фазы по порядку.
+    """
+
+    def export(self, trace: Trace) -> None:
+        root = trace.root
+        phases = " ".join(
+            f"{s.name}={s.duration_ms:.1f}ms" + ("!" if s.error else "")
+            for s in trace.spans[1:]
+        )
+        logger.info(
+            "trace %s %s %.1fms %s | %s",
+            trace.trace_id, root.name, root.duration_ms,
+            " ".join(f"{k}={v}" for k, v in root.attributes.items()),
+            phases,
+        )
+
+
+class JsonFileExporter:
+    """
+    NDJSON: {"trace_id": ..., "spans": [...]} на строку.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def export(self, trace: Trace) -> None:
+        line = json.dumps(
+            {"trace_id": trace.trace_id, "spans": [s.to_dict() for s in trace.spans]},
+            ensure_ascii=False,
+            default=str,
+        )
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpExporter:
+    """
+    OTLP/HTTP с JSON-кодированием (POST /v1/traces). Отправка — фоновой задачей,
+    чтобы не задерживать ответ пользователю.
+    """
+
+    def __init__(self, endpoint: str) -> None:
+        self.endpoint = endpoint
+        self._tasks: set[asyncio.Task] = set()
+
+    def _payload(self, trace: Trace) -> dict:
+        spans = []
+        for s in trace.spans:
+            item = {
+                "traceId": trace.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                "attributes": [
+                    {"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()
+                ],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            }
+            if s.parent_id:
+                item["parentSpanId"] = s.parent_id
+            spans.append(item)
+
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                ]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }]
+        }
+
+    async def _send(self, payload: dict) -> None:
+        import aiohttp
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    self.endpoint,
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(total=5),
+                ) as resp:
+                    if resp.status >= 300:
+                        logger.warning("OTLP exporter: HTTP %s", resp.status)
+        except Exception as e:
+            logger.warning("OTLP exporter: %s", e)
+
+    def export(self, trace: Trace) -> None:
+        task = asyncio.get_running_loop().create_task(self._send(self._payload(trace)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+_exporter: Optional[Exporter] = None
+
+
+def _build_exporter() -> Exporter:
+    kind = settings.trace_exporter
+    if kind == "json":
+        return JsonFileExporter(settings.trace_file)
+    if kind == "otlp":
+        return OtlpHttpExporter(settings.trace_otlp_endpoint)
+    if kind != "log":
+        logger.warning("Неизвестный TRACE_EXPORTER=%r, пишем в лог", kind)
+    return LogExporter()
+
+
+def get_exporter() -> Exporter:
+    global _exporter
+    if _exporter is None:
+        _exporter = _build_exporter()
+    return _exporter
+
+
+def set_exporter(exporter: Optional[Exporter]) -> None:
+    """
+    Подменить экспортёр (None — снова взять из настроек).
+    """
+    global _exporter
+    _exporter = exporter
+
+
+# ===== SQLAlchemy =====
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_span = start_span("db.query", **{"db.statement": statement[:DB_STATEMENT_MAX_CHARS]})
+    if db_span is not None and context is not None:
+        context._trace_span = db_span
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_span = getattr(context, "_trace_span", None)
+    if db_span is not None:
+        rowcount = getattr(cursor, "rowcount", -1)
+        if rowcount is not None and rowcount >= 0:
+            db_span.set(**{"db.rows": rowcount})
+        db_span.finish()
+
+
+def _handle_error(exception_context):
+    db_span = getattr(exception_context.execution_context, "_trace_span", None)
+    if db_span is not None:
+        db_span.fail(exception_context.original_exception)
+        db_span.finish()
+
+
+def instrument_engine(sync_engine) -> None:
+    """
+    Повесить DB-span'ы на движок (engine.sync_engine для AsyncEngine).
+    """
+    from sqlalchemy import event
+
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
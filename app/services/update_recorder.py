@@ -0,0 +1,223 @@
+# app/services/update_recorder.py
+"""
+Запись входящих апдейтов для последующего воспроизведения (benchmarks/replay.py).
+
+Пишутся только поля, нужные для маршрутизации, и ничего персонального:
+  - id пользователей/чатов заменяются псевдонимами (HMAC с солью,
+    отрицательные числа — в Telegram таких пользователей нет);
+  - имена, username, телефоны, file_id, id платежей не пишутся;
+  - текст сохраняется, только если это кнопка бота или команда
+    (для команды — только сама команда, без аргументов); иной текст
+    и подписи заменяются заглушкой той же длины.
+
+Формат: первая строка — заголовок, дальше одна строка JSON на апдейт:
+    {"dt": <сек. с предыдущего апдейта>, "update": {...}}
+Сжатие по расширению файла: .gz — gzip, .zst — zstd (нужен пакет
+zstandard), иначе — обычный NDJSON.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import time
+from typing import IO, Any, Iterator, Optional
+
+from aiogram.types import Update
+
+from app.locales.ru.buttons import RussianButtons as B
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = "dishvision-updates"
+FORMAT_VERSION = 1
+
+# Псевдонимы: -(PSEUDONYM_BASE + hash % PSEUDONYM_BASE)
+PSEUDONYM_BASE = 10**12
+
+# Заглушка для свободного текста (длина сохраняется, но не больше лимита Telegram)
+TEXT_PLACEHOLDER_CHAR = "x"
+TEXT_MAX_CHARS = 4096
+
+_BUTTON_TEXTS = frozenset(B.buttons.values())
+
+
+# ===== Файлы =====
+
+def open_record_file(path: str, mode: str) -> IO[str]:
+    """
+    Открыть файл записи на чтение ("r") или запись ("w") с учётом расширения.
+    """
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("Для .zst нужен пакет zstandard (pip install zstandard)") from e
+        raw = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor(level=10).stream_writer(raw)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    """
+    Читает запись: пропускает заголовок, отдаёт {"dt": ..., "update": ...}.
+    """
+    with open_record_file(path, "r") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("format") != FORMAT_NAME:
+            raise ValueError(f"{path}: не похоже на запись апдейтов")
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# ===== Анонимизация =====
+
+class Anonymizer:
+    def __init__(self, salt: bytes) -> None:
+        self.salt = salt
+
+    def pseudonym(self, value: Any) -> int:
+        digest = hmac.new(self.salt, str(value).encode(), hashlib.sha256).digest()
+        return -(PSEUDONYM_BASE + int.from_bytes(digest[:8], "big") % PSEUDONYM_BASE)
+
+    def token(self, value: Any) -> str:
+        digest = hmac.new(self.salt, str(value).encode(), hashlib.sha256).hexdigest()
+        return digest[:24]
+
+    @staticmethod
+    def text(value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        if value in _BUTTON_TEXTS:
+            return value
+        if value.startswith("/"):
+            return value.split(maxsplit=1)[0]
+        return TEXT_PLACEHOLDER_CHAR * min(len(value), TEXT_MAX_CHARS)
+
+    def user(self, user) -> dict:
+        return {
+            "id": self.pseudonym(user.id),
+            "is_bot": user.is_bot,
+            "first_name": "user",
+            "language_code": user.language_code,
+        }
+
+    def message(self, message) -> dict:
+        data: dict[str, Any] = {
+            "message_id": message.message_id,
+            "date": 0,
+            "chat": {"id": self.pseudonym(message.chat.id), "type": message.chat.type},
+        }
+        if message.from_user is not None:
+            data["from"] = self.user(message.from_user)
+        if message.text is not None:
+            data["text"] = self.text(message.text)
+        if message.caption is not None:
+            data["caption"] = self.text(message.caption)
+        if message.photo:
+            data["photo"] = [
+                {
+                    "file_id": self.token(size.file_unique_id),
+                    "file_unique_id": self.token(size.file_unique_id),
+                    "width": size.width,
+                    "height": size.height,
+                    "file_size": size.file_size,
+                }
+                for size in message.photo
+            ]
+        if message.successful_payment is not None:
+            payment = message.successful_payment
+            data["successful_payment"] = {
+                "currency": payment.currency,
+                "total_amount": payment.total_amount,
+                "invoice_payload": payment.invoice_payload,
+                "telegram_payment_charge_id": self.token(payment.telegram_payment_charge_id),
+                "provider_payment_charge_id": "",
+            }
+        return data
+
+    def update(self, update: Update) -> Optional[dict]:
+        """
+        Анонимизированный апдейт (без update_id) или None, если тип не пишем.
+        """
+        if update.message is not None:
+            return {"message": self.message(update.message)}
+        if update.callback_query is not None:
+            query = update.callback_query
+            data: dict[str, Any] = {
+                "id": self.token(query.id),
+                "from": self.user(query.from_user),
+                "chat_instance": "0",
+                "data": query.data,
+            }
+            if query.message is not None and hasattr(query.message, "chat"):
+                data["message"] = self.message(query.message)
+            return {"callback_query": data}
+        if update.pre_checkout_query is not None:
+            query = update.pre_checkout_query
+            return {
+                "pre_checkout_query": {
+                    "id": self.token(query.id),
+                    "from": self.user(query.from_user),
+                    "currency": query.currency,
+                    "total_amount": query.total_amount,
+                    "invoice_payload": query.invoice_payload,
+                }
+            }
+        return None
+
+
+# ===== Запись =====
+
+class UpdateRecorder:
+    """
+    Пишет апдейты с интервалами между ними. Запись синхронная и дешёвая
+    (строка JSON в буферизованный поток), выполняется в event loop.
+    """
+
+    def __init__(self, path: str, salt: str = "") -> None:
+        self.path = path
+        # Без соли — случайная на процесс: псевдонимы стабильны только в пределах записи
+        self.anonymizer = Anonymizer(salt.encode() if salt else os.urandom(16))
+        self._file = open_record_file(path, "w")
+        self._file.write(
+            json.dumps({"format": FORMAT_NAME, "version": FORMAT_VERSION, "started_at": time.time()})
+            + "\n"
+        )
+        self._last: Optional[float] = None
+        self.recorded = 0
+
+    def record(self, update: Update) -> None:
+        try:
+            data = self.anonymizer.update(update)
+        except Exception as e:
+            logger.warning("Не удалось анонимизировать апдейт %s: %s", update.update_id, e)
+            return
+        if data is None:
+            return
+
+        now = time.monotonic()
+        dt = 0.0 if self._last is None else now - self._last
+        self._last = now
+
+        self._file.write(
+            json.dumps({"dt": round(dt, 4), "update": data}, ensure_ascii=False, separators=(",", ":"))
+            + "\n"
+        )
+        self.recorded += 1
+
+    def close(self) -> None:
+        self._file.close()
+        logger.info("Записано апдейтов: %s → %s", self.recorded, self.path)
@@ -1,5 +1,6 @@
 # app/services/user_service.py
 
+from datetime import datetime, timezone
 from typing import Optional
 
 from sqlalchemy import select
@@ -7,6 +8,37 @@ from sqlalchemy.exc import IntegrityError
 
 from app.db.base import AsyncSessionLocal
 from app.db.models import User
+from app.services import stats_service
+
+
+def to_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """
+    Приводим datetime к UTC-aware (naive считаем уже UTC). None → None.
+    """
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def is_effective_premium(user, now: Optional[datetime] = None) -> bool:
+    """
+    Пользователь считается премиумным, если:
+    - is_premium = True и
+    - premium_until либо не задан (бессрочный премиум), либо в будущем (UTC).
+
+    Флаг is_premium у истёкших снимает фоновая задача (app/services/jobs.py),
+    но до её запуска решает именно premium_until.
+    """
+    if not getattr(user, "is_premium", False):
+        return False
+
+    premium_until = to_utc(getattr(user, "premium_until", None))
+    if premium_until is None:
+        return True
+
+    return premium_until > (now or datetime.now(timezone.utc))
 
 
 async def get_user_by_telegram_id(telegram_id: int) -> Optional[User]:
@@ -46,6 +78,7 @@ async def get_or_create_user(telegram_id: int) -> User:
             return user
 
         await session.refresh(user)
+        stats_service.incr(stats_service.NEW_USERS)
         return user
 
 
@@ -0,0 +1,3 @@
+# benchmarks/__init__.py
+# Бенчмарки производительности: запускаются как `python -m benchmarks.<имя>`.
+# Работают с БД из DATABASE_URL (по умолчанию — PostgreSQL из docker-compose).
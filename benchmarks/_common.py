@@ -0,0 +1,76 @@
+# benchmarks/_common.py
+"""
+Общие помощники для бенчмарков: перцентили, замер времени, тестовый пользователь.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Sequence
+
+from sqlalchemy import delete
+
+from app.db.base import AsyncSessionLocal
+from app.db.models import User
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Перцентиль q (0..100) методом ближайшего ранга.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def summarize_ms(samples: Sequence[float]) -> dict[str, float]:
+    """
+    Сводка по выборке длительностей (секунды) в миллисекундах.
+    """
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": (max(samples) if samples else 0.0) * 1000,
+    }
+
+
+class Stopwatch:
+    def __init__(self) -> None:
+        self.samples: list[float] = []
+
+    @asynccontextmanager
+    async def measure(self) -> AsyncIterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append(time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def temporary_user(rng: random.Random) -> AsyncIterator[User]:
+    """
+    Создаёт пользователя с отрицательным telegram_id (таких в Telegram нет)
+    и удаляет его вместе со всеми данными (ON DELETE CASCADE) после бенчмарка.
+    """
+    telegram_id = -rng.randint(10**9, 10**12)
+
+    async with AsyncSessionLocal() as session:
+        user = User(telegram_id=telegram_id)
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+
+    try:
+        yield user
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(User).where(User.id == user.id))
+            await session.commit()
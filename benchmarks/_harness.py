@@ -0,0 +1,226 @@
+# benchmarks/_harness.py
+"""
+Бот "под нагрузкой" для прогонов end-to-end: заглушки Bot API и OpenAI,
+настоящий Dispatcher из app.main.build_dispatcher(), polling и воркеры
+очереди анализов (AnalysisWorkerPool).
+
+    async with BotUnderTest(photo_bytes, OpenAIProfile(...)) as bot:
+        future = bot.push(update_dict)
+        result = await future          # UpdateResult
+
+app.* импортируется внутри start(): адрес фейкового OpenAI должен попасть
+в окружение до создания клиента в gpt_client.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from benchmarks.fakes import FAKE_TOKEN, FakeOpenAI, FakeTelegram, OpenAIProfile
+
+
+@dataclass
+class UpdateResult:
+    finished: float          # time.perf_counter() конца обработки
+    queries: int             # SQL-запросов за апдейт
+    handler: str             # "router.handler" (или "none.unhandled")
+    error: Optional[BaseException]
+
+
+class UpdateTracker:
+    """
+    Outer-middleware (регистрируется последним, т.е. самый внутренний из outer):
+    отмечает завершение апдейта, сработавший хендлер и число SQL-запросов.
+    """
+
+    def __init__(self) -> None:
+        self.pending: dict[int, asyncio.Future] = {}
+
+    def expect(self, update_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.pending[update_id] = future
+        return future
+
+    async def __call__(self, handler, event, data):
+        from app.bot.middlewares.metrics import CTX_KEY
+        from app.db import query_stats
+
+        error = None
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            future = self.pending.pop(event.update_id, None)
+            if future is not None and not future.done():
+                queries = query_stats.current_update()
+                labels = data.get(CTX_KEY)
+                future.set_result(
+                    UpdateResult(
+                        finished=time.perf_counter(),
+                        queries=queries.count if queries else 0,
+                        handler=f"{labels.router}.{labels.handler}" if labels else "none.unhandled",
+                        error=error,
+                    )
+                )
+
+
+class BotUnderTest:
+    def __init__(
+        self,
+        photo_bytes: bytes,
+        openai_profile: OpenAIProfile,
+        seed: int = 0,
+        analysis_workers: Optional[int] = None,
+    ) -> None:
+        """
+        analysis_workers — воркеры очереди анализов в процессе бота
+        (None — как в settings.analysis_workers, 0 — не запускать).
+        """
+        self.telegram = FakeTelegram(photo_bytes=photo_bytes)
+        self.openai = FakeOpenAI(openai_profile, seed=seed)
+        self.tracker = UpdateTracker()
+        self.analysis_workers = analysis_workers
+        self._bot = None
+        self._dp = None
+        self._pool = None
+        self._polling: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self.telegram.start()
+        await self.openai.start()
+
+        # Клиент OpenAI создаётся при импорте gpt_client — адрес нужен до импорта
+        os.environ["OPENAI_BASE_URL"] = self.openai.base_url
+
+        from aiogram import Bot
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+
+        from app.bot.analysis_worker import AnalysisWorkerPool
+        from app.config import settings
+        from app.db.base import init_db
+        from app.main import build_dispatcher, instrument_db, setup_bot_session
+
+        await init_db()
+        instrument_db()
+
+        self._bot = Bot(
+            token=FAKE_TOKEN,
+            session=AiohttpSession(api=TelegramAPIServer.from_base(self.telegram.base_url)),
+        )
+        setup_bot_session(self._bot)
+        self._dp = build_dispatcher()
+        self._dp.update.outer_middleware(self.tracker)
+        self._polling = asyncio.create_task(
+            self._dp.start_polling(self._bot, polling_timeout=1, handle_signals=False)
+        )
+
+        workers = settings.analysis_workers if self.analysis_workers is None else self.analysis_workers
+        if workers:
+            self._pool = AnalysisWorkerPool(self._bot, workers)
+            self._pool.start()
+
+    @property
+    def bot(self):
+        return self._bot
+
+    async def drain_analysis_jobs(self, timeout: float) -> bool:
+        """
+        Дождаться, пока в analysis_jobs не останется queued/running задач.
+        False — не успели за timeout.
+        """
+        import sqlalchemy as sa
+
+        from app.db.base import AsyncSessionLocal
+        from app.db.models import AnalysisJob
+        from app.services.analysis_queue import STATUS_QUEUED, STATUS_RUNNING
+
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            async with AsyncSessionLocal() as session:
+                pending = await session.scalar(
+                    sa.select(sa.func.count()).where(
+                        AnalysisJob.status.in_((STATUS_QUEUED, STATUS_RUNNING))
+                    )
+                )
+            if not pending:
+                return True
+            await asyncio.sleep(0.2)
+        return False
+
+    async def stop(self) -> None:
+        from app.db.base import engine
+
+        if self._polling is not None:
+            await self._dp.stop_polling()
+            await self._polling
+        if self._pool is not None:
+            await self._pool.stop()
+        if self._bot is not None:
+            from app.services.send_queue import send_queue
+
+            await send_queue.close()
+            await self._bot.session.close()
+        await engine.dispose()
+        await self.telegram.stop()
+        await self.openai.stop()
+
+    async def __aenter__(self) -> "BotUnderTest":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    def push(self, update: dict) -> asyncio.Future:
+        """
+        Поставить апдейт (без update_id) в очередь getUpdates.
+        Future завершится UpdateResult'ом после обработки.
+        """
+        update_id = self.telegram.push_update(update)
+        return self.tracker.expect(update_id)
+
+
+async def delete_users(telegram_ids: list[int]) -> None:
+    import sqlalchemy as sa
+
+    from app.db.base import AsyncSessionLocal
+    from app.db.models import User
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(sa.delete(User).where(User.telegram_id.in_(telegram_ids)))
+        await session.commit()
+
+
+async def create_premium_users(telegram_ids: list[int]) -> None:
+    """
+    Пересоздать пользователей премиумными и с запасом платных анализов,
+    чтобы прогон не упирался в лимиты.
+    """
+    import sqlalchemy as sa
+
+    from app.config_limits import PREMIUM_TARIFF
+    from app.db.base import AsyncSessionLocal
+    from app.db.models import User
+
+    await delete_users(telegram_ids)
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            sa.insert(User),
+            [
+                {
+                    "telegram_id": tg_id,
+                    "is_premium": True,
+                    "premium_until": None,
+                    "paid_photos_balance": PREMIUM_TARIFF.daily_photos * 10,
+                }
+                for tg_id in telegram_ids
+            ],
+        )
+        await session.commit()
@@ -0,0 +1,170 @@
+# benchmarks/bench_analysis_queue.py
+"""
+Пропускная способность очереди анализов (analysis_jobs) от числа воркеров.
+
+    python -m benchmarks.bench_analysis_queue [--workers 1,2,4,8,16]
+        [--jobs-per-worker 10] [--openai-latency-ms 800] [--openai-jitter-ms 200]
+        [--openai-error-rate 0] [--min-efficiency 0.7] [--json out.json]
+
+Для каждого числа воркеров W в очередь заранее ставится W × jobs-per-worker
+задач, затем запускается AnalysisWorkerPool(W) и меряется время, за которое
+все ответы дошли до чатов фейкового Bot API. Воркер занят задачей на время
+ответа OpenAI, поэтому ожидается jobs/s ≈ W / latency, т.е. линейный рост.
+
+Отчёт: jobs/s, ускорение относительно W=1 и эффективность (ускорение / W),
+p50/p95 от старта до доставки, дубли доставки. Код выхода 1, если эффективность
+на наибольшем W ниже --min-efficiency, задачи не доставлены или есть дубли.
+Потолок сверху — SEND_GLOBAL_RATE (лимит Bot API на исходящие сообщения).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+
+from benchmarks._common import summarize_ms
+from benchmarks._harness import BotUnderTest, create_premium_users, delete_users
+from benchmarks.fakes import OpenAIProfile
+
+SEED = 20260104
+
+# Пользователи и чаты прогона (отрицательные id — таких в Telegram нет)
+TELEGRAM_ID_BASE = -9_100_000_000
+CHAT_ID_BASE = -9_200_000_000
+USERS = 20
+
+
+async def _run(harness: BotUnderTest, user_ids: list[int], workers: int, jobs: int, timeout: float) -> dict:
+    from app.bot.analysis_worker import AnalysisWorkerPool
+    from app.services.analysis_queue import enqueue_analysis
+
+    chat_ids = [CHAT_ID_BASE - workers * 1_000_000 - i for i in range(jobs)]
+    pending = set(chat_ids)
+    delivered: dict[int, float] = {}
+    sends: Counter[int] = Counter()
+    all_delivered = asyncio.Event()
+
+    def on_send(chat_id: int, text: str) -> None:
+        if chat_id not in pending:
+            return
+        sends[chat_id] += 1
+        delivered.setdefault(chat_id, time.perf_counter())
+        if len(delivered) == len(pending):
+            all_delivered.set()
+
+    harness.telegram.on_send_message = on_send
+    for i, chat_id in enumerate(chat_ids):
+        await enqueue_analysis(
+            user_id=user_ids[i % len(user_ids)],
+            chat_id=chat_id,
+            analysis_type="nutrition",
+            photo_file_id=f"queue-photo-{i}",
+            comment=None,
+        )
+
+    pool = AnalysisWorkerPool(harness.bot, workers)
+    started = time.perf_counter()
+    pool.start()
+    try:
+        await asyncio.wait_for(all_delivered.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        elapsed = (max(delivered.values()) if delivered else time.perf_counter()) - started
+        # ответ уже у фейкового Bot API, но воркер ещё ждёт его и закрывает задачу
+        await pool.stop(timeout)
+        harness.telegram.on_send_message = None
+
+    return {
+        "workers": workers,
+        "jobs": jobs,
+        "delivered": len(delivered),
+        "duplicates": sum(count - 1 for count in sends.values()),
+        "duration_s": round(elapsed, 2),
+        "jobs_per_s": round(len(delivered) / elapsed, 2) if elapsed > 0 else 0.0,
+        "delivery_ms": {
+            k: round(v, 1) for k, v in summarize_ms([t - started for t in delivered.values()]).items()
+        },
+    }
+
+
+async def main(args: argparse.Namespace) -> int:
+    from app.db.models import User
+
+    rng = random.Random(SEED)
+    worker_counts = [int(w) for w in args.workers.split(",")]
+    harness = BotUnderTest(
+        photo_bytes=rng.randbytes(args.photo_kb * 1024),
+        openai_profile=OpenAIProfile(
+            latency=args.openai_latency_ms / 1000,
+            jitter=args.openai_jitter_ms / 1000,
+            error_rate=args.openai_error_rate,
+        ),
+        seed=SEED,
+        analysis_workers=0,
+    )
+    telegram_ids = [TELEGRAM_ID_BASE - i for i in range(USERS)]
+
+    runs: list[dict] = []
+    async with harness:
+        import sqlalchemy as sa
+
+        from app.db.base import AsyncSessionLocal
+
+        await create_premium_users(telegram_ids)
+        async with AsyncSessionLocal() as session:
+            user_ids = list(
+                await session.scalars(sa.select(User.id).where(User.telegram_id.in_(telegram_ids)))
+            )
+        try:
+            for workers in worker_counts:
+                # фоновая очередь должна быть пустой: иначе воркеры заберут чужие задачи
+                await harness.drain_analysis_jobs(args.timeout)
+                runs.append(
+                    await _run(harness, user_ids, workers, workers * args.jobs_per_worker, args.timeout)
+                )
+        finally:
+            await delete_users(telegram_ids)
+
+    # пропускная способность одного воркера в первом прогоне
+    per_worker = runs[0]["jobs_per_s"] / runs[0]["workers"] if runs else 0.0
+    print(f"OpenAI latency {args.openai_latency_ms:.0f}±{args.openai_jitter_ms:.0f} ms")
+    print(f"{'workers':>8}{'jobs':>7}{'sec':>8}{'jobs/s':>9}{'speedup':>9}{'eff':>7}{'p50':>9}{'p95':>9}{'dup':>5}")
+    failed = False
+    for run in runs:
+        run["speedup"] = round(run["jobs_per_s"] / runs[0]["jobs_per_s"], 2) if per_worker else 0.0
+        run["efficiency"] = round(run["jobs_per_s"] / (per_worker * run["workers"]), 2) if per_worker else 0.0
+        failed |= run["delivered"] < run["jobs"] or run["duplicates"] > 0
+        print(
+            f"{run['workers']:>8}{run['jobs']:>7}{run['duration_s']:>8.1f}{run['jobs_per_s']:>9.2f}"
+            f"{run['speedup']:>9.2f}{run['efficiency']:>7.2f}"
+            f"{run['delivery_ms']['p50_ms']:>9.0f}{run['delivery_ms']['p95_ms']:>9.0f}{run['duplicates']:>5}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"runs": runs}, f, ensure_ascii=False, indent=2)
+
+    if runs and runs[-1]["efficiency"] < args.min_efficiency:
+        print(f"Efficiency at {runs[-1]['workers']} workers below {args.min_efficiency}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analysis queue throughput vs worker count")
+    parser.add_argument("--workers", default="1,2,4,8,16", help="числа воркеров через запятую")
+    parser.add_argument("--jobs-per-worker", type=int, default=10)
+    parser.add_argument("--photo-kb", type=int, default=150)
+    parser.add_argument("--openai-latency-ms", type=float, default=800.0)
+    parser.add_argument("--openai-jitter-ms", type=float, default=200.0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=300.0, help="на один прогон, сек")
+    parser.add_argument("--min-efficiency", type=float, default=0.7)
+    parser.add_argument("--json", help="сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args)))
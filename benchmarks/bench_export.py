@@ -0,0 +1,95 @@
+# benchmarks/bench_export.py
+"""
+Потребление памяти экспортом дневника в зависимости от размера истории.
+
+    python -m benchmarks.bench_export [--sizes 10000 100000] [--format csv]
+
+Для каждого размера создаётся отдельный пользователь с синтетическими
+приёмами пищи, экспорт выполняется под tracemalloc. Пиковая память должна
+оставаться "плоской": код возврата 1, если пик на самом большом размере
+больше пика на самом маленьком в --max-growth раз.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+
+from app.db.base import AsyncSessionLocal, engine, init_db
+from app.db.models import Meal
+from app.services.export_service import export_meals
+from benchmarks._common import temporary_user
+
+SEED = 20260102
+
+
+async def _seed_meals(user_id: int, meals: int, rng: random.Random) -> None:
+    now = datetime.now(timezone.utc)
+    batch = []
+    async with AsyncSessionLocal() as session:
+        for i in range(meals):
+            batch.append(
+                {
+                    "user_id": user_id,
+                    "eaten_at": now - timedelta(minutes=i * 7),
+                    "title": f"Блюдо №{rng.randint(1, 500)} с гарниром",
+                    "weight_grams": rng.randint(50, 600),
+                    "calories": rng.randint(30, 1200),
+                    "proteins": round(rng.uniform(0, 60), 1),
+                    "fats": round(rng.uniform(0, 50), 1),
+                    "carbs": round(rng.uniform(0, 120), 1),
+                }
+            )
+            if len(batch) == 5000:
+                await session.execute(sa.insert(Meal), batch)
+                batch = []
+        if batch:
+            await session.execute(sa.insert(Meal), batch)
+        await session.commit()
+
+
+async def main(sizes: list[int], fmt: str, max_growth: float) -> int:
+    await init_db()
+    rng = random.Random(SEED)
+    peaks: dict[int, int] = {}
+
+    for size in sorted(sizes):
+        async with temporary_user(rng) as user:
+            await _seed_meals(user.id, size, rng)
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            export = await export_meals(user.id, fmt)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            export.close()
+            peaks[size] = peak
+            print(
+                f"{size:>7} meals: {export.size_bytes / 1024 / 1024:7.2f} MB file, "
+                f"peak Python memory {peak / 1024 / 1024:6.2f} MB, {elapsed:.2f}s "
+                f"({size / elapsed:,.0f} rows/s)"
+            )
+
+    await engine.dispose()
+
+    smallest, largest = min(peaks), max(peaks)
+    growth = peaks[largest] / max(peaks[smallest], 1)
+    print(f"peak growth {smallest} -> {largest}: x{growth:.2f} (limit x{max_growth})")
+    return 1 if growth > max_growth else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Meal export memory benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    parser.add_argument("--max-growth", type=float, default=2.0)
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.sizes, args.format, args.max_growth)))
@@ -0,0 +1,195 @@
+# benchmarks/bench_load.py
+"""
+Нагрузочный прогон бота целиком: настоящий Dispatcher, роутеры и БД,
+Bot API и OpenAI — локальные заглушки (benchmarks/fakes.py), сеть не нужна.
+
+    python -m benchmarks.bench_load [--users 50] [--refinements 2]
+        [--openai-latency-ms 800] [--openai-jitter-ms 300] [--json out.json]
+
+Каждый из --users пользователей проходит сценарий
+фото → «Калорийность» → N уточнений → «Рецепт». Апдейты уходят в очередь
+getUpdates фейкового Bot API, бот забирает их обычным polling'ом.
+Латентность шага — от постановки апдейта в очередь до конца обработки
+(включая все ответы бота в Bot API). Сам анализ GPT выполняют воркеры
+очереди analysis_jobs уже после ответа хендлера — его пропускную способность
+меряет benchmarks/bench_analysis_queue.py; перед очисткой прогон ждёт,
+пока очередь опустеет (--drain-timeout).
+
+Отчёт: пропускная способность, p50/p95/p99 по шагам, SQL-запросов на апдейт,
+вызовы Bot API/OpenAI. Нужна БД из DATABASE_URL (make docker-db);
+тестовые пользователи создаются с отрицательными telegram_id и удаляются.
+
+Заглушки крутятся в том же event loop'е, что и бот; они лёгкие,
+но на 1 vCPU это стоит учитывать при сравнении абсолютных цифр.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks._common import percentile, summarize_ms
+from benchmarks._harness import BotUnderTest, create_premium_users, delete_users
+from benchmarks.fakes import OpenAIProfile
+
+SEED = 20260103
+
+# Диапазон telegram_id нагрузочных пользователей (отрицательные — таких в Telegram нет)
+TELEGRAM_ID_BASE = -9_000_000_000
+
+REFINEMENT_TEXTS = (
+    "Напиток без сахара",
+    "Рис был бурый, порция чуть больше",
+    "Соус не ел",
+    "Добавь ещё ложку оливкового масла",
+    "Курица без кожи",
+)
+
+
+def _message_update(telegram_id: int, message_id: int, **content) -> dict:
+    return {
+        "message": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": {"id": telegram_id, "is_bot": False, "first_name": "Load", "language_code": "ru"},
+            **content,
+        }
+    }
+
+
+def _scenario(refinements: int, rng: random.Random) -> list[tuple[str, dict]]:
+    from app.locales.ru.buttons import RussianButtons as B
+
+    photo_id = f"load-photo-{rng.randrange(10**9)}"
+    steps: list[tuple[str, dict]] = [
+        ("photo", {"photo": [{"file_id": photo_id, "file_unique_id": photo_id, "width": 1280, "height": 960}]}),
+        ("nutrition", {"text": B.get("nutrition")}),
+    ]
+    for _ in range(refinements):
+        steps.append(("refinement", {"text": rng.choice(REFINEMENT_TEXTS)}))
+    steps.append(("recipe", {"text": B.get("recipe")}))
+    return steps
+
+
+def _summary(samples: list[float]) -> dict:
+    return {k: round(v, 1) for k, v in summarize_ms(samples).items()}
+
+
+async def main(args: argparse.Namespace) -> int:
+    rng = random.Random(SEED)
+    harness = BotUnderTest(
+        photo_bytes=rng.randbytes(args.photo_kb * 1024),
+        openai_profile=OpenAIProfile(
+            latency=args.openai_latency_ms / 1000,
+            jitter=args.openai_jitter_ms / 1000,
+            prompt_tokens=args.prompt_tokens,
+            completion_tokens=args.completion_tokens,
+            error_rate=args.openai_error_rate,
+        ),
+        seed=SEED,
+    )
+    telegram, openai = harness.telegram, harness.openai
+    telegram_ids = [TELEGRAM_ID_BASE - i for i in range(args.users)]
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    queries: list[float] = []
+    errors = 0
+
+    async def run_user(index: int) -> None:
+        nonlocal errors
+        telegram_id = telegram_ids[index]
+        user_rng = random.Random(SEED + index)
+        await asyncio.sleep(user_rng.uniform(0, args.ramp_seconds))
+
+        for _ in range(args.sessions):
+            for step, content in _scenario(args.refinements, user_rng):
+                future = harness.push(
+                    _message_update(telegram_id, telegram.next_message_id(), **content)
+                )
+                pushed = time.perf_counter()
+                result = await asyncio.wait_for(future, args.step_timeout)
+                latencies[step].append(result.finished - pushed)
+                queries.append(result.queries)
+                if result.error is not None:
+                    errors += 1
+                await asyncio.sleep(user_rng.uniform(0, args.think_ms / 1000))
+
+    async with harness:
+        await create_premium_users(telegram_ids)
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(run_user(i) for i in range(args.users)))
+        finally:
+            elapsed = time.perf_counter() - started
+            drained = await harness.drain_analysis_jobs(args.drain_timeout)
+            await delete_users(telegram_ids)
+
+    all_samples = [value for samples in latencies.values() for value in samples]
+    report = {
+        "users": args.users,
+        "updates": len(all_samples),
+        "errors": errors,
+        "duration_s": round(elapsed, 2),
+        "throughput_updates_per_s": round(len(all_samples) / elapsed, 2),
+        "latency_ms": {step: _summary(samples) for step, samples in latencies.items()},
+        "latency_ms_all": _summary(all_samples),
+        "db_queries_per_update": {
+            "mean": round(sum(queries) / max(len(queries), 1), 2),
+            "p95": percentile(queries, 95),
+            "max": max(queries, default=0),
+        },
+        "telegram_calls": dict(telegram.calls),
+        "openai_calls": openai.calls,
+        "openai_errors": openai.errors,
+        "analysis_queue_drained": drained,
+    }
+
+    print(
+        f"{report['users']} users, {report['updates']} updates in {elapsed:.1f}s "
+        f"→ {report['throughput_updates_per_s']} updates/s, errors: {errors}"
+    )
+    print(f"{'step':<12}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for step, stats in [*report["latency_ms"].items(), ("all", report["latency_ms_all"])]:
+        print(
+            f"{step:<12}{stats['count']:>7.0f}{stats['p50_ms']:>9.1f}"
+            f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}"
+        )
+    q = report["db_queries_per_update"]
+    print(f"DB queries/update: mean {q['mean']}, p95 {q['p95']:.0f}, max {q['max']:.0f}")
+    print(f"OpenAI calls: {openai.calls} (errors {openai.errors}); Bot API: {dict(telegram.calls)}")
+    if not drained:
+        print(f"Analysis queue not drained in {args.drain_timeout:.0f}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.max_p95_ms and report["latency_ms_all"]["p95_ms"] > args.max_p95_ms:
+        return 1
+    return 1 if errors or not drained else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end load test with fake Bot API and OpenAI")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=1, help="фото-сессий на пользователя")
+    parser.add_argument("--refinements", type=int, default=2)
+    parser.add_argument("--ramp-seconds", type=float, default=5.0)
+    parser.add_argument("--think-ms", type=float, default=500.0)
+    parser.add_argument("--photo-kb", type=int, default=150)
+    parser.add_argument("--openai-latency-ms", type=float, default=800.0)
+    parser.add_argument("--openai-jitter-ms", type=float, default=300.0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--prompt-tokens", type=int, default=1200)
+    parser.add_argument("--completion-tokens", type=int, default=350)
+    parser.add_argument("--step-timeout", type=float, default=120.0)
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="ожидание очереди анализов")
+    parser.add_argument("--max-p95-ms", type=float, default=0.0, help="0 — без порога")
+    parser.add_argument("--json", help="сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,170 @@
+# benchmarks/bench_photo_hash.py
+"""
+Повторы фото (app/services/photo_hash.py): хэш и поиск по 1M хэшей.
+
+    python -m benchmarks.bench_photo_hash [--hashes 1000000] [--lookups 200] [--budget-ms 50]
+
+1. dHash синтетического JPEG 1280×960 и его копий (уменьшенной, пересжатой):
+   время подсчёта и расстояние до оригинала (должно быть в пределах
+   PHOTO_DUPLICATE_MAX_DISTANCE).
+2. У временного пользователя --hashes случайных хэшей (худший случай: все
+   кандидаты у одного пользователя). Поиск find_nearest для запросов, у
+   которых есть сосед на расстоянии ≤ PHOTO_DUPLICATE_MAX_DISTANCE, и для
+   случайных; результаты сверяются с полным перебором в памяти.
+
+Код возврата 1, если p95 поиска больше --budget-ms или ответ разошёлся с перебором.
+
+Только PostgreSQL (make docker-up): на SQLite схема не создаётся —
+BIGSERIAL-ключи там не автоинкрементируются.
+"""
+
+import argparse
+import asyncio
+import io
+import random
+import sys
+import time
+
+import sqlalchemy as sa
+from PIL import Image, ImageDraw
+
+from app.config_limits import PHOTO_DUPLICATE_MAX_DISTANCE
+from app.db.base import AsyncSessionLocal, engine, init_db
+from app.db.models import AnalysisJob, PhotoHash
+from app.services import photo_hash
+from benchmarks._common import Stopwatch, summarize_ms, temporary_user
+
+SEED = 20260301
+BATCH = 10_000
+
+
+def _jpeg(image: Image.Image, quality: int) -> bytes:
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+def _synthetic_photo(rng: random.Random) -> Image.Image:
+    image = Image.new("RGB", (1280, 960), (235, 225, 210))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randint(0, 1200), rng.randint(0, 880)
+        size = rng.randint(40, 300)
+        color = tuple(rng.randint(0, 255) for _ in range(3))
+        draw.ellipse((x, y, x + size, y + size * rng.uniform(0.5, 1.2)), fill=color)
+    return image
+
+
+def _bench_dhash(rng: random.Random) -> None:
+    image = _synthetic_photo(rng)
+    original = _jpeg(image, 90)
+    variants = {
+        "recompressed q60": _jpeg(image, 60),
+        "resized 640x480": _jpeg(image.resize((640, 480)), 85),
+        "resized 320x240 q50": _jpeg(image.resize((320, 240)), 50),
+    }
+
+    runs = 50
+    started = time.perf_counter()
+    for _ in range(runs):
+        base = photo_hash.dhash(original)
+    elapsed = (time.perf_counter() - started) / runs * 1000
+    print(f"dhash 1280x960 JPEG: {elapsed:.2f} ms")
+    for name, data in variants.items():
+        distance = photo_hash.hamming(base, photo_hash.dhash(data))
+        print(f"  {name}: distance {distance} (duplicate if <= {PHOTO_DUPLICATE_MAX_DISTANCE})")
+
+
+def _flip(value: int, bits: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(photo_hash.HASH_BITS), bits):
+        value ^= 1 << bit
+    return value
+
+
+async def _seed_hashes(user_id: int, job_id: int, count: int, rng: random.Random) -> list[int]:
+    values = [rng.getrandbits(photo_hash.HASH_BITS) for _ in range(count)]
+    async with AsyncSessionLocal() as session:
+        for i in range(0, count, BATCH):
+            rows = [
+                {
+                    "user_id": user_id,
+                    "job_id": job_id,
+                    "photo_hash": photo_hash.to_signed(value),
+                    **{f"band{b}": band for b, band in enumerate(photo_hash.split_bands(value))},
+                }
+                for value in values[i:i + BATCH]
+            ]
+            await session.execute(sa.insert(PhotoHash), rows)
+        await session.commit()
+    return values
+
+
+def _brute_force(values: list[int], query: int) -> int:
+    return min(photo_hash.hamming(query, value) for value in values)
+
+
+async def main(hashes: int, lookups: int, budget_ms: float) -> int:
+    await init_db()
+    rng = random.Random(SEED)
+    _bench_dhash(rng)
+
+    failed = False
+    async with temporary_user(rng) as user:
+        async with AsyncSessionLocal() as session:
+            job = AnalysisJob(user_id=user.id, chat_id=0, analysis_type="nutrition", photo_file_id="bench")
+            session.add(job)
+            await session.commit()
+            job_id = job.id
+
+        started = time.perf_counter()
+        values = await _seed_hashes(user.id, job_id, hashes, rng)
+        print(f"seeded {hashes} hashes in {time.perf_counter() - started:.1f} s")
+        async with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                await conn.execute(sa.text("ANALYZE photo_hashes"))
+
+        cases = {
+            "near duplicate": [
+                _flip(rng.choice(values), rng.randint(0, PHOTO_DUPLICATE_MAX_DISTANCE), rng)
+                for _ in range(lookups)
+            ],
+            "random photo": [rng.getrandbits(photo_hash.HASH_BITS) for _ in range(lookups)],
+        }
+        for name, queries in cases.items():
+            await photo_hash.find_nearest(user.id, queries[0])
+            watch = Stopwatch()
+            found = []
+            for query in queries:
+                async with watch.measure():
+                    found.append(await photo_hash.find_nearest(user.id, query))
+
+            # сверка с перебором на части запросов (перебор 1M — секунды на запрос)
+            mismatches = 0
+            for query, nearest in list(zip(queries, found))[:10]:
+                expected = _brute_force(values, query)
+                got = nearest[1] if nearest else None
+                if (expected <= PHOTO_DUPLICATE_MAX_DISTANCE) != (got is not None) or (got is not None and got != expected):
+                    mismatches += 1
+
+            stats = summarize_ms(watch.samples)
+            hits = sum(1 for nearest in found if nearest is not None)
+            ok = stats["p95_ms"] <= budget_ms and not mismatches
+            failed |= not ok
+            print(
+                f"{name:15s} hits {hits}/{len(queries)}  p50 {stats['p50_ms']:.2f} ms  "
+                f"p95 {stats['p95_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms  "
+                f"mismatches {mismatches}  {'OK' if ok else 'FAIL'}"
+            )
+
+    await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Photo duplicate lookup benchmark")
+    parser.add_argument("--hashes", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.hashes, args.lookups, args.budget_ms)))
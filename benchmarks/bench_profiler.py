@@ -0,0 +1,85 @@
+# benchmarks/bench_profiler.py
+"""
+Накладные расходы сэмплирующего профайлера из админки.
+
+    python -m benchmarks.bench_profiler [--seconds 5] [--tasks 200] [--rounds 3]
+
+В event loop'е крутятся --tasks задач со смесью CPU-работы (json) и
+переключений (sleep(0)). Пропускная способность (операций/с) меряется
+без профайлера и с ним, по --rounds раундов (порядок чередуется);
+берётся медиана. Код возврата 1, если замедление больше --max-overhead
+процентов. На шумных машинах (1 vCPU) разброс между раундами сам по себе
+достигает десятков процентов — тогда ориентир "sampler self-reported time".
+БД не нужна.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from app.services.profiler import profile_event_loop
+
+PAYLOAD = {"items": [{"title": "Борщ", "calories": 250, "proteins": 8.5}] * 20}
+
+
+async def _worker(stop_at: float, counter: list[int]) -> None:
+    while time.perf_counter() < stop_at:
+        json.loads(json.dumps(PAYLOAD, ensure_ascii=False))
+        counter[0] += 1
+        await asyncio.sleep(0)
+
+
+async def _throughput(seconds: float, tasks: int, with_profiler: bool) -> tuple[float, float]:
+    counter = [0]
+    stop_at = time.perf_counter() + seconds
+    workers = [asyncio.create_task(_worker(stop_at, counter)) for _ in range(tasks)]
+
+    reported = 0.0
+    if with_profiler:
+        result = await profile_event_loop(seconds)
+        reported = result.overhead_percent
+    await asyncio.gather(*workers)
+    return counter[0] / seconds, reported
+
+
+async def main(seconds: float, tasks: int, rounds: int, max_overhead: float) -> int:
+    baseline: list[float] = []
+    profiled: list[float] = []
+    reported: list[float] = []
+
+    # прогрев: кэши json, аллокатор, имена фреймов профайлера
+    await _throughput(1.0, tasks, with_profiler=True)
+
+    for i in range(rounds):
+        # чередуем порядок, чтобы дрейф частоты CPU не шёл в одну сторону
+        for with_profiler in ((False, True) if i % 2 == 0 else (True, False)):
+            ops, self_reported = await _throughput(seconds, tasks, with_profiler)
+            if with_profiler:
+                profiled.append(ops)
+                reported.append(self_reported)
+            else:
+                baseline.append(ops)
+
+    base = statistics.median(baseline)
+    prof = statistics.median(profiled)
+    overhead = (base - prof) / base * 100
+
+    print(f"without profiler: {base:,.0f} ops/s")
+    print(f"with profiler:    {prof:,.0f} ops/s")
+    print(f"measured slowdown: {overhead:.2f}% (limit {max_overhead}%)")
+    print(f"sampler self-reported time: {statistics.median(reported):.2f}% of wall time")
+    return 1 if overhead > max_overhead else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sampling profiler overhead benchmark")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--max-overhead", type=float, default=5.0)
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.seconds, args.tasks, args.rounds, args.max_overhead)))
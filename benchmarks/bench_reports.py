@@ -0,0 +1,98 @@
+# benchmarks/bench_reports.py
+"""
+Латентность отчётов (day / week / month) на пользователе с 10k приёмов пищи.
+
+    python -m benchmarks.bench_reports [--meals 10000] [--runs 200] [--budget-ms 50]
+
+Данные генерируются с фиксированным seed, агрегат daily_nutrition
+пересобирается, после чего каждый отчёт строится --runs раз БЕЗ кэша.
+Код возврата 1, если p95 хотя бы одного отчёта превышает --budget-ms.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+
+from app.db.base import AsyncSessionLocal, engine, init_db
+from app.db.models import CaloriePlan, Meal
+from app.services.nutrition_service import rebuild_daily_nutrition
+from app.services.report_service import PERIOD_DAYS, build_report
+from benchmarks._common import Stopwatch, summarize_ms, temporary_user
+
+SEED = 20260101
+MEAL_TITLES = ("Овсянка", "Борщ", "Плов", "Салат", "Кофе с молоком", "Сырники", "Гречка с курицей")
+
+
+async def _seed_meals(user_id: int, meals: int, days: int, rng: random.Random) -> None:
+    """
+    Массовая вставка в обход ORM (слушатели не срабатывают) —
+    агрегат затем пересобирается целиком.
+    """
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "user_id": user_id,
+            "eaten_at": now - timedelta(seconds=rng.randint(0, days * 86400)),
+            "title": rng.choice(MEAL_TITLES),
+            "weight_grams": rng.randint(50, 600),
+            "calories": rng.randint(30, 1200),
+            "proteins": round(rng.uniform(0, 60), 1),
+            "fats": round(rng.uniform(0, 50), 1),
+            "carbs": round(rng.uniform(0, 120), 1),
+        }
+        for _ in range(meals)
+    ]
+
+    async with AsyncSessionLocal() as session:
+        for i in range(0, len(rows), 1000):
+            await session.execute(sa.insert(Meal), rows[i:i + 1000])
+        session.add(CaloriePlan(user_id=user_id, daily_target=2000))
+        await session.commit()
+
+    await rebuild_daily_nutrition(user_id=user_id)
+
+
+async def main(meals: int, days: int, runs: int, budget_ms: float) -> int:
+    await init_db()
+    rng = random.Random(SEED)
+    failed = False
+
+    async with temporary_user(rng) as user:
+        await _seed_meals(user.id, meals, days, rng)
+        print(f"seeded {meals} meals over {days} days for user_id={user.id}")
+
+        for period in PERIOD_DAYS:
+            # прогрев соединений / планов запросов
+            await build_report(user.id, period)
+
+            watch = Stopwatch()
+            for _ in range(runs):
+                async with watch.measure():
+                    await build_report(user.id, period)
+
+            stats = summarize_ms(watch.samples)
+            ok = stats["p95_ms"] <= budget_ms
+            failed |= not ok
+            print(
+                f"{period:>5}: p50={stats['p50_ms']:.2f}ms "
+                f"p95={stats['p95_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms "
+                f"[{'OK' if ok else 'OVER BUDGET'} {budget_ms:.0f}ms]"
+            )
+
+    await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report latency benchmark")
+    parser.add_argument("--meals", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.meals, args.days, args.runs, args.budget_ms)))
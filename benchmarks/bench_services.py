@@ -0,0 +1,433 @@
+# benchmarks/bench_services.py
+"""
+Микробенчмарки горячих сервисов: лимиты (в т.ч. резерв → подтверждение /
+возврат), пользователи, промокоды.
+
+    python -m benchmarks.bench_services [--ops 300] [--concurrency 20]
+        [--baseline benchmarks/baselines/services.json] [--save-baseline]
+        [--threshold 20]
+
+Для каждого кейса: прогрев, --ops вызовов, ops/s, p50/p95 и число
+обращений к БД на операцию (SQL-запросы + BEGIN/COMMIT/ROLLBACK).
+Кейсы *_contention запускают --concurrency корутин на одного пользователя /
+один промокод одновременно и проверяют инварианты (лимит не превышен,
+пользователь создан один раз, одноразовый код активирован один раз);
+нарушения печатаются и попадают в отчёт.
+
+С --baseline отчёт сравнивается с сохранённым: код возврата 1, если ops/s
+упал больше чем на --threshold процентов или выросло число обращений к БД
+на операцию. --save-baseline перезаписывает файл текущими цифрами.
+Базовые цифры имеют смысл только для той же БД и машины, поэтому в
+репозитории их нет: сначала make bench-services-baseline.
+
+Только PostgreSQL (make docker-up): на SQLite схема не создаётся
+(BIGSERIAL-ключи), а резерв лимита — один CTE с изменением данных.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable
+
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from app.config_limits import PREMIUM_TARIFF
+from app.db.base import AsyncSessionLocal, engine, init_db
+from app.db.models import PromoCode, User, UserLimit
+from app.services.limit_service import (
+    commit_photo_quota,
+    consume_photo_quota,
+    release_photo_quota,
+    reserve_photo_quota,
+)
+from app.services.promo_service import redeem_promo_code
+from app.services.user_service import get_or_create_user
+from benchmarks._common import summarize_ms
+
+DEFAULT_BASELINE = "benchmarks/baselines/services.json"
+
+# Диапазон telegram_id бенчмарка (отрицательные — таких в Telegram нет)
+TELEGRAM_ID_BASE = -8_000_000_000
+TELEGRAM_ID_RANGE = 100_000_000
+
+# ---- Обращения к БД ----
+
+_round_trips: Counter = Counter()
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    _round_trips["statements"] += 1
+
+
+def _count_transaction(name: str):
+    def listener(conn):
+        _round_trips[name] += 1
+    return listener
+
+
+def _instrument() -> None:
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "after_cursor_execute", _count_statement)
+    for name in ("begin", "commit", "rollback"):
+        event.listen(sync_engine, name, _count_transaction(name))
+
+
+# ---- Результат кейса ----
+
+@dataclass
+class CaseResult:
+    name: str
+    ops: int
+    ops_per_s: float
+    round_trips_per_op: float
+    statements_per_op: float
+    latency_ms: dict
+    violations: list[str] = field(default_factory=list)
+
+
+async def _run_case(
+    name: str,
+    ops: int,
+    op: Callable[[int], Awaitable[object]],
+    concurrency: int = 1,
+) -> tuple[CaseResult, list]:
+    """
+    Выполнить op(i) для i in range(ops) волнами по `concurrency` штук
+    (внутри волны — одновременно). Возвращает результат и ответы op.
+    """
+    samples: list[float] = []
+    results: list = []
+
+    async def timed(i: int):
+        started = time.perf_counter()
+        try:
+            return await op(i)
+        finally:
+            samples.append(time.perf_counter() - started)
+
+    _round_trips.clear()
+    started = time.perf_counter()
+    for wave in range(0, ops, concurrency):
+        results.extend(
+            await asyncio.gather(*(timed(i) for i in range(wave, min(wave + concurrency, ops))))
+        )
+    elapsed = time.perf_counter() - started
+
+    trips = _round_trips["statements"] + _round_trips["begin"] + _round_trips["commit"] + _round_trips["rollback"]
+    return (
+        CaseResult(
+            name=name,
+            ops=ops,
+            ops_per_s=round(ops / elapsed, 1),
+            round_trips_per_op=round(trips / ops, 2),
+            statements_per_op=round(_round_trips["statements"] / ops, 2),
+            latency_ms={k: round(v, 3) for k, v in summarize_ms(samples).items()},
+        ),
+        results,
+    )
+
+
+# ---- Данные ----
+
+class _TelegramIds:
+    """Выдаёт блоки ещё не использованных telegram_id."""
+
+    def __init__(self) -> None:
+        self._next = TELEGRAM_ID_BASE
+
+    def take(self, n: int) -> list[int]:
+        block = list(range(self._next, self._next - n, -1))
+        self._next -= n
+        return block
+
+
+async def _create_users(telegram_ids: list[int], premium: bool = False) -> list[int]:
+    async with AsyncSessionLocal() as session:
+        await session.execute(sa.delete(User).where(User.telegram_id.in_(telegram_ids)))
+        result = await session.execute(
+            sa.insert(User)
+            .values([{"telegram_id": tg_id, "is_premium": premium} for tg_id in telegram_ids])
+            .returning(User.id)
+        )
+        ids = list(result.scalars())
+        await session.commit()
+    return ids
+
+
+async def _reset_limits(user_ids: list[int]) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(sa.delete(UserLimit).where(UserLimit.user_id.in_(user_ids)))
+        await session.commit()
+
+
+async def _create_promo(code: str, max_activations: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(sa.delete(PromoCode).where(PromoCode.code == code))
+        session.add(PromoCode(code=code, days=7, max_activations=max_activations, activations=0))
+        await session.commit()
+
+
+async def _cleanup(prefix: str) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            sa.delete(User).where(
+                User.telegram_id.between(TELEGRAM_ID_BASE - TELEGRAM_ID_RANGE, TELEGRAM_ID_BASE)
+            )
+        )
+        await session.execute(sa.delete(PromoCode).where(PromoCode.code.like(f"{prefix}%")))
+        await session.commit()
+
+
+# ---- Кейсы ----
+
+async def bench_limits(args: argparse.Namespace, ids: _TelegramIds) -> list[CaseResult]:
+    daily_limit = PREMIUM_TARIFF.daily_photos
+    # В пределах лимита: пользователей столько, чтобы каждому хватило лимита
+    users = await _create_users(ids.take(args.ops // daily_limit + 1), premium=True)
+
+    allowed_case, _ = await _run_case(
+        "limits.consume_allowed",
+        args.ops,
+        lambda i: consume_photo_quota(users[i // daily_limit], is_premium=True),
+    )
+
+    # Лимит исчерпан: только чтение
+    exhausted = users[0]
+    denied_case, _ = await _run_case(
+        "limits.consume_denied",
+        args.ops,
+        lambda i: consume_photo_quota(exhausted, is_premium=True),
+    )
+
+    # Один пользователь, --concurrency запросов одновременно, больше лимита
+    await _reset_limits([exhausted])
+    ops = max(args.concurrency, daily_limit * 2)
+    contention_case, results = await _run_case(
+        "limits.consume_contention",
+        ops,
+        lambda i: consume_photo_quota(exhausted, is_premium=True),
+        concurrency=args.concurrency,
+    )
+    allowed = sum(1 for ok, _, _ in results if ok)
+    async with AsyncSessionLocal() as session:
+        stored = await session.scalar(
+            sa.select(UserLimit.photos_used).where(UserLimit.user_id == exhausted)
+        )
+    if allowed > daily_limit:
+        contention_case.violations.append(f"разрешено {allowed} анализов при лимите {daily_limit}")
+    if stored != allowed:
+        contention_case.violations.append(f"photos_used={stored}, а разрешено {allowed} (потерянные обновления)")
+
+    return [allowed_case, denied_case, contention_case]
+
+
+async def bench_reservations(args: argparse.Namespace, ids: _TelegramIds) -> list[CaseResult]:
+    daily_limit = PREMIUM_TARIFF.daily_photos
+    users = await _create_users(ids.take(2 * (args.ops // daily_limit + 1)), premium=True)
+    half = len(users) // 2
+
+    # Каждая фаза — одна транзакция: ожидается BEGIN + 2 запроса + COMMIT
+    reserve_case, reservations = await _run_case(
+        "limits.reserve",
+        2 * args.ops,
+        lambda i: reserve_photo_quota(users[i // daily_limit], is_premium=True),
+    )
+    commit_case, _ = await _run_case(
+        "limits.commit",
+        args.ops,
+        lambda i: commit_photo_quota(reservations[2 * i].id),
+    )
+    release_case, _ = await _run_case(
+        "limits.release",
+        args.ops,
+        lambda i: release_photo_quota(reservations[2 * i + 1].id),
+    )
+
+    # Один пользователь, --concurrency резервов одновременно, больше лимита
+    contended = users[half]
+    await _reset_limits([contended])
+    ops = max(args.concurrency, daily_limit * 2)
+    contention_case, results = await _run_case(
+        "limits.reserve_contention",
+        ops,
+        lambda i: reserve_photo_quota(contended, is_premium=True),
+        concurrency=args.concurrency,
+    )
+    granted = sum(1 for reservation in results if reservation is not None)
+    async with AsyncSessionLocal() as session:
+        stored = await session.scalar(
+            sa.select(UserLimit.photos_used).where(UserLimit.user_id == contended)
+        )
+    if granted > daily_limit:
+        contention_case.violations.append(f"зарезервировано {granted} анализов при лимите {daily_limit}")
+    if stored != granted:
+        contention_case.violations.append(f"photos_used={stored}, а зарезервировано {granted}")
+
+    return [reserve_case, commit_case, release_case, contention_case]
+
+
+async def bench_users(args: argparse.Namespace, ids: _TelegramIds) -> list[CaseResult]:
+    existing = ids.take(1)[0]
+    await _create_users([existing])
+
+    existing_case, _ = await _run_case(
+        "users.get_existing",
+        args.ops,
+        lambda i: get_or_create_user(existing),
+    )
+
+    new_ids = ids.take(args.ops)
+    create_case, _ = await _run_case(
+        "users.create_new",
+        args.ops,
+        lambda i: get_or_create_user(new_ids[i]),
+    )
+
+    # Несколько апдейтов нового пользователя одновременно: все на один telegram_id
+    racing = ids.take(args.rounds)
+    contention_case, results = await _run_case(
+        "users.create_contention",
+        args.rounds * args.concurrency,
+        lambda i: get_or_create_user(racing[i // args.concurrency]),
+        concurrency=args.concurrency,
+    )
+    for round_no, tg_id in enumerate(racing):
+        chunk = results[round_no * args.concurrency:(round_no + 1) * args.concurrency]
+        if len({user.id for user in chunk}) != 1:
+            contention_case.violations.append(f"telegram_id={tg_id}: разные users.id в одной гонке")
+            break
+
+    return [existing_case, create_case, contention_case]
+
+
+async def bench_promo(args: argparse.Namespace, ids: _TelegramIds) -> list[CaseResult]:
+    prefix = args.promo_prefix
+
+    # Многоразовый код, каждый раз новый пользователь (создаётся в redeem)
+    await _create_promo(f"{prefix}MULTI", max_activations=args.ops)
+    redeemers = ids.take(args.ops)
+    redeem_case, results = await _run_case(
+        "promo.redeem",
+        args.ops,
+        lambda i: redeem_promo_code(f"{prefix}MULTI", redeemers[i]),
+    )
+    failed = Counter(reason for ok, reason, _ in results if not ok)
+    if failed:
+        redeem_case.violations.append(f"неуспешные активации: {dict(failed)}")
+
+    # Несуществующий код — самый частый путь при переборе
+    missing_case, _ = await _run_case(
+        "promo.redeem_not_found",
+        args.ops,
+        lambda i: redeem_promo_code(f"{prefix}NOPE{i}", redeemers[0]),
+    )
+
+    # Одноразовые коды, за каждый борются --concurrency пользователей
+    racers = ids.take(args.concurrency)
+    for round_no in range(args.rounds):
+        await _create_promo(f"{prefix}ONCE{round_no}", max_activations=1)
+    contention_case, results = await _run_case(
+        "promo.redeem_contention",
+        args.rounds * args.concurrency,
+        lambda i: redeem_promo_code(f"{prefix}ONCE{i // args.concurrency}", racers[i % args.concurrency]),
+        concurrency=args.concurrency,
+    )
+    for round_no in range(args.rounds):
+        chunk = results[round_no * args.concurrency:(round_no + 1) * args.concurrency]
+        succeeded = sum(1 for ok, _, _ in chunk if ok)
+        if succeeded > 1:
+            contention_case.violations.append(
+                f"{prefix}ONCE{round_no}: одноразовый код активирован {succeeded} раз"
+            )
+
+    return [redeem_case, missing_case, contention_case]
+
+
+# ---- Сравнение с базой ----
+
+def _compare(results: list[CaseResult], baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for case in results:
+        base = baseline.get(case.name)
+        if base is None:
+            continue
+        drop = (base["ops_per_s"] - case.ops_per_s) / base["ops_per_s"] * 100
+        if drop > threshold:
+            regressions.append(f"{case.name}: ops/s {base['ops_per_s']} → {case.ops_per_s} (-{drop:.0f}%)")
+        if case.round_trips_per_op > base["round_trips_per_op"]:
+            regressions.append(
+                f"{case.name}: обращений к БД/оп {base['round_trips_per_op']} → {case.round_trips_per_op}"
+            )
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    await init_db()
+    _instrument()
+
+    ids = _TelegramIds()
+
+    results: list[CaseResult] = []
+    try:
+        await _cleanup(args.promo_prefix)
+        for bench in (bench_limits, bench_reservations, bench_users, bench_promo):
+            # прогрев пула соединений и кэша компиляции запросов
+            warmup = argparse.Namespace(**{**vars(args), "ops": args.warmup, "rounds": 1})
+            await bench(warmup, ids)
+            results.extend(await bench(args, ids))
+    finally:
+        await _cleanup(args.promo_prefix)
+        await engine.dispose()
+
+    print(f"{'case':<28}{'ops/s':>9}{'p50':>8}{'p95':>8}{'rt/op':>7}{'sql/op':>7}  (ms)")
+    for case in results:
+        print(
+            f"{case.name:<28}{case.ops_per_s:>9.0f}{case.latency_ms['p50_ms']:>8.2f}"
+            f"{case.latency_ms['p95_ms']:>8.2f}{case.round_trips_per_op:>7.1f}{case.statements_per_op:>7.1f}"
+        )
+        for violation in case.violations:
+            print(f"  ⚠ {violation}")
+
+    report = {case.name: asdict(case) for case in results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"baseline saved → {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"baseline {args.baseline} not found (--save-baseline to create)")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = _compare(results, json.load(f), args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks for limit/user/promo services")
+    parser.add_argument("--ops", type=int, default=300, help="операций в последовательных кейсах")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременных корутин в *_contention")
+    parser.add_argument("--rounds", type=int, default=10, help="гонок в *_contention")
+    parser.add_argument("--promo-prefix", default="BENCH", help="префикс тестовых промокодов")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=20.0, help="допустимое падение ops/s, %")
+    parser.add_argument("--json", help="сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,248 @@
+# benchmarks/fakes.py
+"""
+Локальные заглушки внешних API для нагрузочных прогонов (без сети).
+
+FakeTelegram — минимальный Bot API на aiohttp:
+  - getUpdates (long polling из очереди, которую наполняет нагрузчик),
+  - getFile + скачивание файла (/file/bot<token>/<path>),
+  - sendMessage / sendPhoto / sendDocument / answerCallbackQuery и т.п.
+FakeOpenAI — POST /v1/chat/completions с настраиваемой задержкой и usage
+  (кэш префикса: повторный system + первая часть user-сообщения даёт
+  cached_tokens в usage.prompt_tokens_details).
+
+Модуль не импортирует app.*: заглушки поднимаются раньше, чем приложение
+прочитает настройки (OPENAI_BASE_URL читается при создании клиента).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from aiohttp import web
+
+BOT_ID = 1_000_000
+FAKE_TOKEN = f"{BOT_ID}:LOADTEST-fake-token"
+
+
+async def _start_app(app: web.Application, host: str, port: int) -> tuple[web.AppRunner, str]:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    bound_host, bound_port = runner.addresses[0][:2]
+    return runner, f"http://{bound_host}:{bound_port}"
+
+
+# ===== Telegram =====
+
+class FakeTelegram:
+    def __init__(self, photo_bytes: bytes, api_latency: float = 0.0, token: str = FAKE_TOKEN) -> None:
+        self.token = token
+        self.photo_bytes = photo_bytes
+        self.api_latency = api_latency
+        self.base_url = ""
+        self.calls: Counter[str] = Counter()
+        # Вызывается на каждый sendMessage: (chat_id, text)
+        self.on_send_message: Optional[Callable[[int, str], None]] = None
+
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._pending: list[dict] = []
+        self._has_updates = asyncio.Event()
+        self._runner: Optional[web.AppRunner] = None
+
+    # --- API для нагрузчика ---
+
+    def push_update(self, update: dict) -> int:
+        """
+        Положить апдейт (без update_id) в очередь getUpdates. Возвращает update_id.
+        """
+        update_id = self._next_update_id
+        self._next_update_id += 1
+        self._pending.append({"update_id": update_id, **update})
+        self._has_updates.set()
+        return update_id
+
+    def next_message_id(self) -> int:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return message_id
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self._handle_method)
+        app.router.add_get("/file/bot{token}/{path:.+}", self._handle_file)
+        self._runner, self.base_url = await _start_app(app, host, port)
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # --- Bot API ---
+
+    async def _params(self, request: web.Request) -> dict[str, Any]:
+        params: dict[str, Any] = dict(request.query)
+        if request.can_read_body:
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            else:
+                for key, value in (await request.post()).items():
+                    params[key] = value if isinstance(value, str) else "<file>"
+        return params
+
+    def _message(self, chat_id: Any, **extra: Any) -> dict:
+        return {
+            "message_id": self.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "DishVision"},
+            **extra,
+        }
+
+    async def _get_updates(self, params: dict) -> list[dict]:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+
+        self._pending = [u for u in self._pending if u["update_id"] >= offset]
+        if not self._pending and timeout:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(self._has_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        limit = int(params.get("limit") or 100)
+        return self._pending[:limit]
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if request.match_info["token"] != self.token:
+            return web.json_response({"ok": False, "error_code": 401, "description": "Unauthorized"})
+
+        params = await self._params(request)
+        self.calls[method] += 1
+
+        if method != "getUpdates" and self.api_latency:
+            await asyncio.sleep(self.api_latency)
+
+        result: Any = True
+        if method == "getMe":
+            result = {"id": BOT_ID, "is_bot": True, "first_name": "DishVision", "username": "dish_vision_load_bot"}
+        elif method == "getUpdates":
+            result = await self._get_updates(params)
+        elif method == "getFile":
+            file_id = params.get("file_id", "")
+            result = {
+                "file_id": file_id,
+                "file_unique_id": f"u-{file_id}",
+                "file_size": len(self.photo_bytes),
+                "file_path": f"photos/{file_id}.jpg",
+            }
+        elif method in ("sendMessage", "editMessageText"):
+            result = self._message(params.get("chat_id", 0), text=params.get("text", ""))
+            if method == "sendMessage" and self.on_send_message is not None:
+                self.on_send_message(int(params.get("chat_id", 0)), params.get("text", ""))
+        elif method in ("sendPhoto", "sendDocument"):
+            result = self._message(params.get("chat_id", 0), caption=params.get("caption"))
+
+        return web.json_response({"ok": True, "result": result})
+
+    async def _handle_file(self, request: web.Request) -> web.Response:
+        self.calls["file_download"] += 1
+        return web.Response(body=self.photo_bytes, content_type="image/jpeg")
+
+
+# ===== OpenAI =====
+
+FAKE_NUTRITION_ANSWER = (
+    "🍽 Итого: ~560 ккал · Б 32 г · Ж 18 г · У 64 г\n\n"
+    "1. Куриная грудка гриль (150 г): 248 ккал, Б 46, Ж 5, У 0\n"
+    "2. Рис отварной (180 г): 234 ккал, Б 4, Ж 1, У 51\n"
+    "3. Салат из овощей (120 г): 78 ккал, Б 2, Ж 12, У 13\n"
+)
+
+
+@dataclass
+class OpenAIProfile:
+    latency: float = 0.8          # средняя задержка ответа, сек
+    jitter: float = 0.3           # ± равномерный разброс, сек
+    prompt_tokens: int = 1200
+    completion_tokens: int = 350
+    cached_prompt_tokens: int = 1024  # cached_tokens, если префикс запроса уже был
+    error_rate: float = 0.0       # доля ответов 500
+
+
+class FakeOpenAI:
+    def __init__(self, profile: OpenAIProfile, seed: int = 0) -> None:
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.base_url = ""
+        self.calls = 0
+        self.errors = 0
+        self._prefixes: set[str] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self._handle_completion)
+        self._runner, url = await _start_app(app, host, port)
+        self.base_url = f"{url}/v1"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle_completion(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.calls += 1
+
+        p = self.profile
+        cached = p.cached_prompt_tokens if self._seen_prefix(body.get("messages") or []) else 0
+        delay = max(0.0, p.latency + self.rng.uniform(-p.jitter, p.jitter))
+        await asyncio.sleep(delay)
+
+        if p.error_rate and self.rng.random() < p.error_rate:
+            self.errors += 1
+            return web.json_response(
+                {"error": {"message": "fake overload", "type": "server_error"}}, status=500
+            )
+
+        return web.json_response(
+            {
+                "id": f"chatcmpl-fake-{self.calls}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": FAKE_NUTRITION_ANSWER},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": p.prompt_tokens,
+                    "completion_tokens": p.completion_tokens,
+                    "total_tokens": p.prompt_tokens + p.completion_tokens,
+                    "prompt_tokens_details": {"cached_tokens": min(cached, p.prompt_tokens)},
+                },
+            }
+        )
+
+    def _seen_prefix(self, messages: list[dict]) -> bool:
+        # Грубая модель кэша OpenAI: префикс = system + первая часть user-сообщения
+        prefix = []
+        for message in messages[:2]:
+            content = message.get("content")
+            prefix.append(str(content[0] if isinstance(content, list) and content else content))
+        key = "\0".join(prefix)
+        seen = key in self._prefixes
+        self._prefixes.add(key)
+        return seen
@@ -0,0 +1,228 @@
+# benchmarks/replay.py
+"""
+Воспроизведение записанного трафика (UPDATE_RECORD_PATH, см.
+app/services/update_recorder.py) и сравнение двух прогонов.
+
+    # прогон: апдейты подаются с исходными интервалами, ускоренными в --speed раз
+    python -m benchmarks.replay run updates.ndjson.gz --speed 10 --out base.json
+
+    # сравнение двух прогонов (например, master и кандидат)
+    python -m benchmarks.replay compare base.json candidate.json [--threshold 10]
+
+Прогон "открытый": следующий апдейт подаётся по расписанию, не дожидаясь
+обработки предыдущего, — как в продакшене. Bot API и OpenAI — заглушки
+из benchmarks/fakes.py. Пользователи из записи (псевдонимы, отрицательные
+telegram_id) создаются ботом по ходу и удаляются после прогона;
+с --premium они заранее заводятся премиумными, чтобы не упираться в лимиты.
+
+compare печатает p50/p95 по хендлерам, CPU и память на апдейт, SQL-запросы
+на апдейт; код возврата 1, если p95 или CPU/апдейт кандидата хуже
+базового больше чем на --threshold процентов.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import resource
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks._common import percentile, summarize_ms
+from benchmarks._harness import BotUnderTest, UpdateResult, create_premium_users, delete_users
+from benchmarks.fakes import OpenAIProfile
+
+SEED = 20260104
+
+
+def _load_records(path: str) -> list[dict]:
+    from app.services.update_recorder import iter_records
+
+    return list(iter_records(path))
+
+
+def _telegram_ids(records: list[dict]) -> list[int]:
+    ids = set()
+    for record in records:
+        for body in record["update"].values():
+            user = body.get("from")
+            if user:
+                ids.add(user["id"])
+    return sorted(ids)
+
+
+def _with_fresh_date(update: dict) -> dict:
+    # в записи date = 0; фильтры бота смотрят на время сообщения
+    for body in update.values():
+        for message in (body, body.get("message")):
+            if isinstance(message, dict) and "date" in message:
+                message["date"] = int(time.time())
+    return update
+
+
+async def run(args: argparse.Namespace) -> int:
+    records = _load_records(args.recording)
+    if args.limit:
+        records = records[: args.limit]
+    telegram_ids = _telegram_ids(records)
+
+    rng = random.Random(SEED)
+    harness = BotUnderTest(
+        photo_bytes=rng.randbytes(args.photo_kb * 1024),
+        openai_profile=OpenAIProfile(
+            latency=args.openai_latency_ms / 1000,
+            jitter=args.openai_jitter_ms / 1000,
+        ),
+        seed=SEED,
+    )
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    queries: list[int] = []
+    errors = 0
+
+    def collect(pushed: float, future: asyncio.Future) -> None:
+        nonlocal errors
+        result: UpdateResult = future.result()
+        latencies[result.handler].append(result.finished - pushed)
+        queries.append(result.queries)
+        if result.error is not None:
+            errors += 1
+
+    async with harness:
+        if args.premium:
+            await create_premium_users(telegram_ids)
+
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        schedule = started
+        futures = []
+        try:
+            for record in records:
+                schedule += record["dt"] / args.speed
+                delay = schedule - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                pushed = time.perf_counter()
+                future = harness.push(_with_fresh_date(record["update"]))
+                future.add_done_callback(lambda f, pushed=pushed: collect(pushed, f))
+                futures.append(future)
+
+            await asyncio.wait_for(asyncio.gather(*futures), args.drain_timeout)
+        finally:
+            elapsed = time.perf_counter() - started
+            cpu_seconds = time.process_time() - cpu_started
+            await delete_users(telegram_ids)
+
+    updates = sum(len(samples) for samples in latencies.values())
+    report = {
+        "recording": args.recording,
+        "speed": args.speed,
+        "updates": updates,
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "cpu_s": round(cpu_seconds, 3),
+        "cpu_ms_per_update": round(cpu_seconds * 1000 / max(updates, 1), 3),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "db_queries_per_update": round(sum(queries) / max(len(queries), 1), 2),
+        "db_queries_p95": percentile(queries, 95),
+        "telegram_calls": dict(harness.telegram.calls),
+        "openai_calls": harness.openai.calls,
+        "latency_ms": {
+            handler: {k: round(v, 2) for k, v in summarize_ms(samples).items()}
+            for handler, samples in sorted(latencies.items())
+        },
+        "latency_ms_all": {
+            k: round(v, 2)
+            for k, v in summarize_ms([x for s in latencies.values() for x in s]).items()
+        },
+    }
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(
+        f"replayed {updates} updates at x{args.speed} in {elapsed:.1f}s, "
+        f"errors: {errors}, CPU {cpu_seconds:.2f}s → {args.out}"
+    )
+    return 1 if errors else 0
+
+
+def _delta(base: float, candidate: float) -> float:
+    if not base:
+        return 0.0
+    return (candidate - base) / base * 100
+
+
+def compare(args: argparse.Namespace) -> int:
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    regressions: list[str] = []
+
+    print(f"{'handler':<40}{'n':>6}{'p50 base':>10}{'cand':>9}{'p95 base':>10}{'cand':>9}{'Δp95':>9}")
+    handlers = sorted(set(base["latency_ms"]) | set(candidate["latency_ms"]))
+    for handler in [*handlers, "ALL"]:
+        if handler == "ALL":
+            b, c = base["latency_ms_all"], candidate["latency_ms_all"]
+        else:
+            b = base["latency_ms"].get(handler)
+            c = candidate["latency_ms"].get(handler)
+            if b is None or c is None:
+                print(f"{handler:<40} только в {'кандидате' if b is None else 'базовом'} прогоне")
+                continue
+        delta = _delta(b["p95_ms"], c["p95_ms"])
+        flag = " ⚠" if delta > args.threshold and c["count"] >= args.min_samples else ""
+        if flag:
+            regressions.append(f"{handler} p95 {delta:+.1f}%")
+        print(
+            f"{handler:<40}{c['count']:>6.0f}{b['p50_ms']:>10.1f}{c['p50_ms']:>9.1f}"
+            f"{b['p95_ms']:>10.1f}{c['p95_ms']:>9.1f}{delta:>+8.1f}%{flag}"
+        )
+
+    print()
+    for key, label in (
+        ("cpu_ms_per_update", "CPU, мс/апдейт"),
+        ("max_rss_mb", "Пик RSS, МБ"),
+        ("db_queries_per_update", "SQL-запросов/апдейт"),
+        ("errors", "Ошибок"),
+    ):
+        delta = _delta(base[key], candidate[key])
+        print(f"{label:<24}{base[key]:>10}{candidate[key]:>10}{delta:>+9.1f}%")
+        if key == "cpu_ms_per_update" and delta > args.threshold:
+            regressions.append(f"CPU/update {delta:+.1f}%")
+
+    if regressions:
+        print("\nРегрессии: " + "; ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded updates and compare runs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="воспроизвести запись")
+    p_run.add_argument("recording")
+    p_run.add_argument("--speed", type=float, default=1.0, help="1 — реальное время, 10 — в 10 раз быстрее")
+    p_run.add_argument("--out", default="replay.json")
+    p_run.add_argument("--limit", type=int, default=0, help="только первые N апдейтов")
+    p_run.add_argument("--premium", action="store_true", help="завести пользователей премиумными")
+    p_run.add_argument("--photo-kb", type=int, default=150)
+    p_run.add_argument("--openai-latency-ms", type=float, default=800.0)
+    p_run.add_argument("--openai-jitter-ms", type=float, default=300.0)
+    p_run.add_argument("--drain-timeout", type=float, default=300.0)
+
+    p_cmp = sub.add_parser("compare", help="сравнить два прогона")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("candidate")
+    p_cmp.add_argument("--threshold", type=float, default=10.0, help="допустимое ухудшение, %")
+    p_cmp.add_argument("--min-samples", type=int, default=20, help="не судить по хендлерам с малой выборкой")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(asyncio.run(run(args)))
+    sys.exit(compare(args))
@@ -0,0 +1,30 @@
+-- 002_add_daily_nutrition.sql
+-- Дневной агрегат питания по пользователю (инкрементально ведётся из meals)
+
+CREATE TABLE IF NOT EXISTS daily_nutrition (
+    id              BIGSERIAL PRIMARY KEY,
+    user_id         BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    date            DATE NOT NULL,
+    calories        INTEGER NOT NULL DEFAULT 0,
+    proteins        DOUBLE PRECISION NOT NULL DEFAULT 0,
+    fats            DOUBLE PRECISION NOT NULL DEFAULT 0,
+    carbs           DOUBLE PRECISION NOT NULL DEFAULT 0,
+    meals_count     INTEGER NOT NULL DEFAULT 0,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    CONSTRAINT daily_nutrition_unique UNIQUE (user_id, date)
+);
+
+-- Бэкфилл по существующей истории (сутки считаются по REPORT_TIMEZONE, здесь — UTC).
+-- Для другой таймзоны используйте: python -m app.cli.rebuild_daily_nutrition
+INSERT INTO daily_nutrition (user_id, date, calories, proteins, fats, carbs, meals_count)
+SELECT
+    user_id,
+    date(timezone('UTC', eaten_at)),
+    COALESCE(SUM(calories), 0),
+    COALESCE(SUM(proteins), 0),
+    COALESCE(SUM(fats), 0),
+    COALESCE(SUM(carbs), 0),
+    COUNT(*)
+FROM meals
+GROUP BY user_id, date(timezone('UTC', eaten_at))
+ON CONFLICT (user_id, date) DO NOTHING;
@@ -0,0 +1,5 @@
+-- 003_add_meals_user_eaten_at_index.sql
+-- Составной индекс для отчётов: приёмы пищи пользователя за диапазон времени
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_meals_user_id_eaten_at
+    ON meals (user_id, eaten_at);
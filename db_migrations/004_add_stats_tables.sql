@@ -0,0 +1,18 @@
+-- 004_add_stats_tables.sql
+-- Почасовые и накопленные счётчики для админ-статистики
+
+CREATE TABLE IF NOT EXISTS stats_hourly (
+    id              BIGSERIAL PRIMARY KEY,
+    hour            TIMESTAMPTZ NOT NULL,
+    metric          TEXT NOT NULL,
+    value           NUMERIC(18,6) NOT NULL DEFAULT 0,
+    CONSTRAINT stats_hourly_unique UNIQUE (hour, metric)
+);
+
+CREATE INDEX IF NOT EXISTS ix_stats_hourly_hour ON stats_hourly (hour);
+
+CREATE TABLE IF NOT EXISTS stats_totals (
+    metric          TEXT PRIMARY KEY,
+    value           NUMERIC(18,6) NOT NULL DEFAULT 0,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,31 @@
+-- 005_add_broadcasts.sql
+-- Рассылки из админки: прогресс (keyset-курсор по users.id) и недоставленные чаты
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id              BIGSERIAL PRIMARY KEY,
+    text            TEXT NOT NULL,
+    created_by      BIGINT NOT NULL,
+    status          TEXT NOT NULL DEFAULT 'pending',
+    max_user_id     BIGINT NOT NULL,
+    cursor_user_id  BIGINT NOT NULL DEFAULT 0,
+    total           INTEGER NOT NULL DEFAULT 0,
+    sent            INTEGER NOT NULL DEFAULT 0,
+    blocked         INTEGER NOT NULL DEFAULT 0,
+    failed          INTEGER NOT NULL DEFAULT 0,
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    started_at      TIMESTAMPTZ,
+    finished_at     TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_broadcasts_status ON broadcasts (status);
+
+CREATE TABLE IF NOT EXISTS broadcast_failures (
+    id              BIGSERIAL PRIMARY KEY,
+    broadcast_id    BIGINT NOT NULL REFERENCES broadcasts(id) ON DELETE CASCADE,
+    user_id         BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    reason          TEXT NOT NULL,
+    error           TEXT,
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_broadcast_failures_broadcast_id ON broadcast_failures (broadcast_id);
@@ -0,0 +1,8 @@
+-- 006_add_maintenance_indexes.sql
+-- Индексы для фоновых задач: истечение премиума и чистка старых user_limits
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_premium_until
+    ON users (premium_until) WHERE is_premium;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_limits_date
+    ON user_limits (date);
@@ -0,0 +1,24 @@
+-- 007_add_analysis_jobs.sql
+-- Очередь анализов фото (воркеры забирают задачи через FOR UPDATE SKIP LOCKED)
+
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    id              BIGSERIAL PRIMARY KEY,
+    user_id         BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    chat_id         BIGINT NOT NULL,
+    analysis_type   TEXT NOT NULL,
+    photo_file_id   TEXT NOT NULL,
+    comment         TEXT,
+    strip_questions BOOLEAN NOT NULL DEFAULT FALSE,
+    footer          TEXT,
+    status          TEXT NOT NULL DEFAULT 'queued',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    run_after       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_at       TIMESTAMPTZ,
+    result          TEXT,
+    last_error      TEXT,
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at     TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_analysis_jobs_status ON analysis_jobs (status);
+CREATE INDEX IF NOT EXISTS ix_analysis_jobs_queued ON analysis_jobs (run_after, id) WHERE status = 'queued';
@@ -0,0 +1,20 @@
+-- 008_add_quota_reservations.sql
+-- Двухфазное списание лимита анализов: резерв → подтверждение после доставки / возврат
+
+CREATE TABLE IF NOT EXISTS quota_reservations (
+    id          BIGSERIAL PRIMARY KEY,
+    user_id     BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    source      TEXT NOT NULL,
+    day         DATE,
+    status      TEXT NOT NULL DEFAULT 'held',
+    expires_at  TIMESTAMPTZ NOT NULL,
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_quota_reservations_held ON quota_reservations (expires_at) WHERE status = 'held';
+
+ALTER TABLE analysis_jobs
+    ADD COLUMN IF NOT EXISTS quota_reservation_id BIGINT REFERENCES quota_reservations(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS ix_analysis_jobs_quota_reservation_id ON analysis_jobs (quota_reservation_id);
@@ -0,0 +1,23 @@
+-- 009_add_photo_hashes.sql
+-- Перцептивные хэши фото: повторно присланное фото получает прошлый ответ без вызова GPT
+
+CREATE TABLE IF NOT EXISTS photo_hashes (
+    id         BIGSERIAL PRIMARY KEY,
+    user_id    BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    job_id     BIGINT NOT NULL REFERENCES analysis_jobs(id) ON DELETE CASCADE,
+    photo_hash BIGINT NOT NULL,
+    band0      INTEGER NOT NULL,
+    band1      INTEGER NOT NULL,
+    band2      INTEGER NOT NULL,
+    band3      INTEGER NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_photo_hashes_job_id ON photo_hashes (job_id);
+CREATE INDEX IF NOT EXISTS ix_photo_hashes_band0 ON photo_hashes (user_id, band0);
+CREATE INDEX IF NOT EXISTS ix_photo_hashes_band1 ON photo_hashes (user_id, band1);
+CREATE INDEX IF NOT EXISTS ix_photo_hashes_band2 ON photo_hashes (user_id, band2);
+CREATE INDEX IF NOT EXISTS ix_photo_hashes_band3 ON photo_hashes (user_id, band3);
+
+ALTER TABLE analysis_jobs
+    ADD COLUMN IF NOT EXISTS duplicate_of BIGINT REFERENCES analysis_jobs(id) ON DELETE SET NULL;
@@ -0,0 +1,8 @@
+-- 010_add_users_is_suspicious.sql
+-- Мягкий бан за флуд: пониженная частота апдейтов для пользователя на FLOOD_SUSPICIOUS_HOURS
+
+ALTER TABLE users
+    ADD COLUMN IF NOT EXISTS is_suspicious BOOLEAN NOT NULL DEFAULT FALSE,
+    ADD COLUMN IF NOT EXISTS suspicious_since TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS ix_users_suspicious_since ON users (suspicious_since) WHERE is_suspicious;
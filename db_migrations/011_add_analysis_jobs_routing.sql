@@ -0,0 +1,6 @@
+-- 011_add_analysis_jobs_routing.sql
+-- Маршрутизация моделей GPT: тариф на момент постановки и модель, давшая ответ
+
+ALTER TABLE analysis_jobs
+    ADD COLUMN IF NOT EXISTS premium BOOLEAN NOT NULL DEFAULT FALSE,
+    ADD COLUMN IF NOT EXISTS model TEXT;
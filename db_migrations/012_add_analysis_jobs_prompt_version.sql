@@ -0,0 +1,5 @@
+-- 012_add_analysis_jobs_prompt_version.sql
+-- Версия промпта (app/prompts/registry.py), по которой получен сохранённый ответ
+
+ALTER TABLE analysis_jobs
+    ADD COLUMN IF NOT EXISTS prompt_version TEXT;
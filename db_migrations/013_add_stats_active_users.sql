@@ -0,0 +1,8 @@
+-- 013_add_stats_active_users.sql
+-- Дедупликация DAU: кто уже учтён в active_users за день (переживает перезапуск)
+
+CREATE TABLE IF NOT EXISTS stats_active_users (
+    day             DATE NOT NULL,
+    user_id         BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    PRIMARY KEY (day, user_id)
+);